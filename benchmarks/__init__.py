@@ -0,0 +1,4 @@
+"""
+Unicorn AI benchmarks
+Run from the repository root, e.g. python -m benchmarks.embedding_backends
+"""
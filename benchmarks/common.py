@@ -0,0 +1,96 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import hashlib
+import math
+import random
+import resource
+import sys
+from typing import Dict, List
+from embeddings import Embedder
+
+
+WORDS = (
+    "beach coffee movie tori weekend dinner music rain garden work office cat dog "
+    "birthday trip mountain book pizza game photo dress morning night sleep dream "
+    "project deadline friend sister brother mom dad gym run yoga paint song guitar "
+    "city train airport hotel summer winter snow sunset ocean lake forest tea"
+).split()
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic fake embedder for benchmarks: signed feature hashing of words.
+    Needs no model or network, and texts sharing words land close together.
+    """
+
+    def __init__(self, dim: int = 384, batch_size: int = 256):
+        super().__init__(batch_size)
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for word in text.lower().split():
+                digest = int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)
+                vector[digest % self.dim] += 1.0 if (digest >> 64) & 1 else -1.0
+            norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+            vectors.append([x / norm for x in vector])
+        return vectors
+
+    def get_name(self) -> str:
+        return f"hashing:{self.dim}"
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def synthetic_sentences(n: int, seed: int = 0, min_words: int = 4, max_words: int = 30) -> List[str]:
+    """Deterministic chat-like sentences of varying length, with a few rare words each."""
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+        words += [f"w{int(rng.paretovariate(1.2)) % 50000}" for _ in range(rng.randint(1, 3))]
+        rng.shuffle(words)
+        sentences.append(" ".join(words))
+    return sentences
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 of a list of latencies (seconds), returned in milliseconds."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def unit_vectors(n: int, dim: int = 384, seed: int = 0):
+    """Deterministic random unit vectors (numpy float32), for loading stores without embedding text."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
@@ -0,0 +1,100 @@
+"""
+Embedding backend benchmark
+Reports embeddings/second and RSS for each EMBEDDING_BACKEND option.
+
+Each backend runs in a fresh process so its RSS is not polluted by the others.
+
+Usage:
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --backends onnx onnx-int8 --texts 2000 --threads 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from typing import Dict
+from tabulate import tabulate
+from benchmarks.common import rss_mb, peak_rss_mb, synthetic_sentences
+
+
+# Benchmark variant -> (backend, extra environment)
+VARIANTS = {
+    "default": ("default", {}),
+    "onnx": ("onnx", {"EMBEDDING_ONNX_QUANTIZED": "false"}),
+    "onnx-int8": ("onnx", {"EMBEDDING_ONNX_QUANTIZED": "true"}),
+    "sentence-transformers": ("sentence-transformers", {}),
+    "ollama": ("ollama", {}),
+}
+
+
+def _run_variant(variant: str, texts: int, batch_size: int, threads: int) -> Dict:
+    backend, extra_env = VARIANTS[variant]
+    os.environ.update(extra_env)
+    os.environ["EMBEDDING_BATCH_SIZE"] = str(batch_size)
+    os.environ["EMBEDDING_THREADS"] = str(threads)
+
+    from embeddings import create_embedder
+
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    embedder = create_embedder(backend)
+    load_seconds = time.perf_counter() - start
+    loaded_rss = rss_mb()
+
+    corpus = synthetic_sentences(texts, seed=42)
+    embedder.embed(corpus[:batch_size])  # warm-up
+
+    start = time.perf_counter()
+    vectors = embedder.embed(corpus)
+    elapsed = time.perf_counter() - start
+
+    single = synthetic_sentences(50, seed=7)
+    start = time.perf_counter()
+    for text in single:
+        embedder.embed([text])
+    single_ms = (time.perf_counter() - start) / len(single) * 1000
+
+    return {
+        "variant": variant,
+        "dim": len(vectors[0]),
+        "load_s": round(load_seconds, 2),
+        "emb_per_s": round(len(corpus) / elapsed, 1),
+        "single_ms": round(single_ms, 2),
+        "rss_model_mb": round(loaded_rss - base_rss, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _worker(queue, *args):
+    try:
+        queue.put(_run_variant(*args))
+    except Exception as e:
+        queue.put({"variant": args[0], "error": str(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--texts", type=int, default=1000, help="Texts to embed per backend")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=2, help="Intra-op threads for in-process backends")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for variant in args.backends:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_worker, args=(queue, variant, args.texts, args.batch_size, args.threads))
+        process.start()
+        result = queue.get()
+        process.join()
+        rows.append(result)
+        print(f"finished {variant}")
+
+    print(tabulate(rows, headers="keys", tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Memory scaling benchmark
+End-to-end MemoryManager latency as the number of sessions and the size of
+each session grow: add_message, get_recent_messages, search_relevant_context
+and build_context percentiles, plus load time, RSS and on-disk size.
+
+A scenario is SESSIONSxMESSAGES (messages per session). Sessions are
+bulk-loaded straight into the store, the BM25 logs and the recent-message
+buffer, then the operations are timed on randomly picked sessions. Every
+(backend, scenario) pair runs in a fresh process with the deterministic
+HashingEmbedder, so no model or network is needed and runs are repeatable.
+
+Usage:
+    python -m benchmarks.memory_scaling
+    python -m benchmarks.memory_scaling --backends numpy-int8 --scenarios 100000x10 1x100000
+    python -m benchmarks.memory_scaling --gate always   # build_context searches on every call
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+from tabulate import tabulate
+from benchmarks.common import HashingEmbedder, percentiles, rss_mb, synthetic_sentences
+from benchmarks.vector_backends import VARIANTS
+from memory_backends.retrieval_gate import GATE_MODES
+
+
+PERSONA = "luna"
+LOAD_BATCH = 2000
+RECENT_KEPT = 20  # MemoryManager keeps the last 20 messages per session
+OPERATIONS = ["get_recent_messages", "search_relevant_context", "build_context", "add_message"]
+
+
+def _parse_scenario(text: str):
+    sessions, _, messages = text.lower().partition("x")
+    return int(sessions), int(messages)
+
+
+def _dir_size_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / (1024 * 1024)
+
+
+def _seed(manager, embedder: HashingEmbedder, sessions: int, messages: int):
+    """Bulk-load every session (one JSON write for the recent buffer instead of one per message)."""
+    for n in range(sessions):
+        session_id = f"bench_{n}"
+        texts = synthetic_sentences(messages, seed=n)
+        records = [
+            {"id": f"{session_id}_{i}", "content": text, "session_id": session_id,
+             "role": "user" if i % 2 == 0 else "assistant", "timestamp": f"{i:08d}", "persona_id": PERSONA}
+            for i, text in enumerate(texts)
+        ]
+        for start in range(0, len(records), LOAD_BATCH):
+            batch = records[start:start + LOAD_BATCH]
+            manager.store.add(PERSONA, session_id, batch, embedder.embed([r["content"] for r in batch]))
+        manager.lexical.add(PERSONA, session_id, records)
+        manager.recent_messages[session_id] = [
+            {"role": r["role"], "content": r["content"], "timestamp": r["timestamp"], "persona_id": PERSONA}
+            for r in records[-RECENT_KEPT:]
+        ]
+    manager._save_recent_messages()
+
+
+def _run_scenario(variant: str, scenario: str, ops: int, gate: str) -> List[Dict]:
+    backend, extra_env = VARIANTS[variant]
+    os.environ.update(extra_env)
+    os.environ["MEMORY_RETRIEVAL_GATE"] = gate
+    from memory_backends import create_memory_store
+    from memory_manager import MemoryManager
+
+    sessions, messages = _parse_scenario(scenario)
+    embedder = HashingEmbedder()
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = create_memory_store(tmp, embedder.get_name(), backend=backend)
+        manager = MemoryManager(persist_directory=tmp, embedder=embedder, store=store)
+
+        start = time.perf_counter()
+        _seed(manager, embedder, sessions, messages)
+        load_seconds = time.perf_counter() - start
+
+        queries = synthetic_sentences(ops, seed=999, max_words=12)
+        targets = [f"bench_{rng.randrange(sessions)}" for _ in range(ops)]
+        calls = {
+            "get_recent_messages": lambda s, q: manager.get_recent_messages(s, 5),
+            "search_relevant_context": lambda s, q: manager.search_relevant_context(s, PERSONA, q, n_results=5),
+            "build_context": lambda s, q: manager.build_context(s, PERSONA, q),
+            "add_message": lambda s, q: manager.add_message(s, PERSONA, "user", q),
+        }
+
+        rows = []
+        for op in OPERATIONS:
+            latencies = []
+            for session_id, query in zip(targets, queries):
+                start = time.perf_counter()
+                calls[op](session_id, query)
+                latencies.append(time.perf_counter() - start)
+            row = {"variant": variant, "sessions": sessions, "messages": messages, "op": op}
+            row.update({k: round(v, 2) for k, v in percentiles(latencies).items()})
+            rows.append(row)
+
+        shared = {
+            "load_s": round(load_seconds, 1),
+            "rss_mb": round(rss_mb(), 1),
+            "disk_mb": round(_dir_size_mb(Path(tmp)), 1),
+            "gate_search_rate": manager.gate.stats()["search_rate"],
+        }
+        for row in rows:
+            row.update(shared)
+    return rows
+
+
+def _worker(queue, *args):
+    try:
+        queue.put(_run_scenario(*args))
+    except Exception as e:
+        queue.put([{"variant": args[0], "sessions": args[1], "error": str(e)}])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MemoryManager at scale")
+    parser.add_argument("--backends", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--scenarios", nargs="+", default=["10x1000", "1000x50", "1x20000"],
+                        help="SESSIONSxMESSAGES, e.g. 100000x10 or 1x100000")
+    parser.add_argument("--ops", type=int, default=200, help="Timed calls per operation")
+    parser.add_argument("--gate", default="adaptive", choices=GATE_MODES, help="Retrieval gate used by build_context")
+    args = parser.parse_args()
+    for scenario in args.scenarios:
+        _parse_scenario(scenario)  # fail before spawning anything
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for variant in args.backends:
+        for scenario in args.scenarios:
+            queue = ctx.Queue()
+            process = ctx.Process(target=_worker, args=(queue, variant, scenario, args.ops, args.gate))
+            process.start()
+            rows.extend(queue.get())
+            process.join()
+            print(f"finished {variant} {scenario}")
+
+    print(tabulate(rows, headers="keys", tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
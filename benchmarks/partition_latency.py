@@ -0,0 +1,91 @@
+"""
+Partition strategy benchmark
+Measures search_relevant_context latency for one session while the rest of
+the corpus (other users' sessions) grows. With per-session or sharded
+partitions latency should stay roughly flat; with the persona partition the
+where-filtered HNSW search slows down as the corpus grows.
+
+Uses the deterministic HashingEmbedder, so no model or network is needed.
+
+Usage:
+    python -m benchmarks.partition_latency
+    python -m benchmarks.partition_latency --sizes 1000 10000 100000 --strategies persona session
+"""
+
+import argparse
+import tempfile
+import time
+from tabulate import tabulate
+from benchmarks.common import HashingEmbedder, percentiles, synthetic_sentences
+from memory_backends.chroma_store import ChromaMemoryStore, PARTITION_STRATEGIES
+from memory_manager import MemoryManager
+
+
+PERSONA = "luna"
+TARGET_SESSION = "bench_target"
+
+
+def _seed(manager: MemoryManager, embedder: HashingEmbedder, session_ids, per_session: int, seed: int):
+    """Bulk-load sessions straight into their collections (skips the per-message JSON writes)."""
+    for n, session_id in enumerate(session_ids):
+        texts = synthetic_sentences(per_session, seed=seed + n)
+        collection = manager.store.get_or_create_collection(PERSONA, session_id)
+        collection.add(
+            ids=[f"{session_id}_{i}" for i in range(per_session)],
+            documents=texts,
+            embeddings=embedder.embed(texts),
+            metadatas=[
+                {"session_id": session_id, "role": "user", "timestamp": str(i), "persona_id": PERSONA}
+                for i in range(per_session)
+            ]
+        )
+
+
+def run_strategy(strategy: str, sizes, per_session: int, queries: int, shards: int):
+    embedder = HashingEmbedder()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaMemoryStore(tmp, embedder.get_name(), partition=strategy, shards=shards)
+        manager = MemoryManager(persist_directory=tmp, embedder=embedder, store=store)
+        _seed(manager, embedder, [TARGET_SESSION], per_session, seed=0)
+        query_texts = synthetic_sentences(queries, seed=999, max_words=12)
+
+        total = per_session
+        next_session = 0
+        for size in sorted(sizes):
+            others = []
+            while total < size:
+                others.append(f"bench_other_{next_session}")
+                next_session += 1
+                total += per_session
+            _seed(manager, embedder, others, per_session, seed=next_session * 1000)
+
+            latencies = []
+            for text in query_texts:
+                start = time.perf_counter()
+                manager.search_relevant_context(TARGET_SESSION, PERSONA, text, n_results=5)
+                latencies.append(time.perf_counter() - start)
+            row = {"strategy": strategy, "corpus": total, "sessions": next_session + 1}
+            row.update({k: round(v, 2) for k, v in percentiles(latencies).items()})
+            rows.append(row)
+            print(f"{strategy}: corpus {total} done")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory partition strategies")
+    parser.add_argument("--strategies", nargs="+", default=PARTITION_STRATEGIES, choices=PARTITION_STRATEGIES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 50000], help="Total messages in the store")
+    parser.add_argument("--per-session", type=int, default=200, help="Messages per session")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per size")
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+
+    rows = []
+    for strategy in args.strategies:
+        rows.extend(run_strategy(strategy, args.sizes, args.per_session, args.queries, args.shards))
+    print(tabulate(rows, headers="keys", tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
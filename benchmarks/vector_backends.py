@@ -0,0 +1,114 @@
+"""
+Long-term memory backend benchmark
+Compares MEMORY_BACKEND options for a single session holding 1k-100k messages:
+import cost, load time, query latency, RSS and disk size.
+
+Each backend runs in a fresh process so import cost and RSS are not polluted
+by the others. Vectors are deterministic random unit vectors (no embedder).
+
+Usage:
+    python -m benchmarks.vector_backends
+    python -m benchmarks.vector_backends --backends numpy numpy-int8 --sizes 1000 100000
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, List
+from tabulate import tabulate
+from benchmarks.common import percentiles, rss_mb, unit_vectors
+
+
+# Benchmark variant -> (MEMORY_BACKEND, extra environment)
+VARIANTS = {
+    "chroma": ("chroma", {"MEMORY_PARTITION": "session", "MEMORY_CHROMA_MODE": "embedded"}),
+    "numpy": ("numpy", {"MEMORY_NUMPY_DTYPE": "float16"}),
+    "numpy-int8": ("numpy", {"MEMORY_NUMPY_DTYPE": "int8"}),
+}
+
+PERSONA = "luna"
+SESSION = "bench_session"
+LOAD_BATCH = 2000
+
+
+def _run_variant(variant: str, sizes: List[int], queries: int, dim: int) -> List[Dict]:
+    backend, extra_env = VARIANTS[variant]
+    os.environ.update(extra_env)
+
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    from memory_backends import create_memory_store
+    with tempfile.TemporaryDirectory() as tmp:
+        store = create_memory_store(tmp, f"random:{dim}", backend=backend)
+        import_seconds = time.perf_counter() - start
+        import_rss = rss_mb() - base_rss
+
+        query_vectors = unit_vectors(queries, dim, seed=999).tolist()
+        rows = []
+        loaded = 0
+        for size in sorted(sizes):
+            start = time.perf_counter()
+            while loaded < size:
+                n = min(LOAD_BATCH, size - loaded)
+                records = [
+                    {"id": f"{SESSION}_{loaded + i}", "content": f"message {loaded + i}", "session_id": SESSION,
+                     "role": "user", "timestamp": str(loaded + i), "persona_id": PERSONA}
+                    for i in range(n)
+                ]
+                store.add(PERSONA, SESSION, records, unit_vectors(n, dim, seed=loaded).tolist())
+                loaded += n
+            load_seconds = time.perf_counter() - start
+
+            store.query(PERSONA, SESSION, query_vectors[0], n_results=5)  # first query maps/loads the index
+            latencies = []
+            for vector in query_vectors:
+                start = time.perf_counter()
+                store.query(PERSONA, SESSION, vector, n_results=5)
+                latencies.append(time.perf_counter() - start)
+
+            row = {
+                "variant": variant,
+                "messages": size,
+                "import_s": round(import_seconds, 2),
+                "import_rss_mb": round(import_rss, 1),
+                "load_s": round(load_seconds, 2),
+            }
+            row.update({k: round(v, 2) for k, v in percentiles(latencies).items()})
+            row["rss_mb"] = round(rss_mb(), 1)
+            row["disk_mb"] = round(store.disk_usage_mb(), 1)
+            rows.append(row)
+    return rows
+
+
+def _worker(queue, *args):
+    try:
+        queue.put(_run_variant(*args))
+    except Exception as e:
+        queue.put([{"variant": args[0], "error": str(e)}])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark long-term memory backends")
+    parser.add_argument("--backends", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000], help="Messages in the session")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per size")
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for variant in args.backends:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_worker, args=(queue, variant, args.sizes, args.queries, args.dim))
+        process.start()
+        rows.extend(queue.get())
+        process.join()
+        print(f"finished {variant}")
+
+    print(tabulate(rows, headers="keys", tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
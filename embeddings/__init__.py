@@ -0,0 +1,60 @@
+"""
+Embedding Backends
+Selects how MemoryManager turns text into vectors (EMBEDDING_BACKEND)
+"""
+
+import os
+from typing import Optional
+from loguru import logger
+from .base_embedder import Embedder
+
+
+EMBEDDING_BACKENDS = ["default", "onnx", "sentence-transformers", "ollama"]
+
+
+def create_embedder(backend: Optional[str] = None) -> Embedder:
+    """
+    Build the configured embedding backend.
+
+    Backends:
+        default: Chroma's built-in embedding function (previous behaviour)
+        onnx: in-process MiniLM on onnxruntime, optionally int8-quantized
+        sentence-transformers: PyTorch model with batched encoding
+        ollama: delegate to Ollama's /api/embed
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "default")).lower()
+    model = os.getenv("EMBEDDING_MODEL")
+    batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    threads = int(os.getenv("EMBEDDING_THREADS", "2"))
+
+    if backend == "onnx":
+        from .onnx_embedder import OnnxEmbedder
+        embedder = OnnxEmbedder(
+            model_dir=os.getenv("EMBEDDING_ONNX_DIR"),
+            quantized=os.getenv("EMBEDDING_ONNX_QUANTIZED", "false").lower() == "true",
+            threads=threads,
+            batch_size=batch_size
+        )
+    elif backend == "sentence-transformers":
+        from .sentence_transformer_embedder import SentenceTransformerEmbedder
+        embedder = SentenceTransformerEmbedder(
+            model_name=model or "all-MiniLM-L6-v2",
+            device=os.getenv("EMBEDDING_DEVICE", "cpu"),
+            threads=threads,
+            batch_size=batch_size
+        )
+    elif backend == "ollama":
+        from .ollama_embedder import OllamaEmbedder
+        embedder = OllamaEmbedder(
+            model_name=model or "nomic-embed-text",
+            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+            batch_size=batch_size
+        )
+    elif backend == "default":
+        from .default_embedder import ChromaDefaultEmbedder
+        embedder = ChromaDefaultEmbedder(batch_size=batch_size)
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Options: {', '.join(EMBEDDING_BACKENDS)}")
+
+    logger.info(f"Embedding backend: {embedder.get_name()}")
+    return embedder
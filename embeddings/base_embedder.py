@@ -0,0 +1,37 @@
+"""
+Embedding Backend Base Class
+All embedding backends implement this interface
+"""
+
+from abc import ABC, abstractmethod
+from typing import List
+
+
+class Embedder(ABC):
+    """Base class for all text embedding backends"""
+
+    def __init__(self, batch_size: int = 32):
+        self.batch_size = max(1, batch_size)
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts.
+
+        Args:
+            texts: Documents or queries to embed
+
+        Returns:
+            One normalized vector per input text, in input order
+        """
+        pass
+
+    @abstractmethod
+    def get_name(self) -> str:
+        """Get the backend name (stored with collections to detect model changes)"""
+        pass
+
+    def _batches(self, texts: List[str]):
+        """Yield texts in chunks of batch_size."""
+        for start in range(0, len(texts), self.batch_size):
+            yield texts[start:start + self.batch_size]
@@ -0,0 +1,25 @@
+"""
+Chroma Default Embedder - whatever embedding function Chroma ships
+Kept as the default so existing collections keep working unchanged
+"""
+
+from typing import List
+from .base_embedder import Embedder
+
+
+class ChromaDefaultEmbedder(Embedder):
+    """Wraps chromadb's DefaultEmbeddingFunction (ONNX all-MiniLM-L6-v2)"""
+
+    def __init__(self, batch_size: int = 32):
+        super().__init__(batch_size)
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        self._function = DefaultEmbeddingFunction()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for batch in self._batches(texts):
+            vectors.extend([list(map(float, v)) for v in self._function(batch)])
+        return vectors
+
+    def get_name(self) -> str:
+        return "default:all-MiniLM-L6-v2"
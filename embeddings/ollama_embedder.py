@@ -0,0 +1,45 @@
+"""
+Ollama Embedder - delegates embedding to Ollama's /api/embed
+Keeps model weights out of the API process entirely
+"""
+
+import math
+from typing import List
+import httpx
+from .base_embedder import Embedder
+
+
+class OllamaEmbedder(Embedder):
+    """Embeddings computed by a local Ollama server"""
+
+    def __init__(
+        self,
+        model_name: str = "nomic-embed-text",
+        base_url: str = "http://localhost:11434",
+        batch_size: int = 64,
+        timeout: float = 30.0
+    ):
+        super().__init__(batch_size)
+        self.model_name = model_name
+        self.base_url = base_url.rstrip("/")
+        # Reused so every batch rides the same keep-alive connection
+        self.client = httpx.Client(timeout=timeout)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for batch in self._batches(texts):
+            response = self.client.post(
+                f"{self.base_url}/api/embed",
+                json={"model": self.model_name, "input": batch}
+            )
+            response.raise_for_status()
+            vectors.extend(self._normalize(v) for v in response.json()["embeddings"])
+        return vectors
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1e-12
+        return [x / norm for x in vector]
+
+    def get_name(self) -> str:
+        return f"ollama:{self.model_name}"
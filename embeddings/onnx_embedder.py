@@ -0,0 +1,104 @@
+"""
+ONNX Embedder - in-process MiniLM on onnxruntime
+Same model as Chroma's default, but with pinned intra-op threads,
+dynamic padding and an optional int8-quantized graph so the API
+process stays light.
+"""
+
+from pathlib import Path
+from typing import List, Optional
+from loguru import logger
+from .base_embedder import Embedder
+
+
+# Chroma downloads all-MiniLM-L6-v2 here the first time its default function runs
+DEFAULT_MODEL_DIR = Path.home() / ".cache" / "chroma" / "onnx_models" / "all-MiniLM-L6-v2" / "onnx"
+
+
+class OnnxEmbedder(Embedder):
+    """Sentence embeddings from an exported MiniLM ONNX graph"""
+
+    def __init__(
+        self,
+        model_dir: Optional[str] = None,
+        quantized: bool = False,
+        threads: int = 2,
+        batch_size: int = 32,
+        max_length: int = 256
+    ):
+        super().__init__(batch_size)
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.np = np
+        self.model_dir = Path(model_dir) if model_dir else DEFAULT_MODEL_DIR
+        self.quantized = quantized
+        self.threads = threads
+
+        model_path = self.model_dir / "model.onnx"
+        if not model_path.exists():
+            self._download_model()
+        if quantized:
+            model_path = self._quantized_model(model_path)
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        # Pad to the longest text in each batch rather than a fixed 256 tokens
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.log_severity_level = 3
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        logger.info(f"ONNX embedder loaded: {model_path} ({threads} threads)")
+
+    def _download_model(self):
+        """Fetch the model through Chroma's downloader (same files, same cache dir)."""
+        if self.model_dir != DEFAULT_MODEL_DIR:
+            raise FileNotFoundError(f"No model.onnx found in {self.model_dir}")
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+        logger.info("Downloading all-MiniLM-L6-v2 ONNX model...")
+        ONNXMiniLM_L6_V2()._download_model_if_not_exists()
+
+    def _quantized_model(self, model_path: Path) -> Path:
+        """Return the int8 graph, quantizing the fp32 one on first use."""
+        quantized_path = self.model_dir / "model_quantized.onnx"
+        if not quantized_path.exists():
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            logger.info(f"Quantizing {model_path} -> {quantized_path}")
+            quantize_dynamic(str(model_path), str(quantized_path), weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        np = self.np
+        vectors = []
+        for batch in self._batches(texts):
+            encoded = self.tokenizer.encode_batch(batch)
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+            last_hidden_state = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real (non-padding) tokens, then L2 normalize
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            norms[norms == 0] = 1e-12
+            vectors.extend((pooled / norms).astype(np.float32).tolist())
+        return vectors
+
+    def get_name(self) -> str:
+        return "onnx:all-MiniLM-L6-v2"
@@ -0,0 +1,44 @@
+"""
+Sentence-Transformers Embedder - PyTorch models with batched encoding
+Heavier than ONNX, but any Hugging Face sentence-transformers model works
+"""
+
+from typing import List
+from loguru import logger
+from .base_embedder import Embedder
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Embeddings from a sentence-transformers model"""
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        device: str = "cpu",
+        threads: int = 2,
+        batch_size: int = 32
+    ):
+        super().__init__(batch_size)
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if device == "cpu":
+            torch.set_num_threads(threads)
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+        logger.info(f"sentence-transformers embedder loaded: {model_name} on {device}")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        # encode() batches internally; one call keeps the tokenizer/model hot
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+    def get_name(self) -> str:
+        return f"sentence-transformers:{self.model_name}"
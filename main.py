@@ -8,6 +8,10 @@ Phase 5: Persona management
 
 import os
 import re
+import tempfile
+import uuid
+import base64
+import json
 from typing import Optional, List, Dict
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -124,10 +128,15 @@ def enhance_image_prompt(user_prompt: str, image_style: str) -> str:
         # No special content, use normal combination
         return f"{', '.join(prompt_parts)}, {image_style}"
 from providers import ImageProviderManager
+from providers.health import HealthRegistry
+from providers.fallback_chain import FallbackChain, ImageTier, ImageRequest, ImageChainError, ChainResult
+from providers.image_previews import PreviewHub
 from tts_service import TTSService
 from coqui_tts_client import coqui_tts_client
 from persona_manager import get_persona_manager, Persona
 from memory_manager import memory_manager
+from memory_backends import check_persona_id
+from memory_summarizer import MemorySummarizer
 
 # Load environment variables
 load_dotenv("config/.env")
@@ -137,10 +146,94 @@ logger.remove()
 logger.add(sys.stderr, level="INFO")
 logger.add("outputs/logs/unicorn_ai.log", rotation="10 MB", retention="7 days", level="DEBUG")
 
-# Global flag for image generation state
+# Images being generated; background jobs wait for them (chat only waits when
+# the VRAM planner unloaded its model for one). Concurrent requests are not
+# serialized here: the ComfyUI provider's scheduler coalesces them into shared prompts
 import asyncio
-_image_generation_in_progress = False
-_image_generation_lock = asyncio.Lock()
+from contextlib import asynccontextmanager
+_image_generations = 0
+
+
+@asynccontextmanager
+async def image_generation():
+    global _image_generations
+    _image_generations += 1
+    _publish_gpu_activity()
+    try:
+        yield
+    finally:
+        _image_generations -= 1
+        _publish_gpu_activity()
+
+# Generated images are written exactly once, off the event loop
+from concurrent.futures import ThreadPoolExecutor
+GENERATED_IMAGES_DIR = "outputs/generated_images"
+_image_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-writer")
+
+
+def _write_image_file(filepath: str, image_data: bytes):
+    # Write-then-rename so /outputs and the Telegram bot never read a half-written file
+    tmp_path = f"{filepath}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(image_data)
+    os.replace(tmp_path, filepath)
+
+
+async def save_generated_image(image_data: bytes, filename: str) -> str:
+    """Store generated image bytes in GENERATED_IMAGES_DIR; returns the URL it is served under."""
+    filepath = os.path.join(GENERATED_IMAGES_DIR, filename)
+    await asyncio.get_running_loop().run_in_executor(_image_writer, _write_image_file, filepath, image_data)
+    return f"/{GENERATED_IMAGES_DIR}/{filename}"
+
+# GPU-bound requests in flight and when the last one finished; background
+# jobs (memory summarization) only run once the GPU has been idle for a while
+import time as _time
+GPU_BOUND_PATHS = ("/chat", "/generate-image", "/generate-voice", "/ollama/pull")
+_gpu_requests = 0
+_gpu_last_active = _time.monotonic()
+# With several API workers (shared memory store) each one also writes its
+# activity to a file here, so idleness means idle in every worker
+GPU_ACTIVITY_DIR = memory_manager.persist_dir / ".gpu_activity"
+
+
+def _publish_gpu_activity():
+    """Write this worker's GPU work in flight and the time of the change (shared mode only)."""
+    if not memory_manager.store.shared:
+        return
+    GPU_ACTIVITY_DIR.mkdir(exist_ok=True)
+    path = GPU_ACTIVITY_DIR / str(os.getpid())
+    temp = path.with_suffix(".tmp")
+    temp.write_text(f"{_gpu_requests + _image_generations} {_time.time()}")
+    os.replace(temp, path)
+
+
+def _other_workers_idle(idle_secs: float) -> bool:
+    """Whether no other API worker has GPU work in flight or had some in the last idle_secs."""
+    for path in GPU_ACTIVITY_DIR.glob("[0-9]*"):
+        if path.suffix or path.name == str(os.getpid()):
+            continue
+        try:
+            os.kill(int(path.name), 0)
+            busy, last_active = path.read_text().split()
+        except ProcessLookupError:
+            path.unlink(missing_ok=True)  # worker exited
+            continue
+        except (OSError, ValueError):
+            continue
+        if int(busy) > 0 or _time.time() - float(last_active) < idle_secs:
+            return False
+    return True
+
+
+def gpu_idle() -> bool:
+    """No chat/image/voice request running (in any worker) and none for MEMORY_SUMMARY_IDLE_SECS."""
+    idle_secs = float(os.getenv("MEMORY_SUMMARY_IDLE_SECS", "120"))
+    return (
+        _gpu_requests == 0
+        and _image_generations == 0
+        and _time.monotonic() - _gpu_last_active >= idle_secs
+        and (not memory_manager.store.shared or _other_workers_idle(idle_secs))
+    )
 
 # Initialize FastAPI
 app = FastAPI(
@@ -149,6 +242,21 @@ app = FastAPI(
     version="0.6.0 - Phase 6: Web UI"
 )
 
+@app.middleware("http")
+async def track_gpu_activity(request: Request, call_next):
+    """Count GPU-bound requests so background jobs can wait for an idle GPU."""
+    global _gpu_requests, _gpu_last_active
+    if not request.url.path.startswith(GPU_BOUND_PATHS):
+        return await call_next(request)
+    _gpu_requests += 1
+    _publish_gpu_activity()
+    try:
+        return await call_next(request)
+    finally:
+        _gpu_requests -= 1
+        _gpu_last_active = _time.monotonic()
+        _publish_gpu_activity()
+
 # Mount static files for Web UI
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
@@ -167,8 +275,247 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 # Note: Model, temperature, and tokens are now persona-specific
 # Each persona can use different settings
 
+# Upstream services (ComfyUI, Replicate, Ollama), probed in the background; request paths read the cache
+service_health = HealthRegistry()
+
+
+async def _ollama_available() -> bool:
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        response = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
+        return response.status_code == 200
+
+
+service_health.register("ollama", _ollama_available)
+
 # Image generation
-image_manager = ImageProviderManager()
+image_manager = ImageProviderManager(health=service_health)
+
+IMAGE_NEGATIVE_PROMPT = "(worst quality:1.5), (low quality:1.5), (normal quality:1.5), lowres, bad anatomy, bad hands, multiple eyebrow, (cropped), extra limb, missing limbs, deformed hands, long neck, long body, (bad hands), signature, username, artist name, conjoined fingers, deformed fingers, ugly eyes, imperfect eyes, skewed eyes, unnatural face, unnatural body, error, painting by bad-artist, ugly, deformed, noisy, blurry, distorted, grainy, text, watermark"
+LOWRES_NEGATIVE_PROMPT = "(worst quality:1.5), (low quality:1.5)"
+
+
+def _styled_image_prompt(request: ImageRequest) -> str:
+    """The prompt plus the persona's look, for workflows without a reference face."""
+    persona = request.persona
+    if not persona.image_style:
+        return f"{persona.name}, {request.prompt}"
+    if request.enhance:
+        return enhance_image_prompt(request.prompt, persona.image_style)
+    return f"{request.prompt}, {persona.image_style}"
+
+
+# Image fallback chain: tried in order until one produces an image, all
+# within IMAGE_DEADLINE_SECONDS. Tiers that can't finish in the time left are skipped.
+IMAGE_TIERS = [
+    # Personas with a reference face: InstantID, prompt used as-is
+    ImageTier(
+        name="instantid",
+        workflow_path="workflows/instantid_template.json",
+        prompt=lambda request: request.prompt,
+        negative_prompt=IMAGE_NEGATIVE_PROMPT,
+        applies=lambda request: request.reference_image is not None
+    ),
+    ImageTier(
+        name="standard",
+        workflow_path="workflows/sdxl_Character_profile_api.json",
+        prompt=_styled_image_prompt,
+        negative_prompt=IMAGE_NEGATIVE_PROMPT
+    ),
+    ImageTier(
+        name="lowres",
+        workflow_path="workflows/sdxl_Character_profile_api.json",
+        prompt=lambda request: f"{request.persona.name}, {request.prompt}",
+        negative_prompt=LOWRES_NEGATIVE_PROMPT,
+        size=(512, 512)
+    ),
+]
+# Tiers are skipped by their lowest-quality estimate, since ComfyUI scales quality to the time left
+image_chain = FallbackChain(
+    IMAGE_TIERS,
+    image_manager.generate_image,
+    sampling_range=image_manager.provider("comfyui").sampling_range
+)
+
+
+def image_request(prompt: str, persona: Persona, width: int, height: int, enhance: bool = False, **options) -> ImageRequest:
+    """An image request for a persona (with its reference face when it has one)."""
+    reference_image = f"reference_images/{persona.id}.png"
+    return ImageRequest(
+        prompt=prompt,
+        width=width,
+        height=height,
+        persona=persona,
+        reference_image=reference_image if os.path.exists(reference_image) else None,
+        enhance=enhance,
+        options=options
+    )
+
+
+async def run_image_chain(request: ImageRequest) -> ChainResult:
+    """Generate through the fallback chain, recording the attempt for /comfyui/last-generation."""
+    first = next(tier for tier in IMAGE_TIERS if tier.applies(request))
+    _last_image_generation.update({
+        "timestamp": _time.time(),
+        "persona": request.persona.name,
+        "original_prompt": request.prompt,
+        "full_prompt": first.prompt(request),
+        "negative_prompt": first.negative_prompt,
+        "image_style": request.persona.image_style,
+        "width": request.width,
+        "height": request.height,
+        "progress": None,
+        "success": None,
+        "error": None,
+        "tier": None,
+        "attempts": None
+    })
+    try:
+        result = await image_chain.run(request)
+    except ImageChainError as e:
+        _last_image_generation.update({"success": False, "error": str(e), "attempts": e.attempts})
+        raise
+    _last_image_generation.update({"success": True, "tier": result.tier, "attempts": result.attempts})
+    return result
+
+# Two-phase [IMAGE: ...] replies: a few-step turbo draft goes out with the chat
+# reply, the full render follows in the background and overwrites the draft's
+# file. A newer message in the same session skips the full render.
+IMAGE_DRAFTS = os.getenv("IMAGE_DRAFTS", "false").lower() == "true"
+IMAGE_DRAFT_WORKFLOW = os.getenv("IMAGE_DRAFT_WORKFLOW", "workflows/sdxl_turbo_draft_api.json")
+IMAGE_DRAFT_SIZE = int(os.getenv("IMAGE_DRAFT_SIZE", "512"))
+IMAGE_JOBS_KEPT = 200
+draft_chain = FallbackChain(
+    [ImageTier(
+        name="draft",
+        workflow_path=IMAGE_DRAFT_WORKFLOW,
+        prompt=_styled_image_prompt,
+        negative_prompt=LOWRES_NEGATIVE_PROMPT,
+        size=(IMAGE_DRAFT_SIZE, IMAGE_DRAFT_SIZE)
+    )],
+    image_manager.generate_image,
+    budget=float(os.getenv("IMAGE_DRAFT_DEADLINE_SECONDS", "30")),
+    sampling_range=image_manager.provider("comfyui").sampling_range
+)
+if IMAGE_DRAFTS:
+    image_manager.provider("comfyui").startup_workflows.append(IMAGE_DRAFT_WORKFLOW)
+_image_jobs: Dict[str, dict] = {}  # job id -> status of a background full render
+_image_job_tasks: Dict[str, asyncio.Task] = {}
+_session_image_jobs: Dict[str, str] = {}  # session id -> its latest job id
+
+
+def skip_image_job(session_id: str):
+    """The session moved on: drop its unfinished full render (a queued prompt is never sent)."""
+    job_id = _session_image_jobs.pop(session_id, None)
+    task = _image_job_tasks.get(job_id)
+    if task is not None and not task.done():
+        logger.info(f"Skipping full image render {job_id}: session {session_id} moved on")
+        task.cancel()
+
+
+async def _render_final_image(job_id: str, request: ImageRequest, filename: str):
+    job = _image_jobs[job_id]
+    try:
+        async with image_generation():
+            generated = await run_image_chain(request)
+        # Same file as the draft, so anything holding its URL gets the full image
+        url = await save_generated_image(generated.image, filename)
+        job.update(status="done", tier=generated.tier, image_url=f"{url}?v=final")
+        logger.info(f"Full image {job_id} replaced its draft (tier: {generated.tier})")
+    except asyncio.CancelledError:
+        job["status"] = "skipped"
+    except Exception as e:
+        logger.warning(f"Full image render {job_id} failed, keeping the draft: {e}")
+        job.update(status="failed", error=str(e))
+    finally:
+        job["finished"] = _time.time()
+        preview_hub.publish(job["session_id"], "done", {"status": job["status"], "job": job_id, "image_url": job["image_url"]})
+        _image_job_tasks.pop(job_id, None)
+        if _session_image_jobs.get(job["session_id"]) == job_id:
+            del _session_image_jobs[job["session_id"]]
+
+
+async def send_draft_image(request: ImageRequest, session_id: str) -> tuple:
+    """
+    Render a quick draft and queue the full render behind it.
+    
+    Returns:
+        (draft image URL, job id for /images/jobs/{job_id})
+    
+    Raises:
+        ImageChainError: The draft failed (no job is queued)
+    """
+    async with image_generation():
+        draft = await draft_chain.run(request)
+    job_id = uuid.uuid4().hex[:12]
+    filename = f"{request.persona.id}_{int(_time.time())}_{job_id}.png"
+    url = await save_generated_image(draft.image, filename)
+    logger.info(f"Draft image sent ({draft.attempts[0]['seconds']}s), full render {job_id} queued")
+    
+    while len(_image_jobs) >= IMAGE_JOBS_KEPT:
+        del _image_jobs[next(iter(_image_jobs))]
+    _image_jobs[job_id] = {
+        "job_id": job_id,
+        "session_id": session_id,
+        "status": "rendering",
+        "draft_url": url,
+        "image_url": url,
+        "tier": "draft",
+        "error": None,
+        "created": _time.time(),
+        "finished": None
+    }
+    _session_image_jobs[session_id] = job_id
+    _image_job_tasks[job_id] = asyncio.create_task(_render_final_image(job_id, request, filename))
+    return url, job_id
+
+# Live image progress and previews per session (GET /images/previews/{session_id}),
+# and the image each session is waiting for, so POST /images/cancel/{session_id} can stop it
+preview_hub = PreviewHub()
+_image_tasks: Dict[str, asyncio.Task] = {}
+
+
+def image_callbacks(session_id: str) -> dict:
+    """on_progress/on_preview options publishing a session's image progress and previews."""
+    def on_progress(update: dict):
+        _track_image_progress(update)
+        preview_hub.publish(session_id, "progress", _last_image_generation["progress"])
+    
+    def on_preview(update: dict):
+        encoded = base64.b64encode(update["preview"]).decode("ascii")
+        preview_hub.publish(session_id, "preview", {"image": f"data:{update['mime']};base64,{encoded}"})
+    
+    return {"on_progress": on_progress, "on_preview": on_preview}
+
+
+async def cancellable_image(session_id: str, generation):
+    """
+    Await an image generation that POST /images/cancel/{session_id} can stop.
+    
+    Returns None when it was cancelled that way. If the caller itself is
+    cancelled (the client went away), the generation is cancelled with it.
+    """
+    task = asyncio.ensure_future(generation)
+    _image_tasks[session_id] = task
+    try:
+        await asyncio.wait({task})
+    except asyncio.CancelledError:
+        task.cancel()
+        preview_hub.publish(session_id, "done", {"status": "cancelled"})
+        raise
+    finally:
+        if _image_tasks.get(session_id) is task:
+            del _image_tasks[session_id]
+    if task.cancelled():
+        preview_hub.publish(session_id, "done", {"status": "cancelled"})
+        return None
+    preview_hub.publish(session_id, "done", {"status": "failed" if task.exception() else "done"})
+    return task.result()
+
+
+async def counted_image_chain(request: ImageRequest) -> ChainResult:
+    """run_image_chain, counted as an image generation (chat waits for the GPU meanwhile)."""
+    async with image_generation():
+        return await run_image_chain(request)
 
 # Persona management (must be initialized first)
 persona_manager = get_persona_manager()
@@ -178,12 +525,54 @@ current_persona = persona_manager.get_current_persona()
 tts_service = TTSService(voice=current_persona.voice)
 
 
+@app.on_event("startup")
+async def lock_memory_directory():
+    """Let offline memory tools (reindex --swap) see that the API is running."""
+    memory_manager.hold_api_lock()
+
+
+@app.on_event("startup")
+async def warm_up_memory():
+    """Page long-term memory indexes in before the first chat request needs them."""
+    await asyncio.to_thread(memory_manager.warm_up)
+
+
+@app.on_event("startup")
+async def check_image_workflows():
+    """Compile the image workflows and validate them against ComfyUI; broken ones are logged and disabled."""
+    await image_manager.prepare()
+
+
+# Background summarization of long sessions (runs while the GPU is idle)
+memory_summarizer = MemorySummarizer(memory_manager, is_idle=gpu_idle)
+_background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_memory_summarizer():
+    """Start the memory summarization loop."""
+    if memory_summarizer.enabled:
+        task = asyncio.create_task(memory_summarizer.run())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+@app.on_event("startup")
+async def start_health_prober():
+    """Keep the cached status of ComfyUI, Replicate and Ollama fresh."""
+    task = asyncio.create_task(service_health.run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 class ChatRequest(BaseModel):
     message: str
     persona_id: Optional[str] = None  # Optional persona ID to use
     session_id: Optional[str] = "web_default"  # Session ID for memory
     temperature: Optional[float] = None
     max_tokens: Optional[int] = None
+    fresh_image: bool = False  # Skip the image cache for a new variation of an [IMAGE: ...]
+    draft_image: Optional[bool] = None  # Quick draft first, full render in the background (default: IMAGE_DRAFTS)
 
 
 class PersonaInfo(BaseModel):
@@ -234,6 +623,8 @@ class ChatResponse(BaseModel):
     has_image: bool = False
     image_prompt: Optional[str] = None
     image_url: Optional[str] = None
+    image_tier: Optional[str] = None  # which fallback tier produced the image
+    image_job: Optional[str] = None  # set for a draft: poll /images/jobs/{image_job} for the full image
 
 
 def get_user_profile() -> dict:
@@ -307,22 +698,6 @@ async def chat_with_ollama(message: str, persona: Persona, session_id: str = "de
     Each persona can use a different LLM model based on their role.
     Now includes memory context for conversation continuity.
     """
-    global _image_generation_in_progress
-    
-    # Wait if image generation is in progress (with timeout)
-    if _image_generation_in_progress:
-        logger.info("Waiting for image generation to complete before chat...")
-        timeout = 60  # Max 60 seconds wait
-        elapsed = 0
-        while _image_generation_in_progress and elapsed < timeout:
-            await asyncio.sleep(0.5)
-            elapsed += 0.5
-        
-        if elapsed >= timeout:
-            logger.warning("Image generation timeout - proceeding with chat anyway")
-        else:
-            logger.info("Image generation complete, resuming chat")
-    
     url = f"{OLLAMA_BASE_URL}/api/generate"
     
     # Use persona settings or defaults
@@ -330,11 +705,15 @@ async def chat_with_ollama(message: str, persona: Persona, session_id: str = "de
     tokens = max_tokens if max_tokens is not None else persona.max_tokens
     model = persona.model  # Each persona can use a different LLM!
     
+    # Wait (up to 60s) only if a running image needed this model unloaded; otherwise both fit
+    if await image_manager.provider("comfyui").vram.wait_for_model(model, timeout=60):
+        logger.info(f"Resuming chat after the image that unloaded {model}")
+    
     # Build prompt with user profile context
     system_prompt = await build_system_prompt(persona)
     
     # Get conversation context from memory (if enabled)
-    memory_context = memory_manager.build_context(
+    memory_context = await memory_manager.build_context_async(
         session_id=session_id,
         persona_id=persona.id,
         current_message=message,
@@ -379,6 +758,8 @@ async def chat_with_ollama(message: str, persona: Persona, session_id: str = "de
             result = response.json()
             
             logger.info(f"Ollama response received: {result.get('done', False)}")
+            # Logs what reloading the model cost if an image unloaded it
+            image_manager.provider("comfyui").vram.note_load(model, result.get("load_duration", 0) / 1e9)
             return result
             
     except httpx.TimeoutException:
@@ -386,6 +767,8 @@ async def chat_with_ollama(message: str, persona: Persona, session_id: str = "de
         raise HTTPException(status_code=504, detail="AI model timed out")
     except httpx.HTTPError as e:
         logger.error(f"Ollama HTTP error: {e}")
+        if isinstance(e, httpx.TransportError):
+            service_health.invalidate("ollama", str(e))
         raise HTTPException(status_code=500, detail=f"AI model error: {str(e)}")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
@@ -414,13 +797,7 @@ async def api_status():
 async def health_check():
     """Detailed health check including Ollama status"""
     current_persona = persona_manager.get_current_persona()
-    
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
-            ollama_status = "online" if response.status_code == 200 else "error"
-    except Exception:
-        ollama_status = "offline"
+    ollama_status = "online" if await service_health.is_available("ollama") else "offline"
     
     return {
         "api": "online",
@@ -429,15 +806,29 @@ async def health_check():
             "id": current_persona.id,
             "name": current_persona.name,
             "model": current_persona.model
-        }
+        },
+        "services": service_health.snapshot()
     }
 
 
 @app.post("/generate-image")
-async def generate_image(prompt: str, width: int = 512, height: int = 512, persona_id: Optional[str] = None):
+async def generate_image(
+    prompt: str,
+    width: int = 512,
+    height: int = 512,
+    persona_id: Optional[str] = None,
+    seed: Optional[int] = None,
+    fresh: bool = False,
+    session_id: Optional[str] = None
+):
     """
     Generate an image from a text prompt using current or specified persona's style.
     
+    Identical requests return the cached image; pass a seed to pick a specific
+    variation, or fresh=true for a new random one. With a session_id, progress and
+    live previews go to /images/previews/{session_id} and /images/cancel/{session_id}
+    can stop the image.
+    
     Example:
         curl -X POST "http://localhost:8000/generate-image?prompt=beautiful+woman+selfie"
     """
@@ -445,115 +836,22 @@ async def generate_image(prompt: str, width: int = 512, height: int = 512, perso
     
     # Get persona for character-consistent generation
     persona = get_persona_for_request(persona_id)
-    
-    negative_prompt = "(worst quality:1.5), (low quality:1.5), (normal quality:1.5), lowres, bad anatomy, bad hands, multiple eyebrow, (cropped), extra limb, missing limbs, deformed hands, long neck, long body, (bad hands), signature, username, artist name, conjoined fingers, deformed fingers, ugly eyes, imperfect eyes, skewed eyes, unnatural face, unnatural body, error, painting by bad-artist, ugly, deformed, noisy, blurry, distorted, grainy, text, watermark"
+    callbacks = image_callbacks(session_id) if session_id else {"on_progress": _track_image_progress}
+    request = image_request(prompt, persona, width, height, seed=seed, fresh=fresh, **callbacks)
     
     try:
-        # Check if persona has a reference image for InstantID
-        import os
-        reference_image_path = f"reference_images/{persona.id}.png"
-        has_reference_image = os.path.exists(reference_image_path)
-        
-        # Build character-consistent prompt
-        if has_reference_image:
-            # For personas with reference images, use InstantID with prompt as-is
-            character_prompt = prompt
-            logger.info(f"Using InstantID for {persona.name} - prompt used as-is: {prompt}")
-        elif persona.image_style:
-            # Use image_style (which has visual details) + user prompt for other personas
-            character_prompt = f"{prompt}, {persona.image_style}"
+        if session_id:
+            result = await cancellable_image(session_id, run_image_chain(request))
+            if result is None:
+                raise HTTPException(status_code=409, detail="Image generation cancelled")
         else:
-            # Fallback: use persona name if no image_style defined
-            character_prompt = f"{persona.name}, {prompt}"
-        
-        # Store debug info
-        import time
-        _last_image_generation.update({
-            "timestamp": time.time(),
-            "persona": persona.name,
-            "original_prompt": prompt,
-            "full_prompt": character_prompt,
-            "negative_prompt": negative_prompt,
-            "image_style": persona.image_style,
-            "width": width,
-            "height": height,
-            "success": None,
-            "error": None
-        })
-        
-        # Determine which workflow to use based on persona
-        workflow_path = None
-        if has_reference_image:
-            workflow_path = "workflows/instantid_template.json"
-            logger.info(f"Using InstantID workflow for {persona.name} persona")
-        else:
-            # Use default workflow for other personas
-            workflow_path = "workflows/sdxl_Character_profile_api.json"
-            logger.info(f"Using standard workflow for {persona.name} persona")
-        
-        # Generate image
-        image_data = await image_manager.generate_image(
-            prompt=character_prompt,
-            negative_prompt=negative_prompt,
-            width=width,
-            height=height,
-            workflow_path=workflow_path,
-            persona_name=persona.id
-        )
-        
-        _last_image_generation["success"] = True
-        logger.info(f"Image generated successfully for persona: {persona.name}")
-        
-        return Response(content=image_data, media_type="image/png")
-        
-    except Exception as e:
-        _last_image_generation["success"] = False
-        _last_image_generation["error"] = str(e)
+            result = await run_image_chain(request)
+    except ImageChainError as e:
         logger.error(f"Image generation failed: {e}")
-        
-        # Try fallback strategies for API endpoint
-        try:
-            # Strategy 1: If InstantID failed, try standard workflow
-            if has_reference_image and "InstantID" in str(e):
-                logger.info("InstantID failed, attempting fallback to standard workflow...")
-                fallback_character_prompt = f"{prompt}, {persona.image_style}" if persona.image_style else f"{persona.name}, {prompt}"
-                
-                image_data = await image_manager.generate_image(
-                    prompt=fallback_character_prompt,
-                    negative_prompt=negative_prompt,
-                    width=width,
-                    height=height,
-                    workflow_path="workflows/sdxl_Character_profile_api.json",
-                    persona_name=persona.id
-                )
-                
-                _last_image_generation["success"] = True
-                logger.info("Fallback to standard workflow succeeded")
-                return Response(content=image_data, media_type="image/png")
-                
-            # Strategy 2: Try lower resolution
-            else:
-                logger.info("Attempting low-resolution fallback...")
-                simple_prompt = f"{persona.name}, {prompt}" if persona.image_style else prompt
-                
-                image_data = await image_manager.generate_image(
-                    prompt=simple_prompt,
-                    negative_prompt="(worst quality:1.5), (low quality:1.5)",
-                    width=512,
-                    height=512,
-                    workflow_path="workflows/sdxl_Character_profile_api.json",
-                    persona_name=persona.id
-                )
-                
-                _last_image_generation["success"] = True
-                logger.info("Low-resolution fallback succeeded")
-                return Response(content=image_data, media_type="image/png")
-                
-        except Exception as fallback_error:
-            logger.error(f"All fallback strategies failed: {fallback_error}")
-        
-        # If all strategies failed, return error
-        raise HTTPException(status_code=500, detail=f"Image generation failed after trying multiple strategies: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Image generation failed: {e}")
+    
+    logger.info(f"Image generated for persona {persona.name} (tier: {result.tier})")
+    return Response(content=result.image, media_type="image/png", headers={"X-Image-Tier": result.tier})
 
 
 @app.get("/generate-voice")
@@ -616,6 +914,11 @@ async def get_last_image_generation_debug():
         "success": True,
         "last_generation": _last_image_generation,
         "comfyui_status": await check_comfyui_status(),
+        "image_cache": image_manager.provider("comfyui").cache.stats(),
+        "image_scheduler": image_manager.provider("comfyui").scheduler.status(),
+        "image_tiers": image_chain.status(),
+        "image_previews": {**image_manager.provider("comfyui").previews.status(), "watching": len(preview_hub.channels)},
+        "image_drafts": {**draft_chain.status(), "enabled": IMAGE_DRAFTS, "jobs": len(_image_jobs), "rendering": len(_image_job_tasks)},
         "available_workflows": [
             "workflows/sdxl_Character_profile_api.json",
             "workflows/instantid_template.json"
@@ -627,19 +930,13 @@ async def get_last_image_generation_debug():
     }
 
 async def check_comfyui_status():
-    """Helper function to check ComfyUI health"""
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get("http://localhost:8188/system_stats")
-            return {
-                "available": response.status_code == 200,
-                "status_code": response.status_code
-            }
-    except Exception as e:
-        return {
-            "available": False,
-            "error": str(e)
-        }
+    """Helper function to check ComfyUI health (cached by the health registry)"""
+    available = await service_health.is_available("comfyui")
+    return {
+        **service_health.snapshot()["comfyui"],
+        "available": available,
+        "backends": image_manager.provider("comfyui").pool.status()
+    }
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -654,12 +951,15 @@ async def chat(request: ChatRequest):
     """
     logger.info(f"Received message: {request.message[:50]}...")
     
+    # A full image still rendering for an earlier reply is no longer wanted
+    skip_image_job(request.session_id)
+    
     # Get the persona to use
     persona = get_persona_for_request(request.persona_id)
     logger.info(f"Using persona: {persona.name} ({persona.id})")
     
     # Store user message in memory
-    memory_manager.add_message(
+    await memory_manager.add_message_async(
         session_id=request.session_id,
         persona_id=persona.id,
         role="user",
@@ -696,6 +996,8 @@ async def chat(request: ChatRequest):
     has_image = False
     image_prompt = None
     image_url = None
+    image_tier = None
+    image_job = None
     image_match = re.search(r'\[IMAGE:\s*([^\]]+)\]', ai_response, re.IGNORECASE)
     
     if image_match:
@@ -704,164 +1006,44 @@ async def chat(request: ChatRequest):
         logger.info(f"Image requested: {image_prompt}")
         
         # Generate the image
-        global _image_generation_in_progress
-        
         try:
-            # Acquire lock to ensure only one image at a time
-            async with _image_generation_lock:
-                _image_generation_in_progress = True
-                logger.info("Image generation started - Ollama models will be unloaded")
-                
+            full_request = image_request(
+                image_prompt, persona, 1024, 1024, enhance=True,
+                fresh=request.fresh_image, **image_callbacks(request.session_id)
+            )
+            use_draft = request.draft_image if request.draft_image is not None else IMAGE_DRAFTS
+            cancelled = False
+            if use_draft:
                 try:
-                    # Check if persona has a reference image for InstantID 
-                    import os
-                    reference_image_path = f"reference_images/{persona.id}.png"
-                    has_reference_image = os.path.exists(reference_image_path)
-                    
-                    # Build character-consistent prompt
-                    if has_reference_image:
-                        # For personas with reference images, use InstantID with prompt as-is
-                        character_prompt = image_prompt
-                        logger.info(f"Using InstantID for {persona.name} - prompt used as-is: {image_prompt}")
-                    elif persona.image_style:
-                        # Use enhanced prompt builder to add proper weights for other personas
-                        character_prompt = enhance_image_prompt(image_prompt, persona.image_style)
-                    else:
-                        # Fallback: use persona name if no image_style defined
-                        character_prompt = f"{persona.name}, {image_prompt}"
-                    
-                    negative_prompt = "(worst quality:1.5), (low quality:1.5), (normal quality:1.5), lowres, bad anatomy, bad hands, multiple eyebrow, (cropped), extra limb, missing limbs, deformed hands, long neck, long body, (bad hands), signature, username, artist name, conjoined fingers, deformed fingers, ugly eyes, imperfect eyes, skewed eyes, unnatural face, unnatural body, error, painting by bad-artist, ugly, deformed, noisy, blurry, distorted, grainy, text, watermark"
-                    
-                    # Store debug info
-                    import time
-                    _last_image_generation.update({
-                        "timestamp": time.time(),
-                        "persona": persona.name,
-                        "original_prompt": image_prompt,
-                        "full_prompt": character_prompt,
-                        "negative_prompt": negative_prompt,
-                        "image_style": persona.image_style,
-                        "width": 1024,
-                        "height": 1024,
-                        "success": None,
-                        "error": None
-                    })
-                    
-                    # Determine which workflow to use based on persona
-                    workflow_path = None
-                    if has_reference_image:
-                        workflow_path = "workflows/instantid_template.json"
-                        logger.info(f"Using InstantID workflow for {persona.name} persona")
+                    drafted = await cancellable_image(request.session_id, send_draft_image(full_request, request.session_id))
+                    if drafted is None:
+                        cancelled = True
                     else:
-                        # Use default workflow for other personas
-                        workflow_path = "workflows/sdxl_Character_profile_api.json"
-                        logger.info(f"Using standard workflow for {persona.name} persona")
-                    
-                    # Generate image (this will unload Ollama internally)
-                    image_data = await image_manager.generate_image(
-                        prompt=character_prompt,
-                        negative_prompt=negative_prompt,
-                        width=1024,
-                        height=1024,
-                        workflow_path=workflow_path,
-                        persona_name=persona.id
-                    )
-                    
-                    _last_image_generation["success"] = True
-                    
-                    # Save image with timestamp
-                    import time
-                    timestamp = int(time.time())
-                    filename = f"{persona.id}_{timestamp}.png"
-                    filepath = f"outputs/generated_images/{filename}"
-                    
-                    with open(filepath, 'wb') as f:
-                        f.write(image_data)
-                    
-                    image_url = f"/outputs/generated_images/{filename}"
-                    logger.info(f"Image saved: {filepath}")
-                    
-                finally:
-                    # Always clear flag even if generation fails
-                    _image_generation_in_progress = False
-                    logger.info("Image generation complete - Ollama will reload on next chat")
-            
+                        image_url, image_job = drafted
+                        image_tier = "draft"
+                except ImageChainError as e:
+                    logger.warning(f"Draft image failed ({e}), rendering the full image now")
+            if image_url is None and not cancelled:
+                generated = await cancellable_image(request.session_id, counted_image_chain(full_request))
+                cancelled = generated is None
+            if cancelled:
+                logger.info(f"Image cancelled by the user (session {request.session_id})")
+                ai_response = re.sub(r'\[IMAGE:[^\]]+\]', "(image cancelled)", ai_response)
+            elif image_url is None:
+                image_tier = generated.tier
+                # Images from a fallback tier are named after it
+                prefix = persona.id if generated.tier == generated.attempts[0]["tier"] else f"{generated.tier}_{persona.id}"
+                image_url = await save_generated_image(generated.image, f"{prefix}_{int(_time.time())}.png")
+                logger.info(f"Image saved: {image_url} (tier: {generated.tier})")
         except Exception as e:
-            logger.error(f"Image generation failed: {e}")
-            _last_image_generation["success"] = False
-            _last_image_generation["error"] = str(e)
-            
-            # Try fallback strategies
-            fallback_success = False
-            
-            # Strategy 1: If InstantID failed, try standard workflow
-            if has_reference_image and "InstantID" in str(e):
-                logger.info("InstantID failed, attempting fallback to standard workflow...")
-                try:
-                    fallback_character_prompt = f"{persona.name}, {image_prompt}" if persona.image_style else f"{persona.name}, {image_prompt}"
-                    if persona.image_style:
-                        fallback_character_prompt = enhance_image_prompt(image_prompt, persona.image_style)
-                    
-                    image_data = await image_manager.generate_image(
-                        prompt=fallback_character_prompt,
-                        negative_prompt=negative_prompt,
-                        width=1024,
-                        height=1024,
-                        workflow_path="workflows/sdxl_Character_profile_api.json",
-                        persona_name=persona.id
-                    )
-                    
-                    filename = f"fallback_{persona.id}_{int(time.time())}.png"
-                    filepath = f"outputs/generated_images/{filename}"
-                    
-                    with open(filepath, "wb") as f:
-                        f.write(image_data)
-                    
-                    image_url = f"/outputs/generated_images/{filename}"
-                    fallback_success = True
-                    logger.info("Fallback to standard workflow succeeded")
-                    
-                except Exception as fallback_error:
-                    logger.error(f"Fallback generation also failed: {fallback_error}")
-            
-            # Strategy 2: If still failed, try lower resolution
-            if not fallback_success:
-                logger.info("Attempting low-resolution fallback...")
-                try:
-                    simple_prompt = f"{persona.name}, {image_prompt}"
-                    
-                    image_data = await image_manager.generate_image(
-                        prompt=simple_prompt,
-                        negative_prompt="(worst quality:1.5), (low quality:1.5)",
-                        width=512,
-                        height=512,
-                        workflow_path="workflows/sdxl_Character_profile_api.json",
-                        persona_name=persona.id
-                    )
-                    
-                    filename = f"lowres_{persona.id}_{int(time.time())}.png"
-                    filepath = f"outputs/generated_images/{filename}"
-                    
-                    with open(filepath, "wb") as f:
-                        f.write(image_data)
-                    
-                    image_url = f"/outputs/generated_images/{filename}"
-                    fallback_success = True
-                    logger.info("Low-resolution fallback succeeded")
-                    
-                except Exception as lowres_error:
-                    logger.error(f"Low-resolution fallback also failed: {lowres_error}")
+            logger.warning(f"All image generation strategies failed, continuing without image: {e}")
+            error_message = "Sorry, I couldn't generate that image right now. The image generation system seems to be having issues. 😔"
             
-            # If all fallbacks failed, modify the response to inform user
-            if not fallback_success:
-                error_message = "Sorry, I couldn't generate that image right now. The image generation system seems to be having issues. 😔"
-                
-                # Replace the [IMAGE:...] tag with error message
-                ai_response = re.sub(r'\[IMAGE:[^\]]+\]', error_message, ai_response)
-                logger.warning("All image generation strategies failed, continuing without image")
+            # Replace the [IMAGE:...] tag with error message
+            ai_response = re.sub(r'\[IMAGE:[^\]]+\]', error_message, ai_response)
     
     # Store AI response in memory
-    memory_manager.add_message(
+    await memory_manager.add_message_async(
         session_id=request.session_id,
         persona_id=persona.id,
         role="assistant",
@@ -877,7 +1059,9 @@ async def chat(request: ChatRequest):
         tokens_used=result.get("eval_count", 0),
         has_image=has_image,
         image_prompt=image_prompt,
-        image_url=image_url
+        image_url=image_url,
+        image_tier=image_tier,
+        image_job=image_job
     )
 
 
@@ -1027,9 +1211,10 @@ async def create_persona_endpoint(request: CreatePersonaRequest):
             "voice": "en-US-AriaNeural"
           }'
     """
+    persona_id = _memory_persona(request.id)
     try:
         persona = persona_manager.create_persona(
-            persona_id=request.id,
+            persona_id=persona_id,
             name=request.name,
             description=request.description,
             personality_traits=request.personality_traits,
@@ -1169,7 +1354,7 @@ async def update_user_profile(profile: dict):
 @app.get("/memory/status/{session_id}")
 async def get_memory_status(session_id: str, persona_id: str = "luna"):
     """Get memory status for a session."""
-    stats = memory_manager.get_memory_stats(session_id, persona_id)
+    stats = await memory_manager.get_memory_stats_async(session_id, persona_id)
     return {
         "enabled": stats["enabled"],
         "recent_messages": stats["recent_messages"],
@@ -1190,6 +1375,71 @@ async def toggle_memory(session_id: str, enabled: bool):
     }
 
 
+def _memory_persona(persona_id: Optional[str]) -> Optional[str]:
+    """Reject persona ids that can't name a memory directory (400), before any path is built."""
+    if persona_id is None:
+        return None
+    try:
+        return check_persona_id(persona_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/memory/history/{session_id}")
+async def get_memory_history(
+    session_id: str,
+    persona_id: str = "luna",
+    before: Optional[str] = None,
+    before_time: Optional[str] = None,
+    limit: int = 50,
+    include_summaries: bool = False
+):
+    """
+    Page backwards through a session's stored messages (newest page first).
+    
+    Pass next_cursor from a response as `before` to get the next older page;
+    `before_time` (ISO timestamp) starts below a message the client already shows.
+    """
+    _memory_persona(persona_id)
+    try:
+        return await asyncio.to_thread(
+            memory_manager.get_history,
+            session_id, persona_id, before, before_time, max(1, min(limit, 200)), include_summaries
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/memory/export/{session_id}")
+async def export_memory(session_id: str, persona_id: str = "luna"):
+    """Stream a whole session as NDJSON (a backup that /memory/import restores)."""
+    _memory_persona(persona_id)
+    return StreamingResponse(
+        memory_manager.export_session(session_id, persona_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{persona_id}_{session_id}.ndjson"'}
+    )
+
+
+@app.post("/memory/import")
+async def import_memory(request: Request, session_id: Optional[str] = None, persona_id: Optional[str] = None):
+    """
+    Restore a session from a /memory/export NDJSON body.
+    
+    The upload is spooled to disk as it arrives and imported line by line.
+    """
+    _memory_persona(persona_id)
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        try:
+            counts = await asyncio.to_thread(memory_manager.import_session, upload, session_id, persona_id)
+        except (ValueError, KeyError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid export: {e}")
+    return {"success": True, **counts}
+
+
 @app.delete("/memory/clear/{session_id}")
 async def clear_memory(session_id: str):
     """Clear recent conversation memory for a session."""
@@ -1335,10 +1585,21 @@ _last_image_generation = {
     "image_style": None,
     "width": None,
     "height": None,
+    "progress": None,
     "success": None,
     "error": None
 }
 
+
+def _track_image_progress(update: dict):
+    """Record ComfyUI sampler progress so /comfyui/last-generation can show it."""
+    _last_image_generation["progress"] = {
+        "node": update["node"],
+        "step": update["step"],
+        "total": update["total"],
+        "percent": round(100 * update["step"] / update["total"]) if update["total"] else None
+    }
+
 @app.get("/comfyui/last-generation")
 async def get_last_generation():
     """
@@ -1350,6 +1611,67 @@ async def get_last_generation():
     return _last_image_generation
 
 
+@app.get("/images/jobs/{job_id}")
+async def get_image_job(job_id: str, wait: float = 0):
+    """
+    Status of the full render behind a draft image: rendering, done, failed or skipped.
+    When done, image_url serves the full image (the draft's file, replaced).
+    Pass wait (seconds, up to 60) to hold the request until the job finishes.
+    
+    Example:
+        curl "http://localhost:8000/images/jobs/3f2a9c1b7d4e?wait=30"
+    """
+    job = _image_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown image job '{job_id}'")
+    task = _image_job_tasks.get(job_id)
+    if task is not None and wait > 0:
+        await asyncio.wait({task}, timeout=min(wait, 60))
+    return job
+
+
+@app.get("/images/previews/{session_id}")
+async def stream_image_previews(session_id: str):
+    """
+    Server-sent events for the images generated for a session: "progress" (step, total,
+    percent), "preview" (a small live image as a data URL, a few per second while
+    sampling; ComfyUI needs --preview-method auto) and "done" (status).
+    
+    Example:
+        curl -N http://localhost:8000/images/previews/user123
+    """
+    async def events():
+        async with preview_hub.subscribe(session_id) as queue:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), 15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/images/cancel/{session_id}")
+async def cancel_image(session_id: str):
+    """
+    Stop the image being generated for a session (and a full render behind its draft).
+    A prompt already running in ComfyUI is interrupted unless another request shares it.
+    
+    Example:
+        curl -X POST http://localhost:8000/images/cancel/user123
+    """
+    task = _image_tasks.get(session_id)
+    cancelled = task is not None and not task.done()
+    if cancelled:
+        task.cancel()
+    if _session_image_jobs.get(session_id) in _image_job_tasks:
+        skip_image_job(session_id)
+        cancelled = True
+    return {"session_id": session_id, "cancelled": cancelled}
+
+
 @app.get("/comfyui/status")
 async def get_comfyui_status():
     """
@@ -1358,16 +1680,78 @@ async def get_comfyui_status():
     Example:
         curl http://localhost:8000/comfyui/status
     """
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            response = await client.get("http://localhost:8188/system_stats")
-            if response.status_code == 200:
-                return {"status": "online", "service": "ComfyUI"}
-    except:
-        pass
+    if await service_health.is_available("comfyui"):
+        return {"status": "online", "service": "ComfyUI"}
     return {"status": "offline", "service": "ComfyUI"}
 
 
+@app.get("/comfyui/cache")
+async def get_image_cache_stats():
+    """
+    Image cache hit metrics and size.
+    
+    Example:
+        curl http://localhost:8000/comfyui/cache
+    """
+    return image_manager.provider("comfyui").cache.stats()
+
+
+@app.get("/comfyui/queue")
+async def get_image_queue():
+    """
+    Image requests waiting for ComfyUI, how many were coalesced into shared prompts,
+    and the quality planner's measured speed and last decision.
+    
+    Example:
+        curl http://localhost:8000/comfyui/queue
+    """
+    provider = image_manager.provider("comfyui")
+    return {**provider.scheduler.status(), "quality": provider.quality.status()}
+
+
+@app.get("/comfyui/backends")
+async def get_comfyui_backends():
+    """
+    ComfyUI servers in the pool: health, queue depth, prompts in flight, loaded checkpoint,
+    the VRAM planner's last decision for the local one, and reference image uploads.
+    
+    Example:
+        curl http://localhost:8000/comfyui/backends
+    """
+    provider = image_manager.provider("comfyui")
+    return {"backends": provider.pool.status(), "vram": provider.vram.status(), "references": provider.references.status()}
+
+
+@app.post("/comfyui/backends/{name}/drain")
+async def drain_comfyui_backend(name: str):
+    """
+    Stop sending new prompts to a ComfyUI server (running ones finish), e.g. before maintenance.
+    
+    Example:
+        curl -X POST http://localhost:8000/comfyui/backends/gpu2:8188/drain
+    """
+    pool = image_manager.provider("comfyui").pool
+    if name not in pool.backends:
+        raise HTTPException(status_code=404, detail=f"Unknown ComfyUI backend '{name}'")
+    pool.drain(name)
+    return {"success": True, "backend": name, "inflight": pool.get(name).inflight}
+
+
+@app.post("/comfyui/backends/{name}/resume")
+async def resume_comfyui_backend(name: str):
+    """
+    Put a drained ComfyUI server back into rotation.
+    
+    Example:
+        curl -X POST http://localhost:8000/comfyui/backends/gpu2:8188/resume
+    """
+    pool = image_manager.provider("comfyui").pool
+    if name not in pool.backends:
+        raise HTTPException(status_code=404, detail=f"Unknown ComfyUI backend '{name}'")
+    pool.resume(name)
+    return {"success": True, "backend": name}
+
+
 @app.get("/tts/health")
 async def get_tts_health():
     """
@@ -1497,24 +1881,38 @@ async def set_comfyui_checkpoint(request: dict):
 @app.post("/comfyui/restart")
 async def restart_comfyui():
     """
-    Restart ComfyUI service.
+    Restart the local ComfyUI service.
+    
+    The local backend is drained first: new prompts go to other backends (or
+    wait), and running ones get COMFYUI_DRAIN_TIMEOUT seconds to finish.
     
     Example:
         curl -X POST http://localhost:8000/comfyui/restart
     """
+    pool = image_manager.provider("comfyui").pool
+    local = [backend.name for backend in pool.backends.values() if backend.local]
     try:
         import subprocess
         
+        for name in local:
+            pool.drain(name)
+        drain_timeout = float(os.getenv("COMFYUI_DRAIN_TIMEOUT", "120"))
+        idle = await asyncio.gather(*(pool.wait_idle(name, drain_timeout) for name in local))
+        if not all(idle):
+            logger.warning(f"ComfyUI still busy after {drain_timeout:.0f}s, restarting anyway")
+        
         logger.info("Restarting ComfyUI...")
         
         # Use the service.sh script to restart ComfyUI
-        result = subprocess.run(
+        result = await asyncio.to_thread(
+            subprocess.run,
             ["./service.sh", "restart", "comfyui"],
             capture_output=True,
             text=True,
             cwd=os.path.dirname(os.path.abspath(__file__))
         )
         
+        service_health.invalidate("comfyui", "restarted")
         if result.returncode == 0:
             logger.info("ComfyUI restarted successfully")
             return {
@@ -1529,6 +1927,9 @@ async def restart_comfyui():
     except Exception as e:
         logger.error(f"Error restarting ComfyUI: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for name in local:
+            pool.resume(name)
 
 
 # ==========================================
@@ -1780,6 +2181,17 @@ if __name__ == "__main__":
     
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", "8000"))
+    workers = int(os.getenv("API_WORKERS", "1"))
+    
+    # Embedded Chroma and the NumPy store can't be shared by several processes; workers need a Chroma server
+    if workers > 1 and not memory_manager.store.shared:
+        logger.warning("API_WORKERS > 1 needs MEMORY_BACKEND=chroma with MEMORY_CHROMA_MODE=http - starting a single worker")
+        workers = 1
+    # Draft jobs, live previews and image cancels live in the worker running the image;
+    # /images/jobs, /images/previews and /images/cancel on another worker wouldn't find them
+    if workers > 1 and (IMAGE_DRAFTS or image_manager.provider("comfyui").previews.enabled):
+        logger.warning("API_WORKERS > 1 needs IMAGE_DRAFTS=false and IMAGE_PREVIEWS=false - starting a single worker")
+        workers = 1
     
     current_persona = persona_manager.get_current_persona()
     
@@ -1789,4 +2201,8 @@ if __name__ == "__main__":
     logger.info(f"🌐 Web UI: http://localhost:{port}")
     logger.info(f"📚 API Docs: http://localhost:{port}/docs")
     
-    uvicorn.run(app, host=host, port=port, log_level="info")
+    if workers > 1:
+        logger.info(f"⚙️ Starting {workers} API workers")
+        uvicorn.run("main:app", host=host, port=port, workers=workers, log_level="info")
+    else:
+        uvicorn.run(app, host=host, port=port, log_level="info")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Memory administration tool for Unicorn AI
+Usage:
+    python memory_admin.py migrate --to session
+    python memory_admin.py migrate --to sharded --shards 32
+    python memory_admin.py compact
+    python memory_admin.py warmup
+    python memory_admin.py lexical-rebuild
+    python memory_admin.py summarize
+    python memory_admin.py reindex --embedding-backend onnx --workers 4
+    python memory_admin.py reindex --embedding-backend onnx --workers 4 --swap
+    python memory_admin.py export web_123 --persona luna -o backup.ndjson
+    python memory_admin.py import backup.ndjson
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from memory_manager import memory_manager
+from memory_reindex import MemoryReindexer
+from memory_summarizer import MemorySummarizer
+
+
+def api_stopped(command: str) -> bool:
+    """Commands that drop and recreate collections can't run under the API, which holds them open."""
+    if memory_manager.api_running():
+        print(f"✗ {command} needs the API stopped (it holds {memory_manager.persist_dir / '.api.lock'})")
+        return False
+    return True
+
+
+def migrate(args):
+    """Move long-term memory to another partition strategy."""
+    if not api_stopped("migrate"):
+        return 1
+    store = memory_manager.store
+    if not hasattr(store, "migrate_partition"):
+        print(f"✗ {store.get_name()} has no partitions to migrate (MEMORY_BACKEND=chroma only)")
+        return 1
+    print(f"Migrating long-term memory: {store.partition} -> {args.to}")
+    stats = store.migrate_partition(
+        target=args.to,
+        shards=args.shards,
+        batch_size=args.batch_size,
+        keep_source=args.keep_source
+    )
+    print(f"✓ Migrated {stats['records']} records from {stats['collections']} collections")
+    print(f"Set MEMORY_PARTITION={args.to} in config/.env before restarting the API")
+    return 0
+
+
+def compact(args):
+    """Rebuild collections with the current HNSW parameters."""
+    if not api_stopped("compact"):
+        return 1
+    stats = memory_manager.compact(collection_name=args.collection, batch_size=args.batch_size)
+    print(f"✓ Compacted {stats['collections']} collections: {stats['before_mb']} MB -> {stats['after_mb']} MB")
+    return 0
+
+
+def warmup(args):
+    """Load indexes of recently active sessions and report how long it takes."""
+    stats = memory_manager.warm_up(limit=args.limit)
+    print(f"✓ Warmed {stats['collections']} collections in {stats['seconds']}s")
+    return 0
+
+
+def lexical_rebuild(args):
+    """Re-create the BM25 index from the vector store."""
+    total = memory_manager.rebuild_lexical_index(batch_size=args.batch_size)
+    print(f"✓ Indexed {total} messages ({memory_manager.lexical.disk_usage_mb():.1f} MB)")
+    return 0
+
+
+def summarize(args):
+    """Summarize over-budget sessions now, without waiting for an idle GPU."""
+    summarizer = MemorySummarizer(memory_manager)
+    if args.model:
+        summarizer.model = args.model
+    installed = asyncio.run(summarizer.model_installed())
+    if not installed:
+        print(f"✗ {'Ollama has no model ' + summarizer.model if installed is False else 'Ollama is not reachable'}")
+        return 1
+    written = asyncio.run(summarizer.run_once(force=True))
+    print(f"✓ Wrote {written} summaries, tiered out {summarizer.stats['messages_tiered']} memories")
+    return 0
+
+
+def reindex(args):
+    """Re-embed long-term memory into a new store next to the live one, optionally swapping it in."""
+    # The swap renames the directory the API writes to, and embedded Chroma can't be opened by two processes
+    embedded_chroma = memory_manager.store.get_name().startswith("chroma") and not memory_manager.store.shared
+    if (args.swap or embedded_chroma) and not api_stopped("--swap" if args.swap else "Reindexing embedded Chroma"):
+        return 1
+    if args.embedding_model:
+        os.environ["EMBEDDING_MODEL"] = args.embedding_model  # also seen by the worker processes
+    reindexer = MemoryReindexer(
+        memory_manager.store,
+        str(memory_manager.persist_dir),
+        backend=args.backend,
+        embedding_backend=args.embedding_backend,
+        partition=args.partition,
+        shards=args.shards,
+        workers=args.workers,
+        batch_size=args.batch_size
+    )
+    try:
+        reindexer.prepare(restart=args.restart)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+    stats = reindexer.run()
+    print(
+        f"✓ {stats['scanned']} memories scanned: {stats['embedded']} re-embedded, {stats['copied']} copied, "
+        f"{stats['skipped']} already done, {stats['dropped']} dropped"
+    )
+    if not args.swap:
+        print("Run again to catch up, then stop the API and re-run with --swap (a final catch-up pass runs first)")
+        return 0
+
+    previous = reindexer.swap()
+    config = reindexer.config
+    print(f"✓ New store in place (previous one kept at {previous})")
+    print("Set these in config/.env before restarting the API:")
+    print(f"  MEMORY_BACKEND={config['backend']}")
+    print(f"  EMBEDDING_BACKEND={config['embedding_backend']}")
+    if config["embedding_model"]:
+        print(f"  EMBEDDING_MODEL={config['embedding_model']}")
+    if config["backend"] == "chroma":
+        print(f"  MEMORY_PARTITION={config['partition']}")
+        if memory_manager.store.shared:
+            print("  and point the Chroma server at the new directory (or switch to MEMORY_CHROMA_MODE=embedded)")
+    return 0
+
+
+def export_session(args):
+    """Write a session as NDJSON to a file or stdout."""
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        lines = 0
+        for line in memory_manager.export_session(args.session, args.persona):
+            out.write(line)
+            lines += 1
+    finally:
+        if args.output:
+            out.close()
+    print(f"✓ Exported {lines - 1} records of {args.session}", file=sys.stderr)
+    return 0
+
+
+def import_session(args):
+    """Restore a session from an NDJSON export."""
+    with open(args.file, "rb") as f:
+        try:
+            counts = memory_manager.import_session(f, session_id=args.session, persona_id=args.persona)
+        except (ValueError, KeyError) as e:
+            print(f"✗ Invalid export: {e}")
+            return 1
+    print(
+        f"✓ Imported {counts['memories']} memories, {counts['archived']} archived and "
+        f"{counts['recent']} recent messages ({counts['skipped']} already present)"
+    )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unicorn AI memory administration")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Re-partition long-term memory collections")
+    migrate_parser.add_argument("--to", required=True, choices=["persona", "session", "sharded"])
+    migrate_parser.add_argument("--shards", type=int, default=None, help="Shards per persona (sharded only)")
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    migrate_parser.add_argument("--keep-source", action="store_true", help="Don't delete the old collections")
+    migrate_parser.set_defaults(func=migrate)
+
+    compact_parser = commands.add_parser("compact", help="Rebuild HNSW indexes and vacuum the store")
+    compact_parser.add_argument("--collection", default=None, help="Only this collection (default: all)")
+    compact_parser.add_argument("--batch-size", type=int, default=500)
+    compact_parser.set_defaults(func=compact)
+
+    warmup_parser = commands.add_parser("warmup", help="Page indexes of recently active sessions into memory")
+    warmup_parser.add_argument("--limit", type=int, default=None)
+    warmup_parser.set_defaults(func=warmup)
+
+    lexical_parser = commands.add_parser("lexical-rebuild", help="Rebuild the BM25 index from stored memory")
+    lexical_parser.add_argument("--batch-size", type=int, default=500)
+    lexical_parser.set_defaults(func=lexical_rebuild)
+
+    summarize_parser = commands.add_parser("summarize", help="Roll old turns of long sessions into summaries now")
+    summarize_parser.add_argument("--model", default=None, help="Ollama model (default: MEMORY_SUMMARY_MODEL)")
+    summarize_parser.set_defaults(func=summarize)
+
+    reindex_parser = commands.add_parser("reindex", help="Re-embed long-term memory side by side and swap it in")
+    reindex_parser.add_argument("--backend", default=None, choices=["chroma", "numpy"], help="Default: MEMORY_BACKEND")
+    reindex_parser.add_argument("--embedding-backend", default=None, help="Default: EMBEDDING_BACKEND")
+    reindex_parser.add_argument("--embedding-model", default=None, help="Default: EMBEDDING_MODEL")
+    reindex_parser.add_argument("--partition", default=None, choices=["persona", "session", "sharded"])
+    reindex_parser.add_argument("--shards", type=int, default=None)
+    reindex_parser.add_argument("--workers", type=int, default=2, help="Embedding processes (0: embed in this process)")
+    reindex_parser.add_argument("--batch-size", type=int, default=256, help="Messages per embedding batch")
+    reindex_parser.add_argument("--restart", action="store_true", help="Discard a reindex in progress")
+    reindex_parser.add_argument("--swap", action="store_true", help="After catching up, rename the new store into place")
+    reindex_parser.set_defaults(func=reindex)
+
+    export_parser = commands.add_parser("export", help="Stream a session to NDJSON")
+    export_parser.add_argument("session", help="Session id")
+    export_parser.add_argument("--persona", default="luna")
+    export_parser.add_argument("-o", "--output", default=None, help="File (default: stdout)")
+    export_parser.set_defaults(func=export_session)
+
+    import_parser = commands.add_parser("import", help="Restore a session from an NDJSON export")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--session", default=None, help="Import as another session id")
+    import_parser.add_argument("--persona", default=None, help="Import under another persona")
+    import_parser.set_defaults(func=import_session)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
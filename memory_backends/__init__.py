@@ -0,0 +1,41 @@
+"""
+Long-term Memory Backends
+Selects where MemoryManager keeps message vectors (MEMORY_BACKEND)
+"""
+
+import os
+from typing import Optional
+from loguru import logger
+from .base_store import MemoryStore, check_persona_id
+
+
+MEMORY_BACKENDS = ["chroma", "numpy"]
+
+
+def create_memory_store(
+    persist_directory: str,
+    embedding_backend: str,
+    backend: Optional[str] = None,
+    partition: Optional[str] = None,
+    shards: Optional[int] = None
+) -> MemoryStore:
+    """
+    Build the configured long-term memory store.
+
+    Backends:
+        chroma: ChromaDB collections with HNSW indexes, embedded or on a server
+        numpy: memory-mapped matrix per session with exact search, no Chroma import
+    """
+    backend = (backend or os.getenv("MEMORY_BACKEND", "chroma")).lower()
+
+    if backend == "chroma":
+        from .chroma_store import ChromaMemoryStore
+        store = ChromaMemoryStore(persist_directory, embedding_backend, partition=partition, shards=shards)
+    elif backend == "numpy":
+        from .numpy_store import NumpyMemoryStore
+        store = NumpyMemoryStore(persist_directory, embedding_backend)
+    else:
+        raise ValueError(f"Unknown MEMORY_BACKEND '{backend}'. Options: {', '.join(MEMORY_BACKENDS)}")
+
+    logger.info(f"Long-term memory backend: {store.get_name()}")
+    return store
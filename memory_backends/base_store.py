@@ -0,0 +1,115 @@
+"""
+Long-term Memory Store Base Class
+All vector stores behind MemoryManager implement this interface
+"""
+
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, List, Dict, Optional, Tuple
+
+
+# Persona ids become directory names under data/memory, so only plain names are accepted
+PERSONA_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def check_persona_id(persona_id: str) -> str:
+    """The persona id if it is safe to use in a path; ValueError otherwise."""
+    if not isinstance(persona_id, str) or not PERSONA_ID_PATTERN.fullmatch(persona_id):
+        raise ValueError(f"Invalid persona id {persona_id!r} (letters, digits, '-' and '_' only)")
+    return persona_id
+
+
+class MemoryStore(ABC):
+    """
+    Stores message embeddings per (persona, session) and finds the nearest ones.
+
+    MemoryManager owns embedding, recent messages and settings; stores only
+    see ready-made vectors. Records are dicts with id, content, role,
+    timestamp, session_id and persona_id.
+    """
+
+    # Whether several API workers may share this store (and the JSON files next to it)
+    shared = False
+
+    @abstractmethod
+    def add(self, persona_id: str, session_id: str, records: List[Dict], embeddings: List[List[float]]):
+        """Append records and their embeddings to a session's memory."""
+        pass
+
+    @abstractmethod
+    def query(self, persona_id: str, session_id: str, embedding: List[float], n_results: int = 5) -> List[Dict]:
+        """
+        Nearest records of one session to a query embedding.
+
+        Returns:
+            Records, closest first, each with its cosine distance under "distance"
+        """
+        pass
+
+    @abstractmethod
+    def count(self, persona_id: str, session_id: str) -> int:
+        """Number of records stored for a session."""
+        pass
+
+    @abstractmethod
+    def session_records(self, persona_id: str, session_id: str) -> List[Dict]:
+        """All records of one session (no embeddings), in insertion order where the store keeps one."""
+        pass
+
+    @abstractmethod
+    def delete(self, persona_id: str, session_id: str, ids: List[str]):
+        """Remove records of a session by id."""
+        pass
+
+    @abstractmethod
+    def iter_records(self, batch_size: int = 500, include_embeddings: bool = False) -> Iterator[Tuple[List[Dict], Optional[List[List[float]]]]]:
+        """
+        Stream every stored record, batch by batch.
+
+        Yields:
+            (records, embeddings) - embeddings is None unless include_embeddings
+        """
+        pass
+
+    @abstractmethod
+    def get_name(self) -> str:
+        """Get the store name"""
+        pass
+
+    async def add_async(self, persona_id: str, session_id: str, records: List[Dict], embeddings: List[List[float]]):
+        """add() for the API's event loop; stores with a native async client override this."""
+        return await asyncio.to_thread(self.add, persona_id, session_id, records, embeddings)
+
+    async def query_async(self, persona_id: str, session_id: str, embedding: List[float], n_results: int = 5) -> List[Dict]:
+        """query() for the API's event loop."""
+        return await asyncio.to_thread(self.query, persona_id, session_id, embedding, n_results)
+
+    async def count_async(self, persona_id: str, session_id: str) -> int:
+        """count() for the API's event loop."""
+        return await asyncio.to_thread(self.count, persona_id, session_id)
+
+    def verify(self, expect_data: bool = False):
+        """Log what the store holds at startup; expect_data warns when it is unexpectedly empty."""
+        pass
+
+    def warm_up(self, sessions: List[Tuple[str, str]]) -> int:
+        """Page the indexes of (persona_id, session_id) pairs into memory; returns how many were warmed."""
+        return 0
+
+    def compact(self, name: Optional[str] = None, batch_size: int = 500) -> Dict:
+        """Rebuild indexes and reclaim disk space."""
+        return {"collections": 0, "before_mb": 0.0, "after_mb": 0.0}
+
+    def disk_usage_mb(self) -> float:
+        """Size of the store on disk in MB (0 when it lives elsewhere)."""
+        return 0.0
+
+    def total_count(self) -> int:
+        """Records across all sessions (stores override this with something cheaper than a full scan)."""
+        return sum(len(records) for records, _ in self.iter_records())
+
+    def location(self) -> Optional[Path]:
+        """Directory holding the whole store, or None when it lives on a server."""
+        return None
@@ -0,0 +1,566 @@
+"""
+ChromaDB Memory Store
+HNSW-indexed collections, embedded in this process or on a shared Chroma server
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterator, List, Dict, Optional, Tuple
+import chromadb
+import httpx
+from chromadb.config import Settings
+from loguru import logger
+from .base_store import MemoryStore
+
+
+# How long-term memory is split into Chroma collections:
+#   persona - one collection per persona, sessions separated by a where filter
+#   session - one collection per (persona, session), ANN search only sees that session
+#   sharded - MEMORY_SHARDS collections per persona, sessions hashed across them
+PARTITION_STRATEGIES = ["persona", "session", "sharded"]
+
+# embedded - Chroma runs inside this process (single API worker)
+# http     - connect to a Chroma server shared by several API workers
+CHROMA_MODES = ["embedded", "http"]
+
+
+class ChromaMemoryStore(MemoryStore):
+    """Long-term memory in ChromaDB collections"""
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_backend: str,
+        partition: Optional[str] = None,
+        shards: Optional[int] = None
+    ):
+        self.chroma_dir = Path(persist_directory) / "chroma"
+        self.embedding_backend = embedding_backend
+        self.chroma_mode = os.getenv("MEMORY_CHROMA_MODE", "embedded").lower()
+        if self.chroma_mode not in CHROMA_MODES:
+            raise ValueError(f"Unknown MEMORY_CHROMA_MODE '{self.chroma_mode}'. Options: {', '.join(CHROMA_MODES)}")
+        self.retries = int(os.getenv("CHROMA_RETRIES", "3"))
+        self.retry_backoff = float(os.getenv("CHROMA_RETRY_BACKOFF", "0.2"))
+        # With a Chroma server several API workers share the memory directory
+        self.shared = self.chroma_mode == "http"
+
+        if self.chroma_mode == "http":
+            self.chroma_host = os.getenv("CHROMA_HOST", "localhost")
+            self.chroma_port = int(os.getenv("CHROMA_PORT", "8001"))
+            # Sync client for startup checks and admin tools; async client (created
+            # lazily on the API's event loop) for request paths
+            self.client = self._with_retry(lambda: chromadb.HttpClient(
+                host=self.chroma_host,
+                port=self.chroma_port,
+                settings=self._http_settings()
+            ))
+            logger.info(f"Connected to Chroma server at {self.chroma_host}:{self.chroma_port}")
+        else:
+            self.client = chromadb.PersistentClient(
+                path=str(self.chroma_dir),
+                settings=Settings(anonymized_telemetry=False)
+            )
+        self._async_client = None
+        self._async_collections = {}
+
+        # HNSW parameters: M and construction_ef are fixed when a collection is built
+        # (new or compacted collections); search_ef is applied to existing ones too
+        self.hnsw_config = {
+            "space": "cosine",
+            "max_neighbors": int(os.getenv("MEMORY_HNSW_M", "16")),
+            "ef_construction": int(os.getenv("MEMORY_HNSW_CONSTRUCTION_EF", "100")),
+            "ef_search": int(os.getenv("MEMORY_HNSW_SEARCH_EF", "100")),
+        }
+        self._collections = {}  # collection name -> handle, checked once per process
+
+        self.partition = (partition or os.getenv("MEMORY_PARTITION", "persona")).lower()
+        if self.partition not in PARTITION_STRATEGIES:
+            raise ValueError(f"Unknown MEMORY_PARTITION '{self.partition}'. Options: {', '.join(PARTITION_STRATEGIES)}")
+        self.shards = shards or int(os.getenv("MEMORY_SHARDS", "16"))
+        self._check_partition_layout()
+
+    def get_name(self) -> str:
+        return f"chroma ({self.chroma_mode}, partition: {self.partition})"
+
+    def _http_settings(self) -> Settings:
+        """Connection pool settings shared by the sync and async HTTP clients."""
+        return Settings(
+            anonymized_telemetry=False,
+            chroma_http_max_connections=int(os.getenv("CHROMA_MAX_CONNECTIONS", "20")),
+            chroma_http_max_keepalive_connections=int(os.getenv("CHROMA_MAX_KEEPALIVE", "10")),
+            chroma_http_keepalive_secs=float(os.getenv("CHROMA_KEEPALIVE_SECS", "30"))
+        )
+
+    def _with_retry(self, operation):
+        """Run a Chroma call, retrying connection failures with exponential backoff."""
+        for attempt in range(self.retries + 1):
+            try:
+                return operation()
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Chroma request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def _with_retry_async(self, operation):
+        """Async twin of _with_retry; operation returns an awaitable."""
+        for attempt in range(self.retries + 1):
+            try:
+                return await operation()
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Chroma request failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _get_async_client(self):
+        """Async HTTP client, created on first use so it binds to the API's event loop."""
+        if self._async_client is None:
+            self._async_client = await self._with_retry_async(lambda: chromadb.AsyncHttpClient(
+                host=self.chroma_host,
+                port=self.chroma_port,
+                settings=self._http_settings()
+            ))
+        return self._async_client
+
+    @staticmethod
+    def collection_name_for(persona_id: str, session_id: Optional[str], partition: str, shards: int) -> str:
+        """Name of the collection holding a session's long-term memory under a partition strategy."""
+        if partition == "persona" or session_id is None:
+            return f"persona_{persona_id}"
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        if partition == "session":
+            return f"persona_{persona_id}__s_{digest[:16]}"
+        return f"persona_{persona_id}__shard_{int(digest, 16) % shards:03d}"
+
+    def _needs_session_filter(self) -> bool:
+        """Shared collections must still be filtered down to the session."""
+        return self.partition != "session"
+
+    def get_or_create_collection(self, persona_id: str, session_id: Optional[str] = None):
+        """Get or create the ChromaDB collection holding a persona/session's memory."""
+        collection_name = self.collection_name_for(persona_id, session_id, self.partition, self.shards)
+        return self._open_collection(collection_name)
+
+    def _open_collection(self, collection_name: str):
+        """Get or create a collection by name, cached for the life of the process."""
+        if collection_name in self._collections:
+            return self._collections[collection_name]
+        collection = self._with_retry(lambda: self.client.get_or_create_collection(
+            **self._collection_args(collection_name)
+        ))
+        if self._search_ef_outdated(collection):
+            collection.modify(configuration={"hnsw": {"ef_search": self.hnsw_config["ef_search"]}})
+        self._warn_on_backend_mismatch(collection)
+        self._collections[collection_name] = collection
+        return collection
+
+    async def _open_collection_async(self, collection_name: str):
+        """Async twin of _open_collection for the HTTP client."""
+        if collection_name in self._async_collections:
+            return self._async_collections[collection_name]
+        client = await self._get_async_client()
+        collection = await self._with_retry_async(lambda: client.get_or_create_collection(
+            **self._collection_args(collection_name)
+        ))
+        if self._search_ef_outdated(collection):
+            await collection.modify(configuration={"hnsw": {"ef_search": self.hnsw_config["ef_search"]}})
+        self._warn_on_backend_mismatch(collection)
+        self._async_collections[collection_name] = collection
+        return collection
+
+    def _collection_args(self, collection_name: str) -> Dict:
+        """Arguments for get_or_create_collection (used only when the collection is new)."""
+        return {
+            "name": collection_name,
+            "embedding_function": None,
+            "configuration": {"hnsw": self.hnsw_config},
+            "metadata": {"embedding_backend": self.embedding_backend}
+        }
+
+    def _warn_on_backend_mismatch(self, collection):
+        """Collections remember which embedding backend filled them."""
+        stored_backend = (collection.metadata or {}).get("embedding_backend")
+        if stored_backend and stored_backend != self.embedding_backend:
+            logger.warning(
+                f"Collection {collection.name} was embedded with {stored_backend}, "
+                f"current backend is {self.embedding_backend} - reindex before searching it"
+            )
+
+    def _search_ef_outdated(self, collection) -> bool:
+        """Whether an existing collection's search_ef differs from MEMORY_HNSW_SEARCH_EF."""
+        current = (collection.configuration or {}).get("hnsw") or {}
+        if (current.get("max_neighbors"), current.get("ef_construction")) != (
+            self.hnsw_config["max_neighbors"], self.hnsw_config["ef_construction"]
+        ):
+            logger.debug(f"Collection {collection.name} was built with other HNSW parameters - compact it to apply them")
+        return current.get("ef_search") != self.hnsw_config["ef_search"]
+
+    @staticmethod
+    def _add_args(records: List[Dict], embeddings: List[List[float]]) -> Dict:
+        """Chroma add() arguments for a list of records."""
+        return {
+            "ids": [r["id"] for r in records],
+            "documents": [r["content"] for r in records],
+            "metadatas": [{k: v for k, v in r.items() if k not in ("id", "content")} for r in records],
+            "embeddings": embeddings
+        }
+
+    def add(self, persona_id: str, session_id: str, records: List[Dict], embeddings: List[List[float]]):
+        collection = self.get_or_create_collection(persona_id, session_id)
+        args = self._add_args(records, embeddings)
+        self._with_retry(lambda: collection.add(**args))
+
+    async def add_async(self, persona_id: str, session_id: str, records: List[Dict], embeddings: List[List[float]]):
+        if self.chroma_mode == "embedded":
+            return await super().add_async(persona_id, session_id, records, embeddings)
+        name = self.collection_name_for(persona_id, session_id, self.partition, self.shards)
+        collection = await self._open_collection_async(name)
+        args = self._add_args(records, embeddings)
+        await self._with_retry_async(lambda: collection.add(**args))
+
+    def query(self, persona_id: str, session_id: str, embedding: List[float], n_results: int = 5) -> List[Dict]:
+        collection = self.get_or_create_collection(persona_id, session_id)
+        results = self._with_retry(lambda: collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            **self._query_filter(session_id)
+        ))
+        return self._parse_query_results(results)
+
+    async def query_async(self, persona_id: str, session_id: str, embedding: List[float], n_results: int = 5) -> List[Dict]:
+        if self.chroma_mode == "embedded":
+            return await super().query_async(persona_id, session_id, embedding, n_results)
+        name = self.collection_name_for(persona_id, session_id, self.partition, self.shards)
+        collection = await self._open_collection_async(name)
+        results = await self._with_retry_async(lambda: collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            **self._query_filter(session_id)
+        ))
+        return self._parse_query_results(results)
+
+    def _query_filter(self, session_id: str) -> Dict:
+        """where clause restricting a query to one session (not needed for per-session collections)."""
+        if self._needs_session_filter():
+            return {"where": {"session_id": session_id}}  # Only search within this session
+        return {}
+
+    @staticmethod
+    def _parse_query_results(results) -> List[Dict]:
+        """Turn a Chroma query result into record dicts."""
+        if not (results and results['documents'] and results['documents'][0]):
+            return []
+        records = []
+        distances = (results.get('distances') or [[]])[0]
+        for i, doc in enumerate(results['documents'][0]):
+            record = dict(results['metadatas'][0][i] or {})
+            record["id"] = results['ids'][0][i]
+            record["content"] = doc
+            if i < len(distances):
+                record["distance"] = distances[i]
+            records.append(record)
+        return records
+
+    def count(self, persona_id: str, session_id: str) -> int:
+        collection = self.get_or_create_collection(persona_id, session_id)
+        if self._needs_session_filter():
+            results = self._with_retry(lambda: collection.get(where={"session_id": session_id}, include=[]))
+            return len(results['ids']) if results and 'ids' in results else 0
+        return self._with_retry(collection.count)
+
+    async def count_async(self, persona_id: str, session_id: str) -> int:
+        if self.chroma_mode == "embedded":
+            return await super().count_async(persona_id, session_id)
+        name = self.collection_name_for(persona_id, session_id, self.partition, self.shards)
+        collection = await self._open_collection_async(name)
+        if self._needs_session_filter():
+            results = await self._with_retry_async(lambda: collection.get(where={"session_id": session_id}, include=[]))
+            return len(results['ids']) if results and 'ids' in results else 0
+        return await self._with_retry_async(collection.count)
+
+    def session_records(self, persona_id: str, session_id: str) -> List[Dict]:
+        collection = self.get_or_create_collection(persona_id, session_id)
+        page = self._with_retry(lambda: collection.get(include=["documents", "metadatas"], **self._query_filter(session_id)))
+        records = []
+        for i, doc_id in enumerate(page["ids"]):
+            record = dict(page["metadatas"][i] or {})
+            record["id"] = doc_id
+            record["content"] = page["documents"][i]
+            records.append(record)
+        return records
+
+    def delete(self, persona_id: str, session_id: str, ids: List[str]):
+        if ids:
+            collection = self.get_or_create_collection(persona_id, session_id)
+            self._with_retry(lambda: collection.delete(ids=ids))
+
+    def iter_records(self, batch_size: int = 500, include_embeddings: bool = False) -> Iterator[Tuple[List[Dict], Optional[List[List[float]]]]]:
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        names = [
+            c.name for c in self.client.list_collections()
+            if c.name.startswith("persona_") and not c.name.endswith("__compact")
+        ]
+        for name in names:
+            collection = self.client.get_collection(name, embedding_function=None)
+            offset = 0
+            while True:
+                page = self._with_retry(lambda: collection.get(include=include, limit=batch_size, offset=offset))
+                if not page["ids"]:
+                    break
+                records = []
+                for i, doc_id in enumerate(page["ids"]):
+                    record = dict(page["metadatas"][i] or {})
+                    record["id"] = doc_id
+                    record["content"] = page["documents"][i]
+                    records.append(record)
+                embeddings = [list(e) for e in page["embeddings"]] if include_embeddings else None
+                yield records, embeddings
+                offset += len(page["ids"])
+
+    def verify(self, expect_data: bool = False):
+        """Check the on-disk store at startup so lost or half-written memory is noticed, not silently re-grown."""
+        try:
+            collections = [c for c in self.client.list_collections() if c.name.startswith("persona_")]
+            total = sum(c.count() for c in collections)
+        except Exception as e:
+            logger.error(f"Long-term memory store at {self._store_location()} could not be read: {e}")
+            return
+
+        try:
+            restored = self._recover_compaction()
+        except Exception as e:
+            logger.error(f"Could not restore collections from an interrupted compaction: {e}")
+            restored = []
+        if restored:
+            logger.warning(f"Restored collections from a compaction interrupted after dropping the originals: {', '.join(restored)}")
+        leftovers = [c.name for c in collections if c.name.endswith("__compact") and c.name[:-len("__compact")] not in restored]
+        if leftovers:
+            logger.warning(f"Ignoring partial copies from an interrupted compaction: {', '.join(leftovers)} (removed by the next compact)")
+        if total == 0 and expect_data:
+            logger.warning(f"Long-term memory at {self._store_location()} is empty but recent messages exist - was the store lost?")
+        size = f" ({self.disk_usage_mb():.1f} MB)" if self.chroma_mode == "embedded" else ""
+        logger.info(f"Long-term memory at {self._store_location()}: {len(collections)} collections, {total} messages{size}")
+
+    def _store_location(self) -> str:
+        """Where long-term memory lives, for log messages."""
+        if self.chroma_mode == "http":
+            return f"http://{self.chroma_host}:{self.chroma_port}"
+        return str(self.chroma_dir)
+
+    def disk_usage_mb(self) -> float:
+        """Size of the Chroma directory in MB."""
+        if self.chroma_mode == "http":
+            return 0.0
+        return sum(f.stat().st_size for f in self.chroma_dir.rglob("*") if f.is_file()) / (1024 * 1024)
+
+    def total_count(self) -> int:
+        return sum(
+            c.count() for c in self.client.list_collections()
+            if c.name.startswith("persona_") and not c.name.endswith("__compact")
+        )
+
+    def location(self) -> Optional[Path]:
+        return self.chroma_dir if self.chroma_mode == "embedded" else None
+
+    def warm_up(self, sessions: List[Tuple[str, str]]) -> int:
+        """
+        Page HNSW indexes into memory before the first real query.
+
+        Each session's collection is queried once with one of its own vectors,
+        which loads the index from disk.
+        """
+        names = []
+        for persona_id, session_id in sessions:
+            name = self.collection_name_for(persona_id, session_id, self.partition, self.shards)
+            if name not in names:
+                names.append(name)
+
+        warmed = 0
+        for name in names:
+            try:
+                collection = self.client.get_collection(name, embedding_function=None)
+                sample = collection.peek(1)
+                if len(sample["ids"]) == 0:
+                    continue
+                collection.query(query_embeddings=[sample["embeddings"][0]], n_results=1, include=[])
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Could not warm up {name}: {e}")
+        return warmed
+
+    def _recover_compaction(self) -> List[str]:
+        """
+        Rename copies left by a compaction that stopped between dropping a
+        collection and renaming its copy back to the original name.
+
+        Returns:
+            Names of the collections restored
+        """
+        names = {c.name for c in self.client.list_collections() if c.name.startswith("persona_")}
+        restored = []
+        for temp_name in sorted(names):
+            name = temp_name[:-len("__compact")]
+            if temp_name.endswith("__compact") and name not in names:
+                # The copy was complete (the original is only dropped after it), so it becomes the collection
+                self.client.get_collection(temp_name, embedding_function=None).modify(name=name)
+                self._collections.pop(name, None)
+                restored.append(name)
+        return restored
+
+    def compact(self, name: Optional[str] = None, batch_size: int = 500) -> Dict:
+        """
+        Rebuild collections with the current HNSW parameters and reclaim disk space.
+
+        Each collection is copied (stored embeddings, no re-embedding) into a fresh
+        index, the old one is dropped and the copy renamed into place. A copy
+        whose original is gone (interrupted between those two steps) is renamed
+        back first; one whose original still exists is incomplete and rebuilt.
+        The SQLite store is vacuumed afterwards.
+
+        Returns:
+            Collections rebuilt and disk usage before/after in MB
+        """
+        before = self.disk_usage_mb()
+        for restored in self._recover_compaction():
+            logger.info(f"Restored {restored} from an interrupted compaction")
+        if name:
+            names = [name]
+        else:
+            names = [c.name for c in self.client.list_collections() if c.name.startswith("persona_")]
+
+        rebuilt = 0
+        for name in names:
+            if name.endswith("__compact"):
+                continue
+            source = self.client.get_collection(name, embedding_function=None)
+            temp_name = f"{name}__compact"
+            try:
+                self.client.delete_collection(temp_name)  # leftover from an interrupted run
+            except Exception:
+                pass
+            target = self.client.create_collection(
+                temp_name,
+                embedding_function=None,
+                configuration={"hnsw": self.hnsw_config},
+                metadata=source.metadata
+            )
+            offset = 0
+            while True:
+                page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+                if not page["ids"]:
+                    break
+                target.add(
+                    ids=page["ids"],
+                    documents=page["documents"],
+                    metadatas=page["metadatas"],
+                    embeddings=page["embeddings"]
+                )
+                offset += len(page["ids"])
+
+            self.client.delete_collection(name)
+            target.modify(name=name)
+            self._collections.pop(name, None)
+            rebuilt += 1
+            logger.info(f"Compacted {name} ({offset} records)")
+
+        if self.chroma_mode == "embedded":
+            self._reclaim_disk()
+
+        return {"collections": rebuilt, "before_mb": round(before, 1), "after_mb": round(self.disk_usage_mb(), 1)}
+
+    def _reclaim_disk(self):
+        """
+        Chroma leaves index files of deleted collections behind; drop those,
+        then reclaim SQLite pages freed by deleted records/collections.
+        """
+        connection = sqlite3.connect(self.chroma_dir / "chroma.sqlite3")
+        try:
+            live_segments = {row[0] for row in connection.execute("SELECT id FROM segments")}
+            for entry in self.chroma_dir.iterdir():
+                if entry.is_dir() and entry.name not in live_segments:
+                    shutil.rmtree(entry, ignore_errors=True)
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+    @staticmethod
+    def partition_of(collection_name: str) -> str:
+        """Which partition strategy produced a collection name."""
+        if "__s_" in collection_name:
+            return "session"
+        if "__shard_" in collection_name:
+            return "sharded"
+        return "persona"
+
+    def _check_partition_layout(self):
+        """Warn when stored collections were written under a different partition strategy."""
+        try:
+            names = [c.name for c in self.client.list_collections()]
+        except Exception as e:
+            logger.error(f"Error listing ChromaDB collections: {e}")
+            return
+        other_layouts = {self.partition_of(name) for name in names if name.startswith("persona_")} - {self.partition}
+        if other_layouts:
+            logger.warning(
+                f"Found memory stored with partition {', '.join(sorted(other_layouts))} but MEMORY_PARTITION={self.partition}. "
+                f"Run: python memory_admin.py migrate --to {self.partition}"
+            )
+
+    def migrate_partition(self, target: str, shards: Optional[int] = None, batch_size: int = 500, keep_source: bool = False) -> Dict:
+        """
+        Move long-term memory into the collections of another partition strategy.
+
+        Stored embeddings are copied as-is (no re-embedding). Writes are upserts,
+        so an interrupted migration can simply be run again.
+
+        Returns:
+            Counts of collections and records migrated
+        """
+        if target not in PARTITION_STRATEGIES:
+            raise ValueError(f"Unknown partition '{target}'. Options: {', '.join(PARTITION_STRATEGIES)}")
+        shards = shards or self.shards
+        stats = {"collections": 0, "records": 0}
+
+        source_names = [
+            c.name for c in self.client.list_collections()
+            if c.name.startswith("persona_") and not c.name.endswith("__compact")
+            and self.partition_of(c.name) != target
+        ]
+        for source_name in source_names:
+            source = self.client.get_collection(source_name, embedding_function=None)
+            offset = 0
+            while True:
+                page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+                if not page["ids"]:
+                    break
+                groups: Dict[str, Dict[str, list]] = {}
+                for i, doc_id in enumerate(page["ids"]):
+                    metadata = page["metadatas"][i]
+                    name = self.collection_name_for(metadata["persona_id"], metadata["session_id"], target, shards)
+                    group = groups.setdefault(name, {"ids": [], "documents": [], "metadatas": [], "embeddings": []})
+                    group["ids"].append(doc_id)
+                    group["documents"].append(page["documents"][i])
+                    group["metadatas"].append(metadata)
+                    group["embeddings"].append(page["embeddings"][i])
+                for name, group in groups.items():
+                    self._open_collection(name).upsert(**group)
+                stats["records"] += len(page["ids"])
+                offset += len(page["ids"])
+
+            if not keep_source:
+                self.client.delete_collection(source_name)
+                self._collections.pop(source_name, None)
+            stats["collections"] += 1
+            logger.info(f"Migrated {source_name} ({offset} records) to partition '{target}'")
+
+        self.partition = target
+        self.shards = shards
+        return stats
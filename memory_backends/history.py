@@ -0,0 +1,180 @@
+"""
+Session History
+Paged, newest-first reads of a session's stored messages, and NDJSON export
+
+A session's timeline is its cold archive (turns replaced by summaries)
+followed by its BM25 log, both append-only JSONL. Pages are read backwards
+from the end of the files in fixed-size blocks, so a page costs the same
+however long the session is. Cursors remember the file position of the last
+message returned; when the log was rewritten since (summarization), the
+cursor falls back to that message's timestamp.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from loguru import logger
+
+
+READ_BLOCK = 64 * 1024
+EXPORT_FORMAT = 1
+
+
+def read_backwards(path: Path, end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+    """(offset, line) of a file's complete lines, last first, starting before byte `end`."""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END) if end is None else end
+        tail = b""
+        while position > 0:
+            start = max(0, position - READ_BLOCK)
+            f.seek(start)
+            block = f.read(position - start) + tail
+            lines = block.split(b"\n")
+            # The first piece may be the end of a line that starts in an earlier block
+            tail = lines.pop(0) if start > 0 else b""
+            offset = start + len(tail) + (1 if start > 0 else 0)
+            located = []
+            for line in lines:
+                located.append((offset, line))
+                offset += len(line) + 1
+            for offset, line in reversed(located):
+                if line.strip():
+                    yield offset, line
+            position = start
+        if tail.strip():
+            yield 0, tail
+
+
+def encode_cursor(segment: int, offset: int, inode: int, timestamp: str) -> str:
+    raw = json.dumps({"s": segment, "o": offset, "i": inode, "t": timestamp}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return {"segment": int(data["s"]), "offset": int(data["o"]), "inode": int(data["i"]), "timestamp": str(data["t"])}
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid history cursor")
+
+
+class SessionHistory:
+    """Reads a session's archive + BM25 log as one timeline"""
+
+    def __init__(self, lexical_root: Path, archive_root: Path):
+        self.lexical_root = lexical_root
+        self.archive_root = archive_root
+
+    def segments(self, log_path: Path) -> List[Path]:
+        """Files of a session's timeline, oldest first."""
+        return [self.archive_root / log_path.relative_to(self.lexical_root), log_path]
+
+    @staticmethod
+    def ids(path: Path) -> set:
+        """Ids of the records in one timeline file."""
+        ids = set()
+        if path.exists():
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        ids.add(json.loads(line).get("id"))
+                    except ValueError:
+                        continue
+        return ids
+
+    def page(
+        self,
+        log_path: Path,
+        before: Optional[str] = None,
+        before_time: Optional[str] = None,
+        limit: int = 50,
+        include_summaries: bool = False
+    ) -> Dict:
+        """
+        One page of messages older than a cursor (or timestamp), returned oldest first.
+
+        Args:
+            log_path: The session's BM25 log (LexicalIndex.log_path)
+            before: Cursor from a previous page
+            before_time: ISO timestamp; only messages strictly older are returned
+            limit: Page size
+            include_summaries: Also return summary records (they replace archived turns)
+
+        Returns:
+            {"messages": [...], "next_cursor": cursor for the next older page, or None}
+        """
+        segments = self.segments(log_path)
+        segment = len(segments) - 1
+        end = None
+        if before:
+            cursor = decode_cursor(before)
+            before_time = cursor["timestamp"]
+            path = segments[cursor["segment"]] if 0 <= cursor["segment"] < len(segments) else None
+            try:
+                if path is not None and path.stat().st_ino == cursor["inode"]:
+                    segment, end = cursor["segment"], cursor["offset"]
+            except FileNotFoundError:
+                pass
+            if end is None:
+                logger.debug("History cursor outdated (log rewritten), continuing by timestamp")
+
+        messages = []
+        next_cursor = None
+        while segment >= 0 and next_cursor is None:
+            path = segments[segment]
+            if path.exists():
+                inode = path.stat().st_ino
+                for offset, line in read_backwards(path, end):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if before_time and record.get("timestamp", "") >= before_time:
+                        continue
+                    if record.get("role") == "summary" and not include_summaries:
+                        continue
+                    messages.append(record)
+                    if len(messages) == limit:
+                        next_cursor = encode_cursor(segment, offset, inode, record.get("timestamp", ""))
+                        break
+            segment -= 1
+            end = None
+
+        messages.reverse()
+        return {"messages": messages, "next_cursor": next_cursor}
+
+    def export(self, persona_id: str, session_id: str, log_path: Path, recent: List[Dict]) -> Iterator[bytes]:
+        """
+        NDJSON lines for a whole session: a header, then archived turns, indexed
+        memories and the recent window. Files are streamed line by line.
+        """
+        header = {
+            "type": "session",
+            "format": EXPORT_FORMAT,
+            "persona_id": persona_id,
+            "session_id": session_id,
+            "exported_at": datetime.now().isoformat()
+        }
+        yield self._line(header)
+        for kind, path in zip(("archived", "memory"), self.segments(log_path)):
+            if not path.exists():
+                continue
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # being appended right now
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    yield self._line({"type": kind, **record})
+        for message in recent:
+            yield self._line({"type": "recent", **message})
+
+    @staticmethod
+    def _line(data: Dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
@@ -0,0 +1,142 @@
+"""
+Memory Ingest Filter
+Keeps low-value and repeated messages out of long-term memory
+
+Three checks, cheapest first:
+    1. minimum information - "ok", "lol", "haha thanks" carry nothing to retrieve later
+    2. SimHash near-duplicates against the session's recent long-term messages
+    3. optional embedding similarity against the session's last K stored vectors
+
+Filtered messages still go to the recent-message buffer; only the BM25 and
+vector writes are skipped. A message joins the windows the later checks
+compare against only once it has been written (stored()).
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+import numpy as np
+from loguru import logger
+from .lexical_index import tokenize
+from .retrieval_gate import FILLER
+
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word unigrams and bigrams; similar texts differ in few bits."""
+    words = WORD_PATTERN.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big") for f in features),
+        dtype=np.uint64, count=len(features)
+    )
+    ones = ((hashes[:, None] >> BIT_SHIFTS) & np.uint64(1)).sum(axis=0)
+    return sum(1 << int(bit) for bit in np.flatnonzero(2 * ones > len(features)))
+
+
+class IngestFilter:
+    """Decides which messages are worth a long-term memory write, and counts the writes avoided"""
+
+    def __init__(self):
+        self.enabled = os.getenv("MEMORY_INGEST_FILTER", "true").lower() == "true"
+        self.min_terms = int(os.getenv("MEMORY_INGEST_MIN_TERMS", "2"))
+        self.simhash_window = int(os.getenv("MEMORY_INGEST_SIMHASH_WINDOW", "200"))
+        self.simhash_distance = int(os.getenv("MEMORY_INGEST_SIMHASH_DISTANCE", "3"))
+        self.embedding_dedupe = os.getenv("MEMORY_INGEST_EMBEDDING_DEDUPE", "false").lower() == "true"
+        self.embedding_window = int(os.getenv("MEMORY_INGEST_EMBEDDING_WINDOW", "50"))
+        self.embedding_threshold = float(os.getenv("MEMORY_INGEST_EMBEDDING_THRESHOLD", "0.97"))
+        self.log_every = int(os.getenv("MEMORY_INGEST_LOG_EVERY", "100"))
+
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, Deque[int]] = {}
+        self._vectors: Dict[str, Deque[np.ndarray]] = {}
+        self._counters = {"checked": 0, "stored": 0, "low_information": 0, "near_duplicate": 0, "embedding_duplicate": 0}
+
+    def check_text(self, session_key: str, content: str, seed: Callable[[], List[str]]) -> Optional[str]:
+        """
+        Text checks before embedding.
+
+        Args:
+            session_key: persona/session the message belongs to
+            content: Message text
+            seed: Returns the session's most recent stored texts; used to fill the
+                  SimHash window the first time a session is seen in this process
+
+        Returns:
+            Reason the message should be skipped, or None to store it
+        """
+        if not self.enabled:
+            return None
+        self._count("checked")
+
+        terms = [t for t in tokenize(content) if t not in FILLER]
+        if len(terms) < self.min_terms and not any(c.isdigit() for c in content):
+            return self._skip("low_information", content)
+
+        fingerprint = simhash(content)
+        with self._lock:
+            window = self._hashes.get(session_key)
+        if window is None:
+            window = deque((simhash(text) for text in seed()), maxlen=self.simhash_window)
+            with self._lock:
+                window = self._hashes.setdefault(session_key, window)
+        if any(bin(fingerprint ^ h).count("1") <= self.simhash_distance for h in window):
+            return self._skip("near_duplicate", content)
+        return None
+
+    def check_embedding(self, session_key: str, embedding: List[float]) -> Optional[str]:
+        """Optional check after embedding: cosine similarity to the session's last K stored vectors."""
+        if not (self.enabled and self.embedding_dedupe):
+            return None
+        vector = self._normalized(embedding)
+        with self._lock:
+            window = self._vectors.get(session_key)
+            duplicate = bool(window) and float(np.max(np.stack(window) @ vector)) >= self.embedding_threshold
+        if duplicate:
+            return self._skip("embedding_duplicate", None)
+        return None
+
+    def stored(self, session_key: str, content: str, embedding: Optional[List[float]] = None):
+        """Record that a message passed every check and was written; later messages are compared with it."""
+        if self.enabled:
+            fingerprint = simhash(content)
+            with self._lock:
+                window = self._hashes.get(session_key)
+                if window is not None:
+                    window.append(fingerprint)
+                if self.embedding_dedupe and embedding is not None:
+                    vectors = self._vectors.setdefault(session_key, deque(maxlen=self.embedding_window))
+                    vectors.append(self._normalized(embedding))
+        self._count("stored")
+        if self.enabled and self.log_every and self._counters["checked"] % self.log_every == 0:
+            logger.info(f"Memory ingest filter: {self.stats()}")
+
+    @staticmethod
+    def _normalized(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _skip(self, reason: str, content: Optional[str]) -> str:
+        self._count(reason)
+        if content is not None:
+            logger.debug(f"Not storing '{content[:40]}' in long-term memory ({reason})")
+        return reason
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def stats(self) -> Dict:
+        """Counters since startup, with the total number of writes avoided."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["writes_avoided"] = stats["low_information"] + stats["near_duplicate"] + stats["embedding_duplicate"]
+        return stats
@@ -0,0 +1,401 @@
+"""
+Lexical Memory Index
+BM25 inverted index per (persona, session), kept next to the vector store
+
+Catches what embeddings blur: names, dates and rare words. Each session is
+persisted as an append-only JSONL log of its messages. Only BM25 statistics
+are held in memory: per message its id, the byte offset of its log line and
+its length, plus the postings. Result records are read back from the log by
+offset. The statistics are saved next to the log as an .npz snapshot (plain
+arrays, no pickle) with the log offset they cover, so a process loads the
+snapshot and only replays lines appended after it (also by other API
+workers, which are picked up on the next lookup). The snapshot is rewritten
+every MEMORY_LEXICAL_SNAPSHOT_EVERY new messages. Deleting records
+(summarization) rewrites the log and drops its snapshot, which makes every
+process re-read it.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from .base_store import check_persona_id
+
+
+TOKEN_PATTERN = re.compile(r"[\w']+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he her him his how i i'm if in into is it "
+    "it's its me my no not of on or our she so than that the their them then there these they this to too was "
+    "we were what when where which who why will with you your yours about said say tell told remember".split()
+)
+
+# Fields of a long-term record kept in the log (everything a search result or export needs)
+RECORD_FIELDS = ("id", "session_id", "content", "role", "timestamp", "level", "covers_from", "covers_to", "covers_messages")
+
+# Bumped when the snapshot layout changes; older snapshots are ignored and rebuilt
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SUFFIX = ".postings.npz"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords; numbers and names are kept as-is."""
+    return [t.strip("'") for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS and t.strip("'")]
+
+
+class _SessionPostings:
+    """BM25 statistics for one session, loaded from its snapshot and fed from its log."""
+
+    def __init__(self, path: Path, snapshot_every: int):
+        self.path = path
+        self.snapshot_path = path.with_suffix(SNAPSHOT_SUFFIX)
+        self.snapshot_every = snapshot_every
+        self.inode = None
+        self._reset()
+
+    def _reset(self):
+        self.ids: List[str] = []
+        self.offsets: List[int] = []  # byte offset of each message's line in the log
+        self.lengths: List[int] = []
+        # Postings from the snapshot (term -> slice of docs/tfs) and those indexed since
+        self.terms: Dict[str, Tuple[int, int]] = {}
+        self.docs = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.int32)
+        self.tail: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        self.loaded_bytes = 0
+        self.snapshot_docs = 0
+        self._length_array = np.zeros(0, dtype=np.float32)
+
+    def refresh(self):
+        """Index lines appended to the log since the last call."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self.inode:
+            # First use, or the log was rewritten: start over from its snapshot
+            self._reset()
+            self._load_snapshot(stat)
+            self.inode = stat.st_ino
+        size = stat.st_size
+        if size <= self.loaded_bytes:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.loaded_bytes)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # being written right now; picked up next time
+                offset = self.loaded_bytes
+                self.loaded_bytes += len(line)
+                try:
+                    self._index(json.loads(line), offset)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable line in {self.path}")
+        if len(self.ids) - self.snapshot_docs >= self.snapshot_every:
+            self._save_snapshot()
+
+    def _load_snapshot(self, stat: os.stat_result):
+        try:
+            with np.load(self.snapshot_path, allow_pickle=False) as snapshot:
+                arrays = {name: snapshot[name] for name in snapshot.files}
+            version, inode, offset = (int(value) for value in arrays["meta"])
+            ids = _split(arrays["ids"])
+            terms = _split(arrays["terms"])
+            bounds = arrays["bounds"].tolist()
+            docs, tfs = arrays["docs"].astype(np.int32), arrays["tfs"].astype(np.int32)
+            offsets, lengths = arrays["offsets"].tolist(), arrays["lengths"].tolist()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable BM25 snapshot {self.snapshot_path}: {e}")
+            return
+        # A snapshot of another log (rewritten since), a longer one or an inconsistent one is stale
+        if version != SNAPSHOT_VERSION or inode != stat.st_ino or offset > stat.st_size:
+            return
+        if not (len(ids) == len(offsets) == len(lengths) and len(bounds) == len(terms) + 1
+                and bounds[-1] == len(docs) == len(tfs)):
+            logger.warning(f"Ignoring inconsistent BM25 snapshot {self.snapshot_path}")
+            return
+        self.ids, self.offsets, self.lengths = ids, offsets, lengths
+        self.terms = {term: (bounds[i], bounds[i + 1]) for i, term in enumerate(terms)}
+        self.docs, self.tfs = docs, tfs
+        self.total_length = sum(lengths)
+        self.loaded_bytes = offset
+        self.snapshot_docs = len(ids)
+
+    def _save_snapshot(self):
+        """Fold the new postings into the arrays and write them (atomically; several workers may race)."""
+        terms = sorted(set(self.terms) | set(self.tail))
+        docs, tfs, bounds = [], [], [0]
+        for term in terms:
+            term_docs, term_tfs = self._term_postings(term)
+            docs.append(term_docs)
+            tfs.append(term_tfs)
+            bounds.append(bounds[-1] + len(term_docs))
+        self.docs = np.concatenate(docs).astype(np.int32) if docs else np.zeros(0, dtype=np.int32)
+        self.tfs = np.concatenate(tfs).astype(np.int32) if tfs else np.zeros(0, dtype=np.int32)
+        self.terms = {term: (bounds[i], bounds[i + 1]) for i, term in enumerate(terms)}
+        self.tail = {}
+
+        temp = self.path.with_suffix(f".postings.{os.getpid()}.npz")
+        try:
+            with open(temp, "wb") as f:
+                np.savez(
+                    f,
+                    meta=np.array([SNAPSHOT_VERSION, self.inode, self.loaded_bytes], dtype=np.uint64),
+                    ids=_joined(self.ids),
+                    offsets=np.array(self.offsets, dtype=np.int64),
+                    lengths=np.array(self.lengths, dtype=np.int32),
+                    terms=_joined(terms),
+                    bounds=np.array(bounds, dtype=np.int64),
+                    docs=self.docs,
+                    tfs=self.tfs
+                )
+            os.replace(temp, self.snapshot_path)
+            self.snapshot_docs = len(self.ids)
+        except OSError as e:
+            logger.warning(f"Could not save BM25 snapshot {self.snapshot_path}: {e}")
+
+    def _index(self, record: Dict, offset: int):
+        doc = len(self.ids)
+        terms = Counter(tokenize(record.get("content", "")))
+        self.ids.append(str(record.get("id", "")))
+        self.offsets.append(offset)
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.total_length += length
+        for term, tf in terms.items():
+            self.tail.setdefault(term, {})[doc] = tf
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Documents containing a term and its frequency in each."""
+        docs, tfs = [], []
+        span = self.terms.get(term)
+        if span is not None:
+            docs.append(self.docs[span[0]:span[1]])
+            tfs.append(self.tfs[span[0]:span[1]])
+        tail = self.tail.get(term)
+        if tail:
+            docs.append(np.fromiter(tail.keys(), dtype=np.int32, count=len(tail)))
+            tfs.append(np.fromiter(tail.values(), dtype=np.int32, count=len(tail)))
+        if not docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate(docs), np.concatenate(tfs)
+
+    def read(self, docs: List[int]) -> List[Optional[Dict]]:
+        """Records of these documents, read from the log (None where the log changed under us)."""
+        records = []
+        try:
+            with open(self.path, "rb") as f:
+                for doc in docs:
+                    f.seek(self.offsets[doc])
+                    try:
+                        record = json.loads(f.readline())
+                    except ValueError:
+                        record = None
+                    # Another process rewrote the log since the last refresh
+                    if record is not None and str(record.get("id", "")) != self.ids[doc]:
+                        record = None
+                    records.append(record)
+        except FileNotFoundError:
+            return [None] * len(docs)
+        return records
+
+    def search(self, terms: List[str], n_results: int, k1: float, b: float) -> List[Dict]:
+        docs = len(self.ids)
+        if not docs or not terms:
+            return []
+        if len(self._length_array) != docs:
+            self._length_array = np.asarray(self.lengths, dtype=np.float32)
+        avg_length = self.total_length / docs or 1.0
+        scores = np.zeros(docs, dtype=np.float64)
+        matched = np.zeros(docs, dtype=np.int32)
+        for term in set(terms):
+            term_docs, term_tfs = self._term_postings(term)
+            if not len(term_docs):
+                continue
+            idf = math.log(1 + (docs - len(term_docs) + 0.5) / (len(term_docs) + 0.5))
+            tf = term_tfs.astype(np.float64)
+            norm = tf + k1 * (1 - b + b * self._length_array[term_docs] / avg_length)
+            scores[term_docs] += idf * tf * (k1 + 1) / norm
+            matched[term_docs] += 1
+
+        hits = np.flatnonzero(matched)
+        best = hits[np.argsort(-scores[hits], kind="stable")[:n_results]].tolist()
+        results = []
+        for doc, record in zip(best, self.read(best)):
+            if record is None:
+                continue
+            record["bm25"] = round(float(scores[doc]), 4)
+            record["matched_terms"] = int(matched[doc])
+            results.append(record)
+        return results
+
+
+def _joined(values: List[str]) -> np.ndarray:
+    """Newline-separated strings (ids and tokens never contain one) as a byte array."""
+    return np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _split(array: np.ndarray) -> List[str]:
+    text = array.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+class LexicalIndex:
+    """BM25 over long-term memory, one append-only log per (persona, session)"""
+
+    def __init__(self, persist_directory: str):
+        self.root = Path(persist_directory) / "lexical"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.k1 = float(os.getenv("MEMORY_BM25_K1", "1.2"))
+        self.b = float(os.getenv("MEMORY_BM25_B", "0.75"))
+        self.max_open = int(os.getenv("MEMORY_LEXICAL_OPEN_SESSIONS", "256"))
+        self.snapshot_every = int(os.getenv("MEMORY_LEXICAL_SNAPSHOT_EVERY", "1000"))
+        self._sessions: "OrderedDict[Path, _SessionPostings]" = OrderedDict()
+        self._session_ids: Dict[Path, str] = {}  # log -> session id, read from its first line
+        self._lock = threading.Lock()
+
+    def log_path(self, persona_id: str, session_id: str) -> Path:
+        """Append-only log holding a session's indexed messages."""
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16]
+        return self.root / check_persona_id(persona_id) / f"{digest}.jsonl"
+
+    def _postings(self, persona_id: str, session_id: str) -> _SessionPostings:
+        path = self.log_path(persona_id, session_id)
+        with self._lock:
+            postings = self._sessions.get(path)
+            if postings is None:
+                postings = _SessionPostings(path, self.snapshot_every)
+                self._sessions[path] = postings
+                while len(self._sessions) > self.max_open:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(path)
+            postings.refresh()
+            return postings
+
+    def add(self, persona_id: str, session_id: str, records: Iterable[Dict]):
+        """Append records to the session's log; the postings pick them up on the next lookup."""
+        path = self.log_path(persona_id, session_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = b"".join(
+            json.dumps({k: r[k] for k in RECORD_FIELDS if k in r}, ensure_ascii=False).encode("utf-8") + b"\n"
+            for r in records
+        )
+        # One O_APPEND write per batch, so concurrent workers never interleave lines
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines)
+        finally:
+            os.close(fd)
+
+    def search(self, persona_id: str, session_id: str, query: str, n_results: int = 5) -> List[Dict]:
+        """
+        BM25 top-n of a session for a query.
+
+        Returns:
+            Records, best first, with "bm25" (score) and "matched_terms" (distinct query terms found)
+        """
+        if not self.log_path(persona_id, session_id).exists():
+            return []
+        postings = self._postings(persona_id, session_id)
+        with self._lock:
+            return postings.search(tokenize(query), n_results, self.k1, self.b)
+
+    def count(self, persona_id: str, session_id: str) -> int:
+        """Messages indexed for a session."""
+        if not self.log_path(persona_id, session_id).exists():
+            return 0
+        postings = self._postings(persona_id, session_id)
+        with self._lock:
+            return len(postings.ids)
+
+    def ids(self, persona_id: str, session_id: str) -> set:
+        """Ids of the messages indexed for a session."""
+        if not self.log_path(persona_id, session_id).exists():
+            return set()
+        postings = self._postings(persona_id, session_id)
+        with self._lock:
+            return set(postings.ids)
+
+    def recent_contents(self, persona_id: str, session_id: str, n: int) -> List[str]:
+        """Text of the session's last n indexed messages, oldest first."""
+        if not self.log_path(persona_id, session_id).exists():
+            return []
+        postings = self._postings(persona_id, session_id)
+        with self._lock:
+            docs = list(range(max(0, len(postings.ids) - n), len(postings.ids)))
+            return [r.get("content", "") for r in postings.read(docs) if r is not None]
+
+    def sessions(self) -> Iterator[Tuple[str, str, float]]:
+        """(persona_id, session_id, last modified) of every session with a log on disk."""
+        for path in self.root.glob("*/*.jsonl"):
+            try:
+                modified = path.stat().st_mtime
+                session_id = self._session_ids.get(path)
+                if session_id is None:
+                    with open(path, "rb") as f:
+                        session_id = json.loads(f.readline()).get("session_id")
+            except (OSError, ValueError):
+                continue
+            if not session_id:
+                logger.debug(f"No session id in {path} (written before it was logged; run lexical-rebuild)")
+                continue
+            self._session_ids[path] = session_id
+            yield path.parent.name, session_id, modified
+
+    def delete(self, persona_id: str, session_id: str, ids: List[str]):
+        """Rewrite a session's log without the given records."""
+        path = self.log_path(persona_id, session_id)
+        if not path.exists() or not ids:
+            return
+        drop = set(ids)
+        with self._lock:
+            self._sessions.pop(path, None)
+            kept = []
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        if json.loads(line).get("id") in drop:
+                            continue
+                    except ValueError:
+                        continue
+                    kept.append(line)
+            temp = path.with_suffix(".jsonl.new")
+            temp.write_bytes(b"".join(kept))
+            path.with_suffix(SNAPSHOT_SUFFIX).unlink(missing_ok=True)
+            os.replace(temp, path)
+
+    def rebuild(self, batches: Iterable[List[Dict]]) -> int:
+        """
+        Replace all logs with the records given (from MemoryStore.iter_records).
+
+        Returns:
+            Number of records indexed
+        """
+        with self._lock:
+            self._sessions.clear()
+        for path in [*self.root.glob("*/*.jsonl"), *self.root.glob(f"*/*{SNAPSHOT_SUFFIX}")]:
+            path.unlink()
+        total = 0
+        for records in batches:
+            groups: Dict[tuple, List[Dict]] = {}
+            for record in records:
+                groups.setdefault((record["persona_id"], record["session_id"]), []).append(record)
+            for (persona_id, session_id), group in groups.items():
+                self.add(persona_id, session_id, group)
+            total += len(records)
+        return total
+
+    def disk_usage_mb(self) -> float:
+        files = [*self.root.rglob("*.jsonl"), *self.root.rglob(f"*{SNAPSHOT_SUFFIX}")]
+        return sum(f.stat().st_size for f in files) / (1024 * 1024)
@@ -0,0 +1,370 @@
+"""
+NumPy Memory Store
+In-process brute-force vector search for small deployments (no Chroma)
+
+Each (persona, session) gets a directory with:
+    index.json  - dimension, dtype and embedding backend
+    vectors.f16 - append-only row-major matrix of unit vectors (vectors.i8 when int8-quantized)
+    scales.f32  - per-row dequantization scale (int8 only)
+    meta.jsonl  - one record per row; a row exists once its metadata line is written
+
+Deleting rewrites the session's files as *.new and swaps them in after a
+rewrite.done marker is written, so an interrupted delete is either finished
+or discarded on the next open.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, List, Dict, Optional, Tuple
+import numpy as np
+from loguru import logger
+from .base_store import MemoryStore, check_persona_id
+
+
+NUMPY_DTYPES = ["float16", "int8"]
+
+# Rows scored per step; bounds the float32 scratch copy of the matrix
+SEARCH_CHUNK_ROWS = 16384
+
+
+class _SessionIndex:
+    """One session's vector matrix (memory-mapped) and metadata sidecar."""
+
+    def __init__(self, directory: Path, dim: int, dtype: str, embedding_backend: str):
+        self.directory = directory
+        header_path = directory / "index.json"
+        if header_path.exists():
+            header = json.loads(header_path.read_text())
+            if header.get("embedding_backend") != embedding_backend:
+                logger.warning(
+                    f"Memory in {directory} was embedded with {header.get('embedding_backend')}, "
+                    f"current backend is {embedding_backend} - reindex before searching it"
+                )
+        else:
+            header = {"dim": dim, "dtype": dtype, "embedding_backend": embedding_backend}
+            directory.mkdir(parents=True, exist_ok=True)
+            header_path.write_text(json.dumps(header))
+        self.dim = header["dim"]
+        self.quantized = header["dtype"] == "int8"
+        self.dtype = np.int8 if self.quantized else np.float16
+
+        self.vectors_path = directory / ("vectors.i8" if self.quantized else "vectors.f16")
+        self.scales_path = directory / "scales.f32"
+        self.meta_path = directory / "meta.jsonl"
+        self.offsets = array("q")  # byte offset of each row's metadata line
+        self._matrix = None
+        self._scales = None
+        self._mapped_rows = 0
+        self._recover()
+
+    @property
+    def rows(self) -> int:
+        return len(self.offsets)
+
+    def _recover(self):
+        """Index the metadata lines and cut off rows left half-written by a crash."""
+        self._finish_rewrite()
+        end = 0
+        if self.meta_path.exists():
+            with open(self.meta_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self.offsets.append(end)
+                    end += len(line)
+
+        row_bytes = self.dim * np.dtype(self.dtype).itemsize
+        vector_rows = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+        if self.quantized:
+            scale_rows = self.scales_path.stat().st_size // 4 if self.scales_path.exists() else 0
+            vector_rows = min(vector_rows, scale_rows)
+        rows = min(vector_rows, len(self.offsets))
+        del self.offsets[rows:]
+
+        meta_end = self.offsets[rows - 1] + self._line_length(rows - 1) if rows else 0
+        if (self.meta_path.exists() and self.meta_path.stat().st_size != meta_end) or vector_rows != rows:
+            logger.warning(f"Repairing {self.directory} after an interrupted write ({rows} records kept)")
+        self._truncate(self.meta_path, meta_end)
+        self._truncate(self.vectors_path, rows * row_bytes)
+        if self.quantized:
+            self._truncate(self.scales_path, rows * 4)
+
+    def _finish_rewrite(self):
+        """Swap in the files of a completed rewrite, or drop those of an unfinished one."""
+        marker = self.directory / "rewrite.done"
+        for path in self.directory.glob("*.new"):
+            if marker.exists():
+                os.replace(path, path.with_suffix(""))
+            else:
+                path.unlink()
+        if marker.exists():
+            marker.unlink()
+
+    def rewrite(self, keep: List[int]):
+        """Rewrite the session with only the given rows, in order (vectors are copied, not re-quantized)."""
+        matrix, scales = self._map()
+        targets = {self.vectors_path: np.ascontiguousarray(matrix[keep]).tobytes()}
+        if self.quantized:
+            targets[self.scales_path] = np.ascontiguousarray(scales[keep]).tobytes()
+        with open(self.meta_path, "rb") as f:
+            lines = []
+            for row in keep:
+                f.seek(self.offsets[row])
+                lines.append(f.readline())
+        targets[self.meta_path] = b"".join(lines)
+
+        for path, data in targets.items():
+            with open(f"{path}.new", "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        (self.directory / "rewrite.done").touch()
+
+        self.offsets = array("q")
+        self._matrix = None
+        self._scales = None
+        self._mapped_rows = 0
+        self._recover()
+
+    def _line_length(self, row: int) -> int:
+        with open(self.meta_path, "rb") as f:
+            f.seek(self.offsets[row])
+            return len(f.readline())
+
+    @staticmethod
+    def _truncate(path: Path, size: int):
+        if path.exists() and path.stat().st_size > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def append(self, records: List[Dict], embeddings: np.ndarray):
+        """Write vectors first and metadata last, so a crash never leaves a row without its vector."""
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match index dimension {self.dim}")
+        if self.quantized:
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            stored = np.round(embeddings / scales[:, None]).astype(np.int8)
+            with open(self.scales_path, "ab") as f:
+                f.write(scales.astype(np.float32).tobytes())
+        else:
+            stored = embeddings.astype(np.float16)
+        with open(self.vectors_path, "ab") as f:
+            f.write(stored.tobytes())
+
+        with open(self.meta_path, "ab") as f:
+            offsets = []
+            for record in records:
+                offsets.append(f.tell())
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.offsets.extend(offsets)
+
+    def _map(self):
+        """(Re)map the files when rows were appended since the last search."""
+        rows = self.rows
+        if self._mapped_rows != rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            if self.quantized:
+                self._scales = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(rows,))
+            self._mapped_rows = rows
+        return self._matrix, self._scales
+
+    def search(self, query: np.ndarray, n_results: int) -> List[Dict]:
+        """Cosine top-k over all rows: chunked matrix-vector product, then argpartition."""
+        rows = self.rows
+        if rows == 0 or n_results <= 0:
+            return []
+        matrix, scales = self._map()
+        scores = np.empty(rows, dtype=np.float32)
+        for start in range(0, rows, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, rows)
+            scores[start:end] = matrix[start:end].astype(np.float32) @ query
+            if self.quantized:
+                scores[start:end] *= scales[start:end]
+
+        k = min(n_results, rows)
+        top = np.argpartition(-scores, k - 1)[:k] if k < rows else np.arange(rows)
+        top = top[np.argsort(-scores[top])]
+
+        records = []
+        with open(self.meta_path, "rb") as f:
+            for row in top:
+                f.seek(self.offsets[row])
+                record = json.loads(f.readline())
+                record["distance"] = float(1.0 - scores[row])
+                records.append(record)
+        return records
+
+    def iter_rows(self, batch_size: int, include_embeddings: bool):
+        """(records, embeddings) in row order, batch_size rows at a time."""
+        rows = self.rows
+        if rows == 0:
+            return
+        matrix, scales = self._map()
+        with open(self.meta_path, "rb") as f:
+            for start in range(0, rows, batch_size):
+                end = min(start + batch_size, rows)
+                f.seek(self.offsets[start])
+                records = [json.loads(f.readline()) for _ in range(start, end)]
+                embeddings = None
+                if include_embeddings:
+                    block = matrix[start:end].astype(np.float32)
+                    if self.quantized:
+                        block *= scales[start:end, None]
+                    embeddings = block.tolist()
+                yield records, embeddings
+
+    def touch(self):
+        """Read every page of the matrix so the first search does not hit the disk."""
+        if self.rows:
+            matrix, _ = self._map()
+            for start in range(0, self.rows, SEARCH_CHUNK_ROWS):
+                matrix[start:start + SEARCH_CHUNK_ROWS].sum()
+
+
+class NumpyMemoryStore(MemoryStore):
+    """
+    Long-term memory as one memory-mapped matrix per session.
+
+    Search is exact (brute force). Up to ~10k messages per session it is about
+    as fast as an HNSW lookup while importing and holding far less; int8 rows
+    are half the size and search faster than float16 (NumPy's half-precision
+    casts are slow). Only one API worker may write to the store.
+    """
+
+    def __init__(self, persist_directory: str, embedding_backend: str, dtype: Optional[str] = None):
+        self.root = Path(persist_directory) / "vectors"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.embedding_backend = embedding_backend
+        self.dtype = (dtype or os.getenv("MEMORY_NUMPY_DTYPE", "float16")).lower()
+        if self.dtype not in NUMPY_DTYPES:
+            raise ValueError(f"Unknown MEMORY_NUMPY_DTYPE '{self.dtype}'. Options: {', '.join(NUMPY_DTYPES)}")
+        self.max_open = int(os.getenv("MEMORY_NUMPY_OPEN_SESSIONS", "256"))
+        self._indexes: "OrderedDict[Path, _SessionIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_name(self) -> str:
+        return f"numpy ({self.dtype})"
+
+    def session_dir(self, persona_id: str, session_id: str) -> Path:
+        """Directory holding a session's matrix and metadata."""
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16]
+        return self.root / check_persona_id(persona_id) / digest
+
+    def _index(self, persona_id: str, session_id: str, dim: Optional[int] = None) -> Optional[_SessionIndex]:
+        """Open (and cache) a session index; creates it only when dim is given."""
+        directory = self.session_dir(persona_id, session_id)
+        with self._lock:
+            index = self._indexes.get(directory)
+            if index is not None:
+                self._indexes.move_to_end(directory)
+                return index
+            if dim is None and not (directory / "index.json").exists():
+                return None
+            index = _SessionIndex(directory, dim, self.dtype, self.embedding_backend)
+            self._indexes[directory] = index
+            while len(self._indexes) > self.max_open:
+                self._indexes.popitem(last=False)
+            return index
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def add(self, persona_id: str, session_id: str, records: List[Dict], embeddings: List[List[float]]):
+        vectors = self._normalize(embeddings)
+        index = self._index(persona_id, session_id, dim=vectors.shape[1])
+        with self._lock:
+            index.append(records, vectors)
+
+    def query(self, persona_id: str, session_id: str, embedding: List[float], n_results: int = 5) -> List[Dict]:
+        index = self._index(persona_id, session_id)
+        if index is None:
+            return []
+        return index.search(self._normalize(embedding)[0], n_results)
+
+    def count(self, persona_id: str, session_id: str) -> int:
+        index = self._index(persona_id, session_id)
+        return index.rows if index else 0
+
+    def iter_records(self, batch_size: int = 500, include_embeddings: bool = False) -> Iterator[Tuple[List[Dict], Optional[List[List[float]]]]]:
+        for directory, _ in self._headers():
+            index = _SessionIndex(directory, None, self.dtype, self.embedding_backend)
+            yield from index.iter_rows(batch_size, include_embeddings)
+
+    def session_records(self, persona_id: str, session_id: str) -> List[Dict]:
+        index = self._index(persona_id, session_id)
+        if index is None or not index.rows:
+            return []
+        return next(index.iter_rows(index.rows, False))[0]
+
+    def delete(self, persona_id: str, session_id: str, ids: List[str]):
+        index = self._index(persona_id, session_id)
+        if index is None or not ids:
+            return
+        drop = set(ids)
+        with self._lock:
+            records = next(index.iter_rows(index.rows, False))[0] if index.rows else []
+            keep = [row for row, record in enumerate(records) if record.get("id") not in drop]
+            if len(keep) < len(records):
+                index.rewrite(keep)
+
+    def _headers(self):
+        """(directory, header) of every session in the store."""
+        for header_path in self.root.glob("*/*/index.json"):
+            try:
+                yield header_path.parent, json.loads(header_path.read_text())
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable memory index {header_path}: {e}")
+
+    @staticmethod
+    def _file_rows(directory: Path, header: Dict) -> int:
+        """Rows of a session from the size of its vector file."""
+        row_bytes = header["dim"] * (1 if header["dtype"] == "int8" else 2)
+        vectors = directory / ("vectors.i8" if header["dtype"] == "int8" else "vectors.f16")
+        return vectors.stat().st_size // row_bytes if vectors.exists() else 0
+
+    def total_count(self) -> int:
+        return sum(self._file_rows(directory, header) for directory, header in self._headers())
+
+    def location(self) -> Optional[Path]:
+        return self.root
+
+    def verify(self, expect_data: bool = False):
+        """Log sessions and rows on disk (rows from file sizes, metadata is not read)."""
+        sessions = 0
+        total = 0
+        for directory, header in self._headers():
+            total += self._file_rows(directory, header)
+            sessions += 1
+        if total == 0 and expect_data:
+            logger.warning(f"Long-term memory at {self.root} is empty but recent messages exist - was the store lost?")
+        logger.info(f"Long-term memory at {self.root}: {sessions} sessions, {total} messages ({self.disk_usage_mb():.1f} MB)")
+
+    def warm_up(self, sessions: List[Tuple[str, str]]) -> int:
+        warmed = 0
+        for persona_id, session_id in sessions:
+            try:
+                index = self._index(persona_id, session_id)
+                if index and index.rows:
+                    index.touch()
+                    warmed += 1
+            except Exception as e:
+                logger.warning(f"Could not warm up {persona_id}/{session_id}: {e}")
+        return warmed
+
+    def compact(self, name: Optional[str] = None, batch_size: int = 500) -> Dict:
+        """Append-only files hold no dead space; nothing to rebuild."""
+        size = round(self.disk_usage_mb(), 1)
+        return {"collections": 0, "before_mb": size, "after_mb": size}
+
+    def disk_usage_mb(self) -> float:
+        return sum(f.stat().st_size for f in self.root.rglob("*") if f.is_file()) / (1024 * 1024)
@@ -0,0 +1,151 @@
+"""
+Retrieval Gate
+Decides per turn whether build_context searches long-term memory
+
+Cheap signals only (no embedding): back-references ("remember when...",
+"last time"), named entities and dates, the number of content words, and
+how much of the message is new compared with the recent window. Counters
+of how often retrieval ran and whether its hits were used are logged so
+the thresholds can be tuned.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+from loguru import logger
+from .lexical_index import tokenize
+
+
+# adaptive - decide from the signals below
+# always   - search on every turn
+# recent   - search only while the session has fewer than 3 recent messages (previous behaviour)
+# never    - recent messages only
+GATE_MODES = ["adaptive", "always", "recent", "never"]
+
+BACK_REFERENCE = re.compile(
+    r"\b(remember|recall|forgot|forget|last (time|week|month|night|year)|earlier|before|ago|yesterday|"
+    r"you said|you told|i said|i told|i mentioned|we talked|we discussed|again|still|"
+    r"what was|what's my|what is my|do you know|did i)\b",
+    re.IGNORECASE
+)
+# Chit-chat words that never make a message worth a search on their own
+FILLER = frozenset(
+    "ok okay k cool thanks thank thx yes yeah yep no nope lol haha hahaha hey hi hello hmm oh ah nice great "
+    "sure good fine wow awesome right well just really".split()
+)
+# Capitalized word not at the start of a sentence, or a number/date
+ENTITY = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-Z][a-z]{2,}\b|\b\d{1,4}([/.-]\d{1,2}([/.-]\d{2,4})?)?\b")
+
+
+@dataclass
+class GateDecision:
+    search: bool
+    reason: str
+
+
+class RetrievalGate:
+    """Per-turn search decision plus usefulness counters"""
+
+    def __init__(self, mode: Optional[str] = None):
+        self.mode = (mode or os.getenv("MEMORY_RETRIEVAL_GATE", "adaptive")).lower()
+        if self.mode not in GATE_MODES:
+            raise ValueError(f"Unknown MEMORY_RETRIEVAL_GATE '{self.mode}'. Options: {', '.join(GATE_MODES)}")
+        self.min_terms = int(os.getenv("MEMORY_GATE_MIN_TERMS", "3"))
+        self.novelty_threshold = float(os.getenv("MEMORY_GATE_NOVELTY", "0.6"))
+        self.use_overlap = int(os.getenv("MEMORY_GATE_USE_OVERLAP", "2"))
+        self.log_every = int(os.getenv("MEMORY_GATE_LOG_EVERY", "50"))
+
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._pending: Dict[str, List[Set[str]]] = {}  # session -> term sets of hits awaiting the reply
+
+    def decide(self, message: str, recent: List[Dict], older: Optional[int] = None, persona_name: str = "") -> GateDecision:
+        """
+        Whether to search long-term memory for this turn.
+
+        Args:
+            message: Current user message
+            recent: Recent-window messages (may end with the current message)
+            older: Stored messages of the session that are not in the recent window, if known
+            persona_name: Not counted as a named entity ("Hi Luna")
+        """
+        decision = self._decide(message, self._window(message, recent), older, persona_name.lower())
+        self._count("turns")
+        self._count("searched" if decision.search else "skipped")
+        self._count(f"reason:{decision.reason}")
+        logger.debug(f"Retrieval gate: {'search' if decision.search else 'skip'} ({decision.reason})")
+        if self.log_every and self._counters["turns"] % self.log_every == 0:
+            logger.info(f"Retrieval gate stats: {self.stats()}")
+        return decision
+
+    def _decide(self, message: str, window: List[Dict], older: Optional[int], persona_name: str) -> GateDecision:
+        if self.mode == "always":
+            return GateDecision(True, "always")
+        if self.mode == "never":
+            return GateDecision(False, "never")
+        if self.mode == "recent":
+            return GateDecision(len(window) + 1 < 3, "recent")
+
+        if older == 0:
+            return GateDecision(False, "nothing-older")
+        if BACK_REFERENCE.search(message):
+            return GateDecision(True, "back-reference")
+        if any(m.group(0).lower() != persona_name for m in ENTITY.finditer(message.strip())):
+            return GateDecision(True, "entity")
+
+        terms = set(tokenize(message)) - FILLER
+        if len(terms) < self.min_terms:
+            return GateDecision(False, "short")
+        window_terms = set()
+        for msg in window:
+            window_terms.update(tokenize(msg.get("content", "")))
+        novelty = len(terms - window_terms) / len(terms)
+        if novelty >= self.novelty_threshold:
+            return GateDecision(True, "novel")
+        return GateDecision(False, "covered")
+
+    @staticmethod
+    def _window(message: str, recent: List[Dict]) -> List[Dict]:
+        """The recent window without the current message (stored before build_context runs)."""
+        if recent and recent[-1].get("role") == "user" and recent[-1].get("content") == message:
+            return recent[:-1]
+        return recent
+
+    def filter_hits(self, session_id: str, message: str, recent: List[Dict], hits: List[Dict]) -> List[Dict]:
+        """Drop hits already in the recent window (or the message itself) and remember the rest for usefulness tracking."""
+        seen = {msg.get("content") for msg in recent} | {message}
+        fresh = [hit for hit in hits if hit.get("content") not in seen]
+        self._count("hits", len(hits))
+        self._count("hits_duplicate", len(hits) - len(fresh))
+        self._count("searches_with_hits" if fresh else "searches_empty")
+        with self._lock:
+            self._pending[session_id] = [set(tokenize(hit["content"])) for hit in fresh]
+        return fresh
+
+    def observe_reply(self, session_id: str, reply: str):
+        """Count retrieved hits the assistant's reply drew on (shares at least MEMORY_GATE_USE_OVERLAP words)."""
+        with self._lock:
+            pending = self._pending.pop(session_id, None)
+        if not pending:
+            return
+        reply_terms = set(tokenize(reply))
+        used = sum(1 for terms in pending if len(terms & reply_terms) >= self.use_overlap)
+        self._count("hits_used", used)
+        self._count("replies_using_hits" if used else "replies_ignoring_hits")
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def stats(self) -> Dict:
+        """Counters since startup, plus search and usefulness rates."""
+        with self._lock:
+            stats = dict(self._counters)
+        turns = stats.get("turns", 0)
+        fresh_hits = stats.get("hits", 0) - stats.get("hits_duplicate", 0)
+        stats["mode"] = self.mode
+        stats["search_rate"] = round(stats.get("searched", 0) / turns, 3) if turns else 0.0
+        stats["hit_use_rate"] = round(stats.get("hits_used", 0) / fresh_hits, 3) if fresh_hits else 0.0
+        return stats
@@ -1,29 +1,84 @@
 """
 Memory Manager for Unicorn AI
-Hybrid memory system using ChromaDB for semantic search + recent message storage
+Hybrid memory system: vector store for semantic search + recent message storage
 """
 
+import asyncio
+import fcntl
 import json
+import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional
 from datetime import datetime
-import chromadb
-from chromadb.config import Settings
+from dotenv import load_dotenv
 from loguru import logger
+from embeddings import Embedder, create_embedder
+from memory_backends import MemoryStore, create_memory_store
+from memory_backends.lexical_index import LexicalIndex, tokenize
+from memory_backends.retrieval_gate import RetrievalGate
+from memory_backends.ingest_filter import IngestFilter
+from memory_backends.history import SessionHistory
+
+# The global instance below is built at import time, before main.py loads its env
+load_dotenv("config/.env")
+
+# hybrid  - BM25 and vector results merged with reciprocal-rank fusion
+# vector  - embeddings only (previous behaviour)
+# lexical - BM25 only, no embedding pass at query time
+RETRIEVAL_MODES = ["hybrid", "vector", "lexical"]
+
 
 class MemoryManager:
-    def __init__(self, persist_directory: str = "./data/memory"):
+    def __init__(
+        self,
+        persist_directory: str = "./data/memory",
+        embedder: Optional[Embedder] = None,
+        store: Optional[MemoryStore] = None,
+        partition: Optional[str] = None,
+        shards: Optional[int] = None
+    ):
         """Initialize the hybrid memory system."""
         self.persist_dir = Path(persist_directory)
         self.persist_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize ChromaDB for semantic search
-        self.client = chromadb.Client(Settings(
-            persist_directory=str(self.persist_dir / "chroma"),
-            anonymized_telemetry=False
-        ))
+        # Embeddings are computed here and handed to the store, so the backend is ours to pick
+        self.embedder = embedder or create_embedder()
+        
+        # Long-term memory (MEMORY_BACKEND): Chroma collections or in-process NumPy matrices
+        self.store = store or create_memory_store(
+            str(self.persist_dir),
+            self.embedder.get_name(),
+            partition=partition,
+            shards=shards
+        )
+        
+        # BM25 index kept next to the vector store, for names, dates and rare words
+        self.lexical = LexicalIndex(str(self.persist_dir))
+        self.retrieval = os.getenv("MEMORY_RETRIEVAL", "hybrid").lower()
+        if self.retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown MEMORY_RETRIEVAL '{self.retrieval}'. Options: {', '.join(RETRIEVAL_MODES)}")
+        self.rrf_k = int(os.getenv("MEMORY_RRF_K", "60"))
+        # Short queries whose terms all occur in one past message skip the embedding pass
+        self.lexical_fast_path = os.getenv("MEMORY_LEXICAL_FAST_PATH", "true").lower() == "true"
+        self.lexical_fast_max_terms = int(os.getenv("MEMORY_LEXICAL_FAST_MAX_TERMS", "4"))
+        # Decides per turn whether build_context searches at all (MEMORY_RETRIEVAL_GATE)
+        self.gate = RetrievalGate()
+        # Keeps filler and near-duplicate messages out of long-term memory (MEMORY_INGEST_*)
+        self.ingest = IngestFilter()
+        
+        # Cold tier: raw turns replaced by summaries, kept for reference but not indexed
+        self.archive_dir = self.persist_dir / "archive"
+        # Paged reads and NDJSON export of a session's archive + BM25 log
+        self.history = SessionHistory(self.lexical.root, self.archive_dir)
         
         # Recent messages storage (per session)
+        self._recent_lock = threading.Lock()  # async paths write from worker threads
+        # With a shared store (Chroma server) several API workers share the JSON files below
+        self._shared_files = self.store.shared
+        self._file_mtimes = {}
         self.recent_messages_file = self.persist_dir / "recent_messages.json"
         self.recent_messages = self._load_recent_messages()
         
@@ -31,7 +86,12 @@ class MemoryManager:
         self.memory_settings_file = self.persist_dir / "memory_settings.json"
         self.memory_settings = self._load_memory_settings()
         
-        logger.info("Memory Manager initialized")
+        # Check the store at startup so lost or half-written memory is noticed, not silently re-grown
+        self.store.verify(expect_data=any(self.recent_messages.values()))
+        if any(self.recent_messages.values()) and not any(self.lexical.root.glob("*/*.jsonl")):
+            logger.info("BM25 memory index is empty - index existing memory with: python memory_admin.py lexical-rebuild")
+        
+        logger.info(f"Memory Manager initialized (long-term: {self.store.get_name()})")
     
     def _load_recent_messages(self) -> Dict:
         """Load recent messages from JSON."""
@@ -44,6 +104,7 @@ class MemoryManager:
         """Save recent messages to JSON."""
         with open(self.recent_messages_file, 'w') as f:
             json.dump(self.recent_messages, f, indent=2)
+        self._file_mtimes[self.recent_messages_file] = self.recent_messages_file.stat().st_mtime_ns
     
     def _load_memory_settings(self) -> Dict:
         """Load memory on/off settings per user/session."""
@@ -56,30 +117,111 @@ class MemoryManager:
         """Save memory settings to JSON."""
         with open(self.memory_settings_file, 'w') as f:
             json.dump(self.memory_settings, f, indent=2)
+        self._file_mtimes[self.memory_settings_file] = self.memory_settings_file.stat().st_mtime_ns
+    
+    @contextmanager
+    def _json_write_lock(self):
+        """
+        Serialize read-modify-write of the JSON files. When several API workers
+        share them, also take an exclusive file lock and start from the latest copy.
+        """
+        with self._recent_lock:
+            if not self._shared_files:
+                yield
+                return
+            with open(self.persist_dir / ".memory.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._reload_if_changed(force=True)
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def hold_api_lock(self):
+        """Mark the memory directory as in use by the API; every worker holds a shared lock until it exits."""
+        self._api_lock_file = open(self.persist_dir / ".api.lock", "w")
+        fcntl.flock(self._api_lock_file, fcntl.LOCK_SH)
+    
+    def api_running(self) -> bool:
+        """Whether an API process has the memory directory open (see hold_api_lock)."""
+        with open(self.persist_dir / ".api.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
+    
+    def _reload_if_changed(self, force: bool = False):
+        """Pick up JSON files written by other API workers (shared mode only)."""
+        if not self._shared_files:
+            return
+        for path, loader, attr in (
+            (self.recent_messages_file, self._load_recent_messages, "recent_messages"),
+            (self.memory_settings_file, self._load_memory_settings, "memory_settings"),
+        ):
+            try:
+                mtime = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if force or self._file_mtimes.get(path) != mtime:
+                setattr(self, attr, loader())
+                self._file_mtimes[path] = mtime
     
     def is_memory_enabled(self, session_id: str) -> bool:
         """Check if memory is enabled for a session."""
+        self._reload_if_changed()
         return self.memory_settings.get(session_id, {}).get("enabled", True)  # Default: ON
     
     def set_memory_enabled(self, session_id: str, enabled: bool):
         """Enable or disable memory for a session."""
-        if session_id not in self.memory_settings:
-            self.memory_settings[session_id] = {}
-        self.memory_settings[session_id]["enabled"] = enabled
-        self._save_memory_settings()
+        with self._json_write_lock():
+            if session_id not in self.memory_settings:
+                self.memory_settings[session_id] = {}
+            self.memory_settings[session_id]["enabled"] = enabled
+            self._save_memory_settings()
         logger.info(f"Memory {'enabled' if enabled else 'disabled'} for session {session_id}")
     
-    def get_or_create_collection(self, persona_id: str):
-        """Get or create a ChromaDB collection for a persona."""
-        collection_name = f"persona_{persona_id}"
-        try:
-            return self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
-        except Exception as e:
-            logger.error(f"Error creating collection for {persona_id}: {e}")
-            return None
+    def warm_up(self, limit: Optional[int] = None) -> Dict:
+        """
+        Page long-term indexes into memory before the first real query.
+        
+        The most recently active sessions are warmed first.
+        
+        Returns:
+            Number of collections/sessions warmed and seconds taken
+        """
+        limit = limit if limit is not None else int(os.getenv("MEMORY_WARMUP_LIMIT", "50"))
+        start = time.perf_counter()
+        
+        # Most recently active sessions first
+        sessions = sorted(
+            ((msgs[-1]["timestamp"], session_id, msgs[-1]["persona_id"])
+             for session_id, msgs in self.recent_messages.items() if msgs),
+            reverse=True
+        )
+        warmed = self.store.warm_up([(persona_id, session_id) for _, session_id, persona_id in sessions[:limit]])
+        
+        stats = {"collections": warmed, "seconds": round(time.perf_counter() - start, 2)}
+        logger.info(f"Memory warm-up: {stats['collections']} collections in {stats['seconds']}s")
+        return stats
+    
+    def compact(self, collection_name: Optional[str] = None, batch_size: int = 500) -> Dict:
+        """
+        Rebuild long-term indexes and reclaim disk space.
+        
+        Returns:
+            Collections rebuilt and disk usage before/after in MB
+        """
+        stats = self.store.compact(collection_name, batch_size=batch_size)
+        logger.info(f"Compaction done: {stats}")
+        return stats
+    
+    def rebuild_lexical_index(self, batch_size: int = 500) -> int:
+        """Re-create the BM25 logs from everything in the vector store (e.g. memory stored before BM25 existed)."""
+        total = self.lexical.rebuild(records for records, _ in self.store.iter_records(batch_size))
+        logger.info(f"BM25 memory index rebuilt: {total} messages")
+        return total
     
     def add_message(
         self, 
@@ -104,6 +246,124 @@ class MemoryManager:
             logger.debug(f"Memory disabled for session {session_id}, not storing message")
             return
         
+        timestamp = self._remember_recent(session_id, persona_id, role, content, metadata)
+        if role == "assistant":
+            self.gate.observe_reply(session_id, content)
+        
+        if not self._worth_storing(persona_id, session_id, content):
+            return
+        
+        # Embed first: a near-duplicate of a stored vector goes to neither index
+        record = self._long_term_record(session_id, persona_id, role, content, timestamp)
+        key = f"{persona_id}/{session_id}"
+        try:
+            embeddings = self.embedder.embed([content])
+        except Exception as e:
+            logger.error(f"Error embedding message for long-term memory: {e}")
+            if self._add_lexical(persona_id, session_id, record):
+                self.ingest.stored(key, content)
+            return
+        if self.ingest.check_embedding(key, embeddings[0]):
+            return
+        
+        # Add to the BM25 index and the vector store (long-term memory)
+        self._add_lexical(persona_id, session_id, record)
+        try:
+            self.store.add(persona_id, session_id, [record], embeddings)
+            self.ingest.stored(key, content, embeddings[0])
+        except Exception as e:
+            logger.error(f"Error adding message to long-term memory: {e}")
+    
+    async def add_message_async(
+        self,
+        session_id: str,
+        persona_id: str,
+        role: str,
+        content: str,
+        metadata: Optional[Dict] = None
+    ):
+        """add_message for the API's event loop (embedding never blocks the loop)."""
+        if not self.is_memory_enabled(session_id):
+            logger.debug(f"Memory disabled for session {session_id}, not storing message")
+            return
+        
+        timestamp = await asyncio.to_thread(self._remember_recent, session_id, persona_id, role, content, metadata)
+        if role == "assistant":
+            self.gate.observe_reply(session_id, content)
+        if not await asyncio.to_thread(self._worth_storing, persona_id, session_id, content):
+            return
+        record = self._long_term_record(session_id, persona_id, role, content, timestamp)
+        key = f"{persona_id}/{session_id}"
+        try:
+            embeddings = await asyncio.to_thread(self.embedder.embed, [content])
+        except Exception as e:
+            logger.error(f"Error embedding message for long-term memory: {e}")
+            if await asyncio.to_thread(self._add_lexical, persona_id, session_id, record):
+                self.ingest.stored(key, content)
+            return
+        if self.ingest.check_embedding(key, embeddings[0]):
+            return
+        await asyncio.to_thread(self._add_lexical, persona_id, session_id, record)
+        try:
+            await self.store.add_async(persona_id, session_id, [record], embeddings)
+            self.ingest.stored(key, content, embeddings[0])
+        except Exception as e:
+            logger.error(f"Error adding message to long-term memory: {e}")
+    
+    def replace_with_summary(self, persona_id: str, session_id: str, records: List[Dict], summary: str, level: int) -> Dict:
+        """
+        Index a summary of records as one memory and tier the records out of the hot index.
+        
+        The summary is stored before the originals are removed, so an interruption can
+        duplicate but never lose memory. Originals go to the cold archive.
+        
+        Returns:
+            The summary record
+        """
+        ordered = sorted(records, key=lambda r: r.get("timestamp", ""))
+        record = {
+            "id": f"{session_id}_summary{level}_{ordered[-1]['timestamp']}",
+            "content": summary,
+            "session_id": session_id,
+            "role": "summary",
+            "timestamp": ordered[-1]["timestamp"],
+            "persona_id": persona_id,
+            "level": level,
+            "covers_from": ordered[0]["timestamp"],
+            "covers_to": ordered[-1]["timestamp"],
+            "covers_messages": sum(r.get("covers_messages", 1) for r in ordered)
+        }
+        self.store.add(persona_id, session_id, [record], self.embedder.embed([summary]))
+        self.lexical.add(persona_id, session_id, [record])
+        
+        archive = self.history.segments(self.lexical.log_path(persona_id, session_id))[0]
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        with open(archive, "a") as f:
+            for old in ordered:
+                f.write(json.dumps(old, ensure_ascii=False) + "\n")
+        
+        ids = [r["id"] for r in ordered]
+        self.store.delete(persona_id, session_id, ids)
+        self.lexical.delete(persona_id, session_id, ids)
+        logger.info(f"Summarized {len(ids)} memories of session {session_id} (level {level})")
+        return record
+    
+    def _worth_storing(self, persona_id: str, session_id: str, content: str) -> bool:
+        """Ingest filter text checks; skipped messages stay in the recent buffer only."""
+        seed = lambda: self.lexical.recent_contents(persona_id, session_id, self.ingest.simhash_window)
+        return self.ingest.check_text(f"{persona_id}/{session_id}", content, seed) is None
+    
+    def _add_lexical(self, persona_id: str, session_id: str, record: Dict) -> bool:
+        """Append a record to the BM25 index (kept even when embedding fails); False if that failed."""
+        try:
+            self.lexical.add(persona_id, session_id, [record])
+            return True
+        except Exception as e:
+            logger.error(f"Error adding message to BM25 index: {e}")
+            return False
+    
+    def _remember_recent(self, session_id: str, persona_id: str, role: str, content: str, metadata: Optional[Dict]) -> str:
+        """Append to the recent-messages buffer (last 20 per session); returns the message timestamp."""
         timestamp = datetime.now().isoformat()
         message = {
             "role": role,
@@ -115,41 +375,38 @@ class MemoryManager:
         if metadata:
             message.update(metadata)
         
-        # Add to recent messages (keep last 20 per session)
-        if session_id not in self.recent_messages:
-            self.recent_messages[session_id] = []
-        
-        self.recent_messages[session_id].append(message)
-        
-        # Keep only last 20 messages for recent context
-        if len(self.recent_messages[session_id]) > 20:
-            self.recent_messages[session_id] = self.recent_messages[session_id][-20:]
-        
-        self._save_recent_messages()
-        
-        # Add to ChromaDB for semantic search (long-term memory)
-        collection = self.get_or_create_collection(persona_id)
-        if collection:
-            try:
-                doc_id = f"{session_id}_{timestamp}"
-                collection.add(
-                    documents=[content],
-                    ids=[doc_id],
-                    metadatas=[{
-                        "session_id": session_id,
-                        "role": role,
-                        "timestamp": timestamp,
-                        "persona_id": persona_id
-                    }]
-                )
-            except Exception as e:
-                logger.error(f"Error adding message to ChromaDB: {e}")
+        with self._json_write_lock():
+            # Add to recent messages (keep last 20 per session)
+            if session_id not in self.recent_messages:
+                self.recent_messages[session_id] = []
+            
+            self.recent_messages[session_id].append(message)
+            
+            # Keep only last 20 messages for recent context
+            if len(self.recent_messages[session_id]) > 20:
+                self.recent_messages[session_id] = self.recent_messages[session_id][-20:]
+            
+            self._save_recent_messages()
+        return timestamp
+    
+    @staticmethod
+    def _long_term_record(session_id: str, persona_id: str, role: str, content: str, timestamp: str) -> Dict:
+        """Long-term memory record for one message, minus the embedding."""
+        return {
+            "id": f"{session_id}_{timestamp}",
+            "content": content,
+            "session_id": session_id,
+            "role": role,
+            "timestamp": timestamp,
+            "persona_id": persona_id
+        }
     
     def get_recent_messages(self, session_id: str, n: int = 10) -> List[Dict]:
         """Get the N most recent messages for a session."""
         if not self.is_memory_enabled(session_id):
             return []
         
+        self._reload_if_changed()
         messages = self.recent_messages.get(session_id, [])
         return messages[-n:] if messages else []
     
@@ -161,7 +418,7 @@ class MemoryManager:
         n_results: int = 5
     ) -> List[Dict]:
         """
-        Search for relevant past conversations using semantic similarity.
+        Search for relevant past conversations (BM25 + semantic similarity).
         
         Args:
             session_id: Session to search within
@@ -175,31 +432,82 @@ class MemoryManager:
         if not self.is_memory_enabled(session_id):
             return []
         
-        collection = self.get_or_create_collection(persona_id)
-        if not collection:
+        lexical = self._search_lexical(session_id, persona_id, query, n_results)
+        if self._lexical_answers(query, lexical):
+            return lexical[:n_results]
+        
+        vector = []
+        try:
+            query_embedding = self.embedder.embed([query])[0]
+            vector = self.store.query(persona_id, session_id, query_embedding, self._candidates(n_results))
+        except Exception as e:
+            logger.error(f"Error searching long-term memory: {e}")
+        
+        return self._fuse(vector, lexical, n_results)
+    
+    async def search_relevant_context_async(
+        self,
+        session_id: str,
+        persona_id: str,
+        query: str,
+        n_results: int = 5
+    ) -> List[Dict]:
+        """search_relevant_context for the API's event loop."""
+        if not self.is_memory_enabled(session_id):
             return []
         
+        lexical = await asyncio.to_thread(self._search_lexical, session_id, persona_id, query, n_results)
+        if self._lexical_answers(query, lexical):
+            return lexical[:n_results]
+        
+        vector = []
         try:
-            results = collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                where={"session_id": session_id}  # Only search within this session
-            )
-            
-            if results and results['documents'] and results['documents'][0]:
-                relevant_messages = []
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i]
-                    relevant_messages.append({
-                        "content": doc,
-                        "role": metadata.get("role"),
-                        "timestamp": metadata.get("timestamp")
-                    })
-                return relevant_messages
+            query_embeddings = await asyncio.to_thread(self.embedder.embed, [query])
+            vector = await self.store.query_async(persona_id, session_id, query_embeddings[0], self._candidates(n_results))
         except Exception as e:
-            logger.error(f"Error searching ChromaDB: {e}")
+            logger.error(f"Error searching long-term memory: {e}")
         
-        return []
+        return self._fuse(vector, lexical, n_results)
+    
+    def _candidates(self, n_results: int) -> int:
+        """How deep each ranked list goes before fusion."""
+        return n_results if self.retrieval == "vector" else max(n_results * 3, 10)
+    
+    def _search_lexical(self, session_id: str, persona_id: str, query: str, n_results: int) -> List[Dict]:
+        """BM25 candidates for a query ([] in vector-only mode)."""
+        if self.retrieval == "vector":
+            return []
+        try:
+            return self.lexical.search(persona_id, session_id, query, self._candidates(n_results))
+        except Exception as e:
+            logger.error(f"Error searching BM25 index: {e}")
+            return []
+    
+    def _lexical_answers(self, query: str, lexical: List[Dict]) -> bool:
+        """Whether BM25 results alone answer the query, so no embedding is computed."""
+        if self.retrieval == "lexical":
+            return True
+        if self.retrieval == "vector" or not self.lexical_fast_path or not lexical:
+            return False
+        terms = set(tokenize(query))
+        if 0 < len(terms) <= self.lexical_fast_max_terms and lexical[0]["matched_terms"] == len(terms):
+            logger.debug(f"BM25 fast path for '{query}'")
+            return True
+        return False
+    
+    def _fuse(self, vector: List[Dict], lexical: List[Dict], n_results: int) -> List[Dict]:
+        """Reciprocal-rank fusion of the vector and BM25 lists (score = sum of 1 / (k + rank))."""
+        if not lexical or not vector:
+            return (vector or lexical)[:n_results]
+        scores: Dict[str, float] = {}
+        records: Dict[str, Dict] = {}
+        for results in (vector, lexical):
+            for rank, record in enumerate(results, start=1):
+                key = record.get("id") or record["content"]
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank)
+                records.setdefault(key, {}).update(record)
+        best = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        return [dict(records[key], rrf=round(scores[key], 5)) for key in best]
     
     def build_context(
         self,
@@ -219,50 +527,246 @@ class MemoryManager:
         if not self.is_memory_enabled(session_id):
             return ""
         
-        context_parts = []
-        
         # Get recent messages
         recent = self.get_recent_messages(session_id, max_recent)
+        
+        # Get relevant past context when the retrieval gate thinks it can help
+        relevant = []
+        if self.gate.decide(current_message, recent, self._older_count(session_id, persona_id, recent), persona_id).search:
+            # Extra results make up for hits that are already in the recent window
+            hits = self.search_relevant_context(session_id, persona_id, current_message, max_relevant + len(recent))
+            relevant = self.gate.filter_hits(session_id, current_message, recent, hits)[:max_relevant]
+        
+        return self._format_context(recent, relevant)
+    
+    async def build_context_async(
+        self,
+        session_id: str,
+        persona_id: str,
+        current_message: str,
+        max_recent: int = 5,
+        max_relevant: int = 3
+    ) -> str:
+        """build_context for the API's event loop."""
+        if not self.is_memory_enabled(session_id):
+            return ""
+        
+        recent = self.get_recent_messages(session_id, max_recent)
+        relevant = []
+        older = await asyncio.to_thread(self._older_count, session_id, persona_id, recent)
+        if self.gate.decide(current_message, recent, older, persona_id).search:
+            hits = await self.search_relevant_context_async(session_id, persona_id, current_message, max_relevant + len(recent))
+            relevant = self.gate.filter_hits(session_id, current_message, recent, hits)[:max_relevant]
+        
+        return self._format_context(recent, relevant)
+    
+    def stored_count(self, session_id: str, persona_id: str) -> Optional[int]:
+        """Messages in a session's long-term memory, from the BM25 log (None if the session was never indexed)."""
+        try:
+            if self.lexical.log_path(persona_id, session_id).exists():
+                return self.lexical.count(persona_id, session_id)
+        except Exception as e:
+            logger.error(f"Error reading BM25 index: {e}")
+        return None
+    
+    def _older_count(self, session_id: str, persona_id: str, recent: List[Dict]) -> Optional[int]:
+        """
+        Stored messages of a session that are not in the recent window (None if unknown).
+        
+        The ingest filter keeps some recent messages out of long-term memory, so the
+        window's messages are matched against the newest stored ones instead of counted.
+        """
+        stored = self.stored_count(session_id, persona_id)
+        if not stored:
+            return stored
+        try:
+            newest = self.lexical.recent_contents(persona_id, session_id, len(recent))
+        except Exception as e:
+            logger.error(f"Error reading BM25 index: {e}")
+            return None
+        window = {msg.get("content") for msg in recent}
+        return stored - sum(1 for content in newest if content in window)
+    
+    @staticmethod
+    def _format_context(recent: List[Dict], relevant: List[Dict]) -> str:
+        """Format recent and retrieved messages into the prompt context block."""
+        context_parts = []
+        
         if recent:
             context_parts.append("--- Recent Conversation ---")
             for msg in recent:
                 role = "User" if msg["role"] == "user" else msg.get("persona_id", "Assistant")
                 context_parts.append(f"{role}: {msg['content']}")
         
-        # Get semantically relevant past context (skip if we have recent messages from same topic)
-        if len(recent) < 3:  # Only search if conversation is new/short
-            relevant = self.search_relevant_context(session_id, persona_id, current_message, max_relevant)
-            if relevant:
-                context_parts.append("\n--- Relevant Past Context ---")
-                for msg in relevant:
-                    role = "User" if msg["role"] == "user" else "Assistant"
-                    context_parts.append(f"{role}: {msg['content']}")
+        if relevant:
+            context_parts.append("\n--- Relevant Past Context ---")
+            for msg in relevant:
+                if msg["role"] == "summary":
+                    context_parts.append(f"(Earlier conversation) {msg['content']}")
+                    continue
+                role = "User" if msg["role"] == "user" else "Assistant"
+                context_parts.append(f"{role}: {msg['content']}")
         
         return "\n".join(context_parts) if context_parts else ""
     
     def clear_session(self, session_id: str):
         """Clear recent messages for a session (like "Clear Chat" button)."""
-        if session_id in self.recent_messages:
-            del self.recent_messages[session_id]
-            self._save_recent_messages()
-            logger.info(f"Cleared recent messages for session {session_id}")
+        with self._json_write_lock():
+            if session_id in self.recent_messages:
+                del self.recent_messages[session_id]
+                self._save_recent_messages()
+                logger.info(f"Cleared recent messages for session {session_id}")
+    
+    def get_history(
+        self,
+        session_id: str,
+        persona_id: str,
+        before: Optional[str] = None,
+        before_time: Optional[str] = None,
+        limit: int = 50,
+        include_summaries: bool = False
+    ) -> Dict:
+        """
+        Page backwards through everything stored for a session (archived turns included).
+        
+        Messages the ingest filter kept out of long-term memory only exist in the recent window.
+        
+        Returns:
+            {"messages": [...oldest first], "next_cursor": cursor for the next older page or None}
+        """
+        log_path = self.lexical.log_path(persona_id, session_id)
+        return self.history.page(log_path, before, before_time, limit, include_summaries)
+    
+    def export_session(self, session_id: str, persona_id: str) -> Iterator[bytes]:
+        """Stream a session (archive, long-term memory, recent window) as NDJSON lines."""
+        recent = [m for m in self.recent_messages.get(session_id, []) if m.get("persona_id") == persona_id]
+        return self.history.export(persona_id, session_id, self.lexical.log_path(persona_id, session_id), recent)
+    
+    def import_session(
+        self,
+        lines: Iterable[bytes],
+        session_id: Optional[str] = None,
+        persona_id: Optional[str] = None,
+        batch_size: int = 256
+    ) -> Dict:
+        """
+        Restore a session from export_session() lines, re-embedding memories in batches.
+        
+        Records already stored for the session are skipped, so an interrupted import can be re-run.
+        
+        Args:
+            lines: NDJSON lines (e.g. an open file), read one at a time
+            session_id: Import under another session id (default: the exported one)
+            persona_id: Import under another persona (default: the exported one)
+        
+        Returns:
+            Counts of memories, archived and recent messages imported and of skipped records
+        """
+        lines = iter(lines)
+        try:
+            header = json.loads(next(lines))
+        except (StopIteration, ValueError):
+            raise ValueError("Empty or unreadable export")
+        if header.get("type") != "session":
+            raise ValueError("Export must start with a session header")
+        source_session = header["session_id"]
+        session_id = session_id or source_session
+        persona_id = persona_id or header["persona_id"]
+        
+        def rename(record: Dict) -> Dict:
+            record["session_id"] = session_id
+            record["persona_id"] = persona_id
+            if session_id != source_session and record.get("id", "").startswith(f"{source_session}_"):
+                record["id"] = session_id + record["id"][len(source_session):]
+            return record
+        
+        existing = self.lexical.ids(persona_id, session_id)
+        archive = self.history.segments(self.lexical.log_path(persona_id, session_id))[0]
+        archived = self.history.ids(archive)
+        counts = {"memories": 0, "archived": 0, "recent": 0, "skipped": 0}
+        memories: List[Dict] = []
+        recent: List[Dict] = []
+        archive_file = None
+        try:
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                kind = record.pop("type", None)
+                if kind == "memory":
+                    record = rename(record)
+                    if record["id"] in existing:
+                        counts["skipped"] += 1
+                        continue
+                    memories.append(record)
+                    if len(memories) >= batch_size:
+                        self._import_memories(persona_id, session_id, memories)
+                        counts["memories"] += len(memories)
+                        memories = []
+                elif kind == "archived":
+                    record = rename(record)
+                    if record["id"] in archived:
+                        counts["skipped"] += 1
+                        continue
+                    if archive_file is None:
+                        archive.parent.mkdir(parents=True, exist_ok=True)
+                        archive_file = open(archive, "a")
+                    archive_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    counts["archived"] += 1
+                elif kind == "recent":
+                    record.pop("session_id", None)
+                    recent.append(dict(record, persona_id=persona_id))
+        finally:
+            if archive_file is not None:
+                archive_file.close()
+        if memories:
+            self._import_memories(persona_id, session_id, memories)
+            counts["memories"] += len(memories)
+        
+        if recent:
+            with self._json_write_lock():
+                self.recent_messages[session_id] = recent[-20:]
+                self._save_recent_messages()
+            counts["recent"] = len(recent[-20:])
+        logger.info(f"Imported session {session_id} ({persona_id}): {counts}")
+        return counts
+    
+    def _import_memories(self, persona_id: str, session_id: str, records: List[Dict]):
+        self.store.add(persona_id, session_id, records, self.embedder.embed([r["content"] for r in records]))
+        self.lexical.add(persona_id, session_id, records)
     
     def get_memory_stats(self, session_id: str, persona_id: str) -> Dict:
         """Get memory statistics for a session."""
         stats = {
             "enabled": self.is_memory_enabled(session_id),
             "recent_messages": len(self.recent_messages.get(session_id, [])),
-            "total_stored": 0
+            "total_stored": 0,
+            "retrieval_gate": self.gate.stats(),
+            "ingest_filter": self.ingest.stats()
         }
         
-        collection = self.get_or_create_collection(persona_id)
-        if collection:
-            try:
-                # Count messages for this session
-                results = collection.get(where={"session_id": session_id})
-                stats["total_stored"] = len(results['ids']) if results and 'ids' in results else 0
-            except Exception as e:
-                logger.error(f"Error getting memory stats: {e}")
+        try:
+            stored = self.stored_count(session_id, persona_id)
+            stats["total_stored"] = stored if stored is not None else self.store.count(persona_id, session_id)
+        except Exception as e:
+            logger.error(f"Error getting memory stats: {e}")
+        
+        return stats
+    
+    async def get_memory_stats_async(self, session_id: str, persona_id: str) -> Dict:
+        """get_memory_stats for the API's event loop."""
+        stats = {
+            "enabled": self.is_memory_enabled(session_id),
+            "recent_messages": len(self.recent_messages.get(session_id, [])),
+            "total_stored": 0,
+            "retrieval_gate": self.gate.stats(),
+            "ingest_filter": self.ingest.stats()
+        }
+        try:
+            stored = await asyncio.to_thread(self.stored_count, session_id, persona_id)
+            stats["total_stored"] = stored if stored is not None else await self.store.count_async(persona_id, session_id)
+        except Exception as e:
+            logger.error(f"Error getting memory stats: {e}")
         
         return stats
 
@@ -0,0 +1,211 @@
+"""
+Memory Reindexer for Unicorn AI
+Rebuilds long-term memory with another embedding model, backend or partition layout
+
+Every stored message is streamed out of the live store, re-embedded in large
+batches across a process pool and written to a new store built side by side
+under data/memory/reindex/. With a Chroma server or the NumPy store the API
+keeps serving from the old store meanwhile; embedded Chroma can only be opened
+by one process, so the API has to be stopped. Runs are resumable: records
+already in the new store are skipped, and messages deleted from the live store
+(summarization) are dropped again. The swap renames the live store away, so it
+is only done with the API stopped, right after a final catch-up pass; restart
+the API with the new settings afterwards.
+"""
+
+import json
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional
+from loguru import logger
+from embeddings import create_embedder
+from memory_backends import MemoryStore, create_memory_store
+
+
+_worker_embedder = None
+
+
+def _init_worker(embedding_backend: str):
+    """Load the target embedding model once per pool process."""
+    global _worker_embedder
+    _worker_embedder = create_embedder(embedding_backend)
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_embedder.embed(texts)
+
+
+class MemoryReindexer:
+    """Builds a re-embedded copy of long-term memory next to the live one and swaps it in"""
+
+    def __init__(
+        self,
+        source: MemoryStore,
+        persist_directory: str,
+        backend: Optional[str] = None,
+        embedding_backend: Optional[str] = None,
+        partition: Optional[str] = None,
+        shards: Optional[int] = None,
+        workers: int = 2,
+        batch_size: int = 256
+    ):
+        self.source = source
+        self.persist_dir = Path(persist_directory)
+        self.staging_dir = self.persist_dir / "reindex"
+        self.state_file = self.staging_dir / "state.json"
+        self.workers = workers
+        self.batch_size = batch_size
+        self.config = {
+            "backend": (backend or os.getenv("MEMORY_BACKEND", "chroma")).lower(),
+            "embedding_backend": (embedding_backend or os.getenv("EMBEDDING_BACKEND", "default")).lower(),
+            "embedding_model": os.getenv("EMBEDDING_MODEL"),
+            "partition": (partition or os.getenv("MEMORY_PARTITION", "persona")).lower(),
+            "shards": shards or int(os.getenv("MEMORY_SHARDS", "16")),
+            "numpy_dtype": os.getenv("MEMORY_NUMPY_DTYPE", "float16").lower(),
+        }
+        self.stats = {"scanned": 0, "embedded": 0, "copied": 0, "skipped": 0, "dropped": 0}
+
+    def prepare(self, restart: bool = False):
+        """Open (or start) the side-by-side store; refuses to resume a run with different settings."""
+        if restart and self.staging_dir.exists():
+            shutil.rmtree(self.staging_dir)
+        if self.state_file.exists():
+            previous = json.loads(self.state_file.read_text())["config"]
+            if previous != self.config:
+                raise ValueError(
+                    f"A reindex with other settings is in progress in {self.staging_dir} ({previous}). "
+                    "Use the same settings to resume it, or --restart"
+                )
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.state_file.write_text(json.dumps({"config": self.config, "started": time.time()}, indent=2))
+
+        self.embedder = create_embedder(self.config["embedding_backend"])
+        if self.config["backend"] == "chroma":
+            os.environ["MEMORY_CHROMA_MODE"] = "embedded"  # the new store is always built on local disk
+        self.target = create_memory_store(
+            str(self.staging_dir),
+            self.embedder.get_name(),
+            backend=self.config["backend"],
+            partition=self.config["partition"],
+            shards=self.config["shards"]
+        )
+        # Same vector space: stored embeddings are copied instead of recomputed
+        self.reuse_embeddings = getattr(self.source, "embedding_backend", None) == self.embedder.get_name()
+
+    def run(self) -> Dict:
+        """
+        Bring the new store in line with the live one: add what is missing, drop what was deleted.
+
+        Returns:
+            Counters of the pass
+        """
+        existing = self._target_ids()
+        total = self.source.total_count()
+        mode = "copying stored embeddings" if self.reuse_embeddings else f"re-embedding with {self.embedder.get_name()}"
+        logger.info(f"Reindexing {total} memories into {self.target.get_name()} ({mode}, {len(existing)} already done)")
+
+        seen = set()
+        started = time.perf_counter()
+        last_report = started
+        pool = None
+        if not self.reuse_embeddings and self.workers > 0:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.config["embedding_backend"],)
+            )
+        pending = deque()
+        try:
+            for records, embeddings in self.source.iter_records(self.batch_size, include_embeddings=self.reuse_embeddings):
+                self.stats["scanned"] += len(records)
+                seen.update(r["id"] for r in records)
+                todo = [i for i, r in enumerate(records) if r["id"] not in existing]
+                self.stats["skipped"] += len(records) - len(todo)
+                if not todo:
+                    continue
+                records = [records[i] for i in todo]
+                if self.reuse_embeddings:
+                    self._write(records, [embeddings[i] for i in todo])
+                    self.stats["copied"] += len(records)
+                elif pool is None:
+                    self._write(records, self.embedder.embed([r["content"] for r in records]))
+                    self.stats["embedded"] += len(records)
+                else:
+                    pending.append((records, pool.submit(_embed_in_worker, [r["content"] for r in records])))
+                    while len(pending) > self.workers * 2:
+                        self._finish(pending.popleft())
+
+                if time.perf_counter() - last_report > 10:
+                    last_report = time.perf_counter()
+                    self._report(total, started)
+            while pending:
+                self._finish(pending.popleft())
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        stale: Dict[tuple, List[str]] = {}
+        for record_id, key in existing.items():
+            if record_id not in seen:
+                stale.setdefault(key, []).append(record_id)
+        for (persona_id, session_id), ids in stale.items():
+            self.target.delete(persona_id, session_id, ids)
+            self.stats["dropped"] += len(ids)
+
+        self._report(total, started)
+        return dict(self.stats)
+
+    def _target_ids(self) -> Dict[str, tuple]:
+        """Ids already in the new store, with their (persona, session) - what a resumed run skips."""
+        ids = {}
+        for records, _ in self.target.iter_records(self.batch_size):
+            for record in records:
+                ids[record["id"]] = (record["persona_id"], record["session_id"])
+        return ids
+
+    def _finish(self, item):
+        records, future = item
+        self._write(records, future.result())
+        self.stats["embedded"] += len(records)
+
+    def _write(self, records: List[Dict], embeddings: List[List[float]]):
+        groups: Dict[tuple, List[int]] = {}
+        for i, record in enumerate(records):
+            groups.setdefault((record["persona_id"], record["session_id"]), []).append(i)
+        for (persona_id, session_id), rows in groups.items():
+            self.target.add(persona_id, session_id, [records[i] for i in rows], [embeddings[i] for i in rows])
+
+    def _report(self, total: int, started: float):
+        done = self.stats["scanned"]
+        elapsed = time.perf_counter() - started
+        rate = (self.stats["embedded"] + self.stats["copied"]) / elapsed if elapsed else 0.0
+        percent = f"{100 * done / total:.0f}%" if total else "-"
+        logger.info(f"Reindex: {done}/{total} scanned ({percent}), {self.stats['embedded'] + self.stats['copied']} written, {rate:.0f}/s")
+
+    def swap(self) -> Path:
+        """
+        Rename the new store into place. The replaced store is kept as <name>.old-<timestamp>.
+
+        Returns:
+            Directory of the replaced store (or the live one if there was nothing to replace)
+        """
+        new = self.target.location()
+        live = self.persist_dir / new.name
+        backup = self.persist_dir / f"{new.name}.old-{int(time.time())}"
+        if live.exists():
+            os.rename(live, backup)
+        try:
+            os.rename(new, live)
+        except OSError:
+            if backup.exists():
+                os.rename(backup, live)
+            raise
+        shutil.rmtree(self.staging_dir)
+        logger.info(f"Swapped reindexed memory into {live} (previous store: {backup if backup.exists() else 'none'})")
+        return backup if backup.exists() else live
@@ -0,0 +1,196 @@
+"""
+Memory Summarizer for Unicorn AI
+Background job that rolls old turns of long sessions into summaries
+
+While the GPU is idle, the oldest raw messages of each session beyond
+MEMORY_SUMMARY_KEEP_RAW are summarized in chunks by a small Ollama model.
+The summary is indexed as a memory of its own and the raw turns move to the
+cold archive. Summaries roll up the same way once a level holds more than
+MEMORY_SUMMARY_MAX_PER_LEVEL of them, so a session's index stays bounded.
+Sessions are found from the BM25 logs on disk. Every API worker runs the
+loop; a pass holds a file lock on the memory directory, so only one process
+summarizes at a time. The loop stops for good if Ollama doesn't have the
+summary model.
+"""
+
+import asyncio
+import fcntl
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+from loguru import logger
+from memory_manager import MemoryManager
+
+
+SUMMARY_PROMPT = """Summarize this part of a conversation between a user and {persona} in at most {words} words.
+Keep names, dates, places, preferences, plans and facts the user shared about themselves. Write in third person, plain text.
+
+{transcript}
+
+Summary:"""
+
+
+class MemorySummarizer:
+    """Rolls up old session memory while the GPU has nothing else to do"""
+
+    def __init__(self, manager: MemoryManager, is_idle: Callable[[], bool] = lambda: True):
+        self.manager = manager
+        self.is_idle = is_idle
+        self.enabled = os.getenv("MEMORY_SUMMARY_ENABLED", "true").lower() == "true"
+        self.model = os.getenv("MEMORY_SUMMARY_MODEL", "llama3.2:1b")
+        self.ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.interval = float(os.getenv("MEMORY_SUMMARY_INTERVAL", "60"))
+        self.keep_raw = int(os.getenv("MEMORY_SUMMARY_KEEP_RAW", "100"))
+        self.chunk = int(os.getenv("MEMORY_SUMMARY_CHUNK", "40"))
+        self.max_per_level = int(os.getenv("MEMORY_SUMMARY_MAX_PER_LEVEL", "10"))
+        self.words = int(os.getenv("MEMORY_SUMMARY_WORDS", "120"))
+        self.stats = {"summaries": 0, "messages_tiered": 0, "errors": 0}
+        self._within_budget: Dict[Tuple[str, str], float] = {}  # session -> log mtime when last found within budget
+
+    async def run(self):
+        """Loop forever: wait for an idle GPU, then summarize one chunk at a time."""
+        logger.info(f"Memory summarizer started (model: {self.model}, keep raw: {self.keep_raw}, chunk: {self.chunk})")
+        installed = None
+        while True:
+            await asyncio.sleep(self.interval)
+            if installed is None:
+                installed = await self.model_installed()
+                if installed is None:
+                    continue  # Ollama not reachable yet
+                if not installed:
+                    self.enabled = False
+                    logger.warning(
+                        f"Memory summarizer disabled: Ollama has no model {self.model} "
+                        f"(ollama pull {self.model}, or set MEMORY_SUMMARY_MODEL / MEMORY_SUMMARY_ENABLED=false)"
+                    )
+                    return
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Memory summarizer pass failed: {e}")
+
+    async def model_installed(self) -> Optional[bool]:
+        """Whether Ollama has the summary model (None if Ollama can't be reached)."""
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(f"{self.ollama_url}/api/tags")
+                response.raise_for_status()
+                names = {model.get("name") for model in response.json().get("models", [])}
+        except (httpx.HTTPError, ValueError) as e:
+            logger.debug(f"Could not list Ollama models: {e}")
+            return None
+        return self.model in names or f"{self.model}:latest" in names
+
+    async def run_once(self, force: bool = False) -> int:
+        """
+        Summarize every session that is over budget, checking for idleness between chunks.
+
+        Args:
+            force: Ignore the idle check (admin tool)
+
+        Returns:
+            Number of summaries written
+        """
+        written = 0
+        with open(self.manager.persist_dir / ".summarizer.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                (logger.warning if force else logger.debug)("Memory summarizer pass skipped: another process is summarizing")
+                return 0
+            try:
+                for persona_id, session_id in self._sessions():
+                    written += await self.summarize_session(persona_id, session_id, force)
+                    if not (force or self.is_idle()):
+                        logger.debug("Memory summarizer paused: GPU busy")
+                        break
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return written
+
+    def _sessions(self) -> List[tuple]:
+        """(persona_id, session_id) of sessions whose stored memory exceeds the raw budget."""
+        sessions = []
+        for persona_id, session_id, modified in self.manager.lexical.sessions():
+            key = (persona_id, session_id)
+            if self._within_budget.get(key) == modified:
+                continue  # unchanged since it was last found within budget
+            stored = self.manager.stored_count(session_id, persona_id)
+            if stored is not None and stored > self.keep_raw + self.chunk:
+                sessions.append(key)
+                self._within_budget.pop(key, None)
+            else:
+                self._within_budget[key] = modified
+        return sessions
+
+    async def summarize_session(self, persona_id: str, session_id: str, force: bool = False) -> int:
+        """
+        Summarize a session's over-budget tiers, one chunk at a time while the GPU stays idle.
+
+        Returns:
+            Number of summaries written
+        """
+        records = await asyncio.to_thread(self.manager.store.session_records, persona_id, session_id)
+        written = 0
+        while force or self.is_idle():
+            batch, level = self._next_batch(records)
+            if not batch:
+                self._mark_within_budget(persona_id, session_id)
+                break
+            summary = await self._summarize(persona_id, batch)
+            if not summary:
+                break
+            record = await asyncio.to_thread(
+                self.manager.replace_with_summary, persona_id, session_id, batch, summary, level
+            )
+            tiered = {r["id"] for r in batch}
+            records = [r for r in records if r["id"] not in tiered] + [record]
+            self.stats["summaries"] += 1
+            self.stats["messages_tiered"] += len(batch)
+            written += 1
+        return written
+
+    def _mark_within_budget(self, persona_id: str, session_id: str):
+        """Skip the session in later passes until its log changes."""
+        try:
+            self._within_budget[(persona_id, session_id)] = self.manager.lexical.log_path(persona_id, session_id).stat().st_mtime
+        except OSError:
+            pass
+
+    def _next_batch(self, records: List[Dict]):
+        """Oldest chunk of the lowest tier that is over budget, and the level its summary gets."""
+        tiers: Dict[int, List[Dict]] = {}
+        for record in records:
+            level = int(record.get("level", 0)) if record.get("role") == "summary" else 0
+            tiers.setdefault(level, []).append(record)
+        for level in sorted(tiers):
+            tier = sorted(tiers[level], key=lambda r: r.get("timestamp", ""))
+            budget = self.keep_raw if level == 0 else self.max_per_level
+            if len(tier) >= budget + self.chunk or (level > 0 and len(tier) > budget):
+                return tier[:self.chunk if level == 0 else max(2, budget // 2)], level + 1
+        return [], 0
+
+    async def _summarize(self, persona_id: str, batch: List[Dict]) -> Optional[str]:
+        """Ask the summary model for a summary of a batch of messages or summaries."""
+        lines = []
+        for record in batch:
+            speaker = {"user": "User", "summary": "Earlier"}.get(record.get("role"), persona_id.title())
+            lines.append(f"{speaker}: {record['content']}")
+        payload = {
+            "model": self.model,
+            "prompt": SUMMARY_PROMPT.format(persona=persona_id.title(), words=self.words, transcript="\n".join(lines)),
+            "stream": False,
+            "keep_alive": "1m",  # free the VRAM soon after the pass
+            "options": {"temperature": 0.2, "num_predict": self.words * 2}
+        }
+        try:
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                response = await client.post(f"{self.ollama_url}/api/generate", json=payload)
+                response.raise_for_status()
+                summary = response.json().get("response", "").strip()
+        except httpx.HTTPError as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Memory summary request failed: {e}")
+            return None
+        return summary or None
@@ -23,7 +23,7 @@ if ! curl -s http://localhost:8188/system_stats > /dev/null 2>&1; then
     cd comfyui
     if [ -d "venv" ]; then
         source venv/bin/activate
-        nohup python main.py --normalvram --listen 0.0.0.0 --port 8188 > ../outputs/logs/comfyui.log 2>&1 &
+        nohup python main.py --normalvram --listen 0.0.0.0 --port 8188 --preview-method auto > ../outputs/logs/comfyui.log 2>&1 &
         log "✅ ComfyUI restarted (PID: $!)"
     else
         log "❌ ComfyUI venv not found"
@@ -4,9 +4,11 @@ Automatically selects the best available provider
 """
 
 import os
+import httpx
 from typing import Optional
 from loguru import logger
 from .base_provider import ImageProvider
+from .health import HealthRegistry
 from .replicate_provider import ReplicateProvider
 from .comfyui_provider import ComfyUIProvider
 
@@ -14,16 +16,32 @@ from .comfyui_provider import ComfyUIProvider
 class ImageProviderManager:
     """Manages multiple image providers and selects the best one"""
     
-    def __init__(self):
+    def __init__(self, health: Optional[HealthRegistry] = None):
         self.providers = []
         self.preferred_provider = os.getenv("IMAGE_PROVIDER", "auto")
+        self.health = health or HealthRegistry()
         
         # Register available providers
         self.providers.append(ComfyUIProvider())
         self.providers.append(ReplicateProvider())
+        for provider in self.providers:
+            self.health.register(provider.key, provider.is_available)
         
         logger.info(f"Initialized {len(self.providers)} image providers")
     
+    def provider(self, key: str) -> Optional[ImageProvider]:
+        """A registered provider by its key ("comfyui", "replicate")."""
+        return next((p for p in self.providers if p.key == key), None)
+    
+    async def prepare(self):
+        """Run each selectable provider's startup checks; a failing provider is logged, the API still starts."""
+        for provider in self.providers:
+            if self.preferred_provider == "auto" or self.preferred_provider.lower() in provider.get_name().lower():
+                try:
+                    await provider.prepare()
+                except Exception as e:
+                    logger.error(f"{provider.get_name()} startup check failed: {e}")
+    
     async def get_provider(self) -> ImageProvider:
         """Get the best available provider"""
         
@@ -31,7 +49,7 @@ class ImageProviderManager:
         if self.preferred_provider != "auto":
             for provider in self.providers:
                 if self.preferred_provider.lower() in provider.get_name().lower():
-                    if await provider.is_available():
+                    if await self.health.is_available(provider.key):
                         logger.info(f"Using preferred provider: {provider.get_name()}")
                         return provider
                     else:
@@ -39,7 +57,7 @@ class ImageProviderManager:
         
         # Auto-select: try each provider in order
         for provider in self.providers:
-            if await provider.is_available():
+            if await self.health.is_available(provider.key):
                 logger.info(f"Auto-selected provider: {provider.get_name()}")
                 return provider
         
@@ -56,10 +74,15 @@ class ImageProviderManager:
         """Generate an image using the best available provider"""
         
         provider = await self.get_provider()
-        return await provider.generate_image(
-            prompt,
-            negative_prompt=negative_prompt,
-            width=width,
-            height=height,
-            **kwargs
-        )
+        try:
+            return await provider.generate_image(
+                prompt,
+                negative_prompt=negative_prompt,
+                width=width,
+                height=height,
+                **kwargs
+            )
+        except (httpx.TransportError, ConnectionError) as e:
+            # The cached "online" was wrong: make the next request re-check
+            self.health.invalidate(provider.key, str(e) or type(e).__name__)
+            raise
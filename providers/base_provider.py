@@ -10,6 +10,9 @@ from typing import Optional, Dict, Any
 class ImageProvider(ABC):
     """Base class for all image generation providers"""
     
+    # Short id the provider's status is kept under in the HealthRegistry
+    key = "image"
+    
     @abstractmethod
     async def generate_image(
         self,
@@ -34,6 +37,10 @@ class ImageProvider(ABC):
         """
         pass
     
+    async def prepare(self):
+        """Load and check the provider's configuration at startup; raise if it cannot work."""
+        pass
+    
     @abstractmethod
     async def is_available(self) -> bool:
         """Check if the provider is available and configured"""
@@ -0,0 +1,217 @@
+"""
+ComfyUI Backend Pool
+Several ComfyUI servers behind the one ComfyUI provider
+
+COMFYUI_URLS lists the servers (a lone COMFYUI_URL is a pool of one). Each
+prompt goes to the backend with the shortest queue: ComfyUI's own /queue, or
+the prompts this API has sent there if that is more. A backend whose last
+prompt used the same checkpoint gets a head start of COMFYUI_CHECKPOINT_BONUS
+queued prompts, since loading another model can take as long as a
+generation. Health and queue depth come from the background health prober;
+a dispatch only probes backends whose state is older than HEALTH_TTL, or
+every backend when all of them are marked down. A draining backend gets no
+new prompts while its running ones finish (used for restarts).
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+import httpx
+from loguru import logger
+
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "0.0.0.0")
+
+
+class NoBackendAvailable(ConnectionError):
+    """Every ComfyUI backend is down or draining"""
+    pass
+
+
+@dataclass(eq=False)
+class ComfyUIBackend:
+    """One ComfyUI server and what the pool knows about it"""
+    url: str
+    name: str
+    healthy: bool = True  # optimistic until the first probe
+    draining: bool = False
+    queue_depth: int = 0
+    inflight: int = 0
+    checkpoints: Set[str] = field(default_factory=set)  # used by the last prompt, so still loaded
+    error: Optional[str] = None
+    checked: Optional[float] = None
+    prompts: int = 0
+    failures: int = 0
+    
+    @property
+    def ws_url(self) -> str:
+        return self.url.replace("http://", "ws://").replace("https://", "wss://") + "/ws"
+    
+    @property
+    def local(self) -> bool:
+        """Runs on this machine (shares the GPU with Ollama, restartable through service.sh)."""
+        return urlparse(self.url).hostname in LOCAL_HOSTS
+    
+    @property
+    def usable(self) -> bool:
+        return self.healthy and not self.draining
+
+
+class ComfyUIPool:
+    """ComfyUI backends with queue-depth-aware dispatch, health and draining"""
+    
+    def __init__(self, urls: Optional[List[str]] = None, checkpoint_bonus: Optional[float] = None, probe_timeout: float = 5.0):
+        if urls is None:
+            raw = os.getenv("COMFYUI_URLS") or os.getenv("COMFYUI_URL", "http://localhost:8188")
+            urls = [url.strip() for url in raw.split(",") if url.strip()]
+        self.backends: Dict[str, ComfyUIBackend] = {}
+        for url in urls:
+            url = url.rstrip("/")
+            name = urlparse(url).netloc or url
+            self.backends[name] = ComfyUIBackend(url=url, name=name)
+        self.checkpoint_bonus = checkpoint_bonus if checkpoint_bonus is not None else float(os.getenv("COMFYUI_CHECKPOINT_BONUS", "1"))
+        self.probe_timeout = probe_timeout
+        self.max_age = float(os.getenv("HEALTH_TTL", "30"))  # probed state older than this is refreshed on dispatch
+        self.on_change: Optional[Callable[[], None]] = None  # called when capacity may have grown
+    
+    def get(self, name: str) -> ComfyUIBackend:
+        """
+        A backend by name (host:port).
+        
+        Raises:
+            KeyError: No such backend
+        """
+        return self.backends[name]
+    
+    @property
+    def primary(self) -> ComfyUIBackend:
+        return next(iter(self.backends.values()))
+    
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+    
+    async def _probe(self, client: httpx.AsyncClient, backend: ComfyUIBackend):
+        try:
+            response = await client.get(f"{backend.url}/queue")
+            response.raise_for_status()
+            queue = response.json()
+        except Exception as e:
+            self.mark_down(backend, str(e) or type(e).__name__)
+        else:
+            backend.queue_depth = len(queue.get("queue_running", [])) + len(queue.get("queue_pending", []))
+            backend.error = None
+            if not backend.healthy:
+                backend.healthy = True
+                logger.info(f"ComfyUI backend {backend.name} is back online")
+                self._changed()
+        backend.checked = time.time()
+    
+    async def refresh(self, include_draining: bool = False, stale_only: bool = False):
+        """Probe the backends' /queue: health and queue depth in one request (stale_only: just those not probed lately)."""
+        now = time.time()
+        backends = [
+            backend for backend in self.backends.values()
+            if (include_draining or not backend.draining)
+            and not (stale_only and backend.checked is not None and now - backend.checked < self.max_age)
+        ]
+        if not backends:
+            return
+        async with httpx.AsyncClient(timeout=self.probe_timeout) as client:
+            await asyncio.gather(*(self._probe(client, backend) for backend in backends))
+    
+    def mark_down(self, backend: ComfyUIBackend, error: str):
+        if backend.healthy:
+            logger.warning(f"ComfyUI backend {backend.name} is down: {error}")
+        backend.healthy = False
+        backend.error = error
+    
+    def capacity(self) -> int:
+        """Prompts that may run at once: one per usable backend (at least one unless all are draining)."""
+        usable = sum(1 for backend in self.backends.values() if backend.usable)
+        if usable:
+            return usable
+        # All down: let one through so the request probes again and fails fast; all draining: wait
+        return 1 if any(not backend.draining for backend in self.backends.values()) else 0
+    
+    def load(self, backend: ComfyUIBackend, checkpoints: Set[str]) -> float:
+        """Queued prompts ahead of a new one, less the bonus when its checkpoint is already loaded."""
+        load = max(backend.queue_depth, backend.inflight)
+        if checkpoints and checkpoints <= backend.checkpoints:
+            load -= self.checkpoint_bonus
+        return load
+    
+    async def acquire(self, checkpoints: Set[str], exclude: Iterable[str] = ()) -> ComfyUIBackend:
+        """
+        Pick the backend for a prompt and count it as in flight there (pair with release()).
+        
+        Raises:
+            NoBackendAvailable: Every backend (not excluded) is down or draining
+        """
+        exclude = set(exclude)
+        await self.refresh(stale_only=True)
+        candidates = [backend for backend in self.backends.values() if backend.usable and backend.name not in exclude]
+        if not candidates:
+            # Everything is down in the cached state; one may have come back since it was probed
+            await self.refresh()
+            candidates = [backend for backend in self.backends.values() if backend.usable and backend.name not in exclude]
+        if not candidates:
+            errors = "; ".join(f"{b.name}: {'draining' if b.draining else b.error}" for b in self.backends.values())
+            raise NoBackendAvailable(f"No ComfyUI backend available ({errors})")
+        backend = min(candidates, key=lambda b: (self.load(b, checkpoints), b.inflight))
+        backend.inflight += 1
+        backend.prompts += 1
+        return backend
+    
+    def release(self, backend: ComfyUIBackend, checkpoints: Set[str], ok: bool):
+        backend.inflight -= 1
+        if ok:
+            if checkpoints:
+                backend.checkpoints = set(checkpoints)
+        else:
+            backend.failures += 1
+        self._changed()
+    
+    def drain(self, name: str):
+        """Stop sending prompts to a backend; the ones running there finish."""
+        backend = self.get(name)
+        backend.draining = True
+        logger.info(f"Draining ComfyUI backend {name} ({backend.inflight} prompts in flight)")
+    
+    def resume(self, name: str):
+        """Send prompts to a drained backend again."""
+        self.get(name).draining = False
+        logger.info(f"ComfyUI backend {name} back in rotation")
+        self._changed()
+    
+    async def wait_idle(self, name: str, timeout: float) -> bool:
+        """Wait until a backend has no prompts in flight; False if the timeout passed first."""
+        backend = self.get(name)
+        deadline = time.monotonic() + timeout
+        while backend.inflight > 0:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.25)
+        return True
+    
+    def status(self) -> List[Dict[str, Any]]:
+        """Every backend's health, queue and load, for status endpoints."""
+        return [
+            {
+                "name": backend.name,
+                "url": backend.url,
+                "healthy": backend.healthy,
+                "draining": backend.draining,
+                "queue_depth": backend.queue_depth,
+                "inflight": backend.inflight,
+                "checkpoints": sorted(backend.checkpoints),
+                "prompts": backend.prompts,
+                "failures": backend.failures,
+                "error": backend.error,
+                "checked": backend.checked,
+            }
+            for backend in self.backends.values()
+        ]
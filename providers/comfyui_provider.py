@@ -1,24 +1,51 @@
 """
 ComfyUI Provider - Uses local ComfyUI installation
 Fully self-hosted, private, free (after setup)
-Requires ComfyUI running on localhost:8188
+Requires ComfyUI running on localhost:8188 (or the servers in COMFYUI_URLS)
 """
 
 import os
 import httpx
 import json
+import time
+import random
+import hashlib
 import uuid
 import asyncio
-from typing import Optional, Dict, Any
+import inspect
+from typing import Optional, Dict, Any, Callable, List, Tuple
+import websockets
 from loguru import logger
 from .base_provider import ImageProvider
+from .workflow_registry import WorkflowRegistry, WorkflowError
+from .image_cache import ImageCache, cache_key
+from .image_scheduler import ImageScheduler, OUTPUT_NODES
+from .comfyui_pool import ComfyUIPool, ComfyUIBackend, NoBackendAvailable
+from .vram_planner import VRAMPlanner
+from .quality_planner import QualityPlanner, sampler_megapixels
+from .image_previews import PreviewRelay, parse_preview_frame
+from .reference_uploads import ReferenceUploader
+
+
+WEBSOCKET_OUTPUT_NODE = "SaveImageWebsocket"
+MAX_SEED = 2 ** 48
+# The backend itself failed (not the workflow): the prompt is requeued on another backend
+BACKEND_ERRORS = (httpx.TransportError, ConnectionError)
+
+
+def request_seed(workflow_path: str, prompt: str, negative_prompt: Optional[str], width: int, height: int, persona_name: str) -> int:
+    """Seed derived from the request itself: the same request always samples the same image."""
+    raw = json.dumps([workflow_path, prompt, negative_prompt, width, height, persona_name])
+    return int.from_bytes(hashlib.sha256(raw.encode("utf-8")).digest()[:8], "big") % MAX_SEED
 
 
 class ComfyUIProvider(ImageProvider):
     """Image generation using local ComfyUI"""
     
+    key = "comfyui"
+    
     def __init__(self):
-        self.base_url = os.getenv("COMFYUI_URL", "http://localhost:8188")
+        self.pool = ComfyUIPool()
         self.workflow_path = os.getenv(
             "COMFYUI_WORKFLOW",
             "workflows/sdxl_Character_profile_api.json"
@@ -27,6 +54,26 @@ class ComfyUIProvider(ImageProvider):
             "REFERENCE_IMAGE",
             "reference_images/luna_face.png"
         )
+        self.timeout = float(os.getenv("COMFYUI_TIMEOUT", "300"))  # CPU generation can take 3+ minutes
+        # Swap SaveImage for SaveImageWebsocket: PNGs come over the socket, nothing is written to ComfyUI's output dir
+        self.websocket_output = os.getenv("COMFYUI_WEBSOCKET_OUTPUT", "false").lower() == "true"
+        self.workflows = WorkflowRegistry()
+        self.cache = ImageCache()
+        self.scheduler = ImageScheduler(self._run_all, concurrency=self.pool.capacity)
+        self.pool.on_change = self.scheduler.wake
+        self.vram = VRAMPlanner()
+        self.quality = QualityPlanner()
+        self.previews = PreviewRelay()
+        # LoadImage inputs name files here; each backend gets them uploaded once, by content hash
+        self.reference_dir = os.path.dirname(self.reference_image) or "reference_images"
+        self.references = ReferenceUploader(self.reference_dir)
+        # Workflows checked against ComfyUI at startup (the API picks between these per persona)
+        self.startup_workflows = [self.workflow_path] + [
+            path.strip() for path in os.getenv(
+                "COMFYUI_WORKFLOWS",
+                "workflows/sdxl_Character_profile_api.json,workflows/instantid_template.json"
+            ).split(",") if path.strip() and path.strip() != self.workflow_path
+        ]
     
     async def generate_image(
         self,
@@ -37,36 +84,114 @@ class ComfyUIProvider(ImageProvider):
         workflow_path: Optional[str] = None,
         **kwargs
     ) -> bytes:
-        """Generate image using ComfyUI API"""
+        """
+        Generate image using ComfyUI API
+        
+        Completion is tracked on ComfyUI's websocket; pass on_progress (sync or async
+        callable) to receive {"prompt_id", "node", "step", "total"} for every sampler step,
+        and on_preview to receive throttled live previews as {"node", "preview", "mime"}.
+        Cancelling the call stops the prompt in ComfyUI unless another request shares it.
+        
+        seed sets every sampler's seed; without one, the seed is derived from the request,
+        so identical requests give identical images and are served from the image cache.
+        fresh=True skips the cache lookup and uses a random seed (a new variation).
+        
+        Under load, steps, size and the refiner are scaled down so the image is ready
+        within IMAGE_TARGET_SECONDS (or deadline_seconds, when tighter).
+        """
         
         logger.info(f"=== ComfyUI Image Generation Request ===")
         logger.info(f"Full Positive Prompt: {prompt}")
         logger.info(f"Full Negative Prompt: {negative_prompt}")
         logger.info(f"Dimensions: {width}x{height}")
         
-        # Check if ComfyUI is available
-        if not await self.is_available():
-            error_msg = "ComfyUI is not running or not accessible. Please start ComfyUI first."
-            logger.error(error_msg)
-            raise Exception(error_msg)
-        
-        logger.info("✓ ComfyUI health check passed")
-        
-        # Unload Ollama models to free VRAM for image generation
-        await self._unload_ollama()
-        
-        # Load workflow template (API format)
-        # Use provided workflow path or default
+        # Compiled template (loaded once, reloaded when the file changes) filled with this request's values
         current_workflow_path = workflow_path or self.workflow_path
-        with open(current_workflow_path, 'r') as f:
-            workflow = json.load(f)
+        template = self.workflows.get(current_workflow_path)
+        persona_name = kwargs.get("persona_name", "unknown")
+        fresh = kwargs.get("fresh", False)
+        seed = kwargs.get("seed")
+        if seed is None:
+            seed = random.randrange(MAX_SEED) if fresh else request_seed(
+                current_workflow_path, prompt, negative_prompt, width, height, persona_name
+            )
+        workflow = template.render(prompt, negative_prompt, width, height, persona_name, seed)
+        logger.info(f"Using workflow: {current_workflow_path} (seed {seed})")
         
-        logger.info(f"Using workflow: {current_workflow_path}")
+        digests = await asyncio.to_thread(self.references.digests, workflow)
+        key = cache_key(workflow, digests)
+        use_cache = self.cache.enabled and not fresh
+        if self.cache.enabled and fresh:
+            self.cache.counters["bypassed"] += 1
+        if use_cache:
+            cached = await self.cache.get_async(key)
+            if cached is not None:
+                logger.info(f"Image cache hit ({key[:12]}), skipping generation")
+                return cached
         
-        # Modify workflow with prompt and settings
-        persona_name = kwargs.get("persona_name", "unknown")
-        workflow = self._inject_prompt(workflow, prompt, negative_prompt, width, height, persona_name)
+        # Busy: render at the quality that still lands in time
+        quality = self.quality.plan(
+            template, width, height, self._queue_wait(template, width, height), kwargs.get("deadline_seconds")
+        )
+        if quality.reduced:
+            workflow = template.render(
+                prompt, negative_prompt, quality.width, quality.height, persona_name, seed,
+                steps=quality.steps, refiner=quality.refiner
+            )
+            key = cache_key(workflow, digests)
+            if use_cache:
+                cached = await self.cache.get_async(key)
+                if cached is not None:
+                    return cached
+        
+        # Concurrent compatible requests are coalesced into shared prompts
+        image_data = await self.scheduler.submit(
+            workflow,
+            group=(current_workflow_path, quality.width, quality.height),
+            key=key,
+            any_seed=fresh and kwargs.get("seed") is None,
+            latents=template.latents,
+            seeds=template.seeds,
+            on_progress=kwargs.get("on_progress"),
+            on_preview=kwargs.get("on_preview")
+        )
+        if self.cache.enabled:
+            await self.cache.put_async(key, image_data)
+        return image_data
+    
+    def sampling_range(self, workflow_path: str, width: int, height: int) -> Optional[Tuple[float, float]]:
+        """Seconds of sampling for a workflow at its lowest and at full quality (None until speed is measured)."""
+        try:
+            template = self.workflows.get(workflow_path)
+        except (WorkflowError, OSError):
+            return None
+        lowest = self.quality.lowest_estimate(template, width, height)
+        full = self.quality.full_estimate(template, width, height)
+        if lowest is None or full is None:
+            return None
+        return lowest, full
+    
+    def _queue_wait(self, template, width: int, height: int) -> float:
+        """Seconds until a new job would start: the jobs ahead at full quality, spread over the backends."""
+        ahead = len(self.scheduler.pending) + self.scheduler.running
+        per_job = self.quality.full_estimate(template, width, height)
+        if not ahead or per_job is None:
+            return 0.0
+        return ahead * per_job / max(1, self.pool.capacity())
+    
+    async def _run_all(
+        self,
+        workflow: Dict[str, Any],
+        on_progress: Optional[Callable] = None,
+        on_preview: Optional[Callable] = None,
+        images: int = 1
+    ) -> Dict[str, List[bytes]]:
+        """
+        Queue a rendered (possibly merged) workflow on the least busy backend; returns {output node id: [PNG bytes]}.
         
+        images is how many requested images the prompt produces; COMFYUI_TIMEOUT applies to each.
+        If the backend dies before the images are back, the prompt is requeued on another one.
+        """
         # Save complete workflow to file for debugging (optional)
         debug_mode = os.getenv("COMFYUI_DEBUG", "false").lower() == "true"
         if debug_mode:
@@ -75,176 +200,303 @@ class ComfyUIProvider(ImageProvider):
                 json.dump(workflow, f, indent=2)
             logger.info(f"Debug: Saved complete workflow to {debug_path}")
         
+        checkpoints = {
+            node["inputs"]["ckpt_name"] for node in workflow.values()
+            if isinstance(node.get("inputs", {}).get("ckpt_name"), str)
+        }
+        tried, last_error = [], None
+        while True:
+            try:
+                backend = await self.pool.acquire(checkpoints, exclude=tried)
+            except NoBackendAvailable:
+                if last_error is not None:
+                    raise last_error
+                raise
+            ok = False
+            evicted = False
+            try:
+                if backend.local:
+                    # Shares the GPU with Ollama: unload LLMs only if the image won't fit next to them
+                    evicted = await self.vram.make_room(backend.url, checkpoints)
+                outputs = await self._run_on(backend, workflow, checkpoints, on_progress, on_preview, self.timeout * images)
+                ok = True
+                if backend.local:
+                    await self.vram.observe(backend.url, checkpoints)
+                return outputs
+            except asyncio.CancelledError:
+                ok = True  # nobody wants the image any more; not the backend's fault
+                raise
+            except BACKEND_ERRORS as e:
+                self.pool.mark_down(backend, str(e) or type(e).__name__)
+                self.references.forget(backend.name)
+                tried.append(backend.name)
+                last_error = e
+                logger.warning(f"ComfyUI backend {backend.name} failed ({e or type(e).__name__}), requeueing the prompt")
+            finally:
+                if evicted:
+                    self.vram.release_room()
+                self.pool.release(backend, checkpoints, ok)
+    
+    async def _run_on(
+        self,
+        backend: ComfyUIBackend,
+        workflow: Dict[str, Any],
+        checkpoints: set,
+        on_progress: Optional[Callable],
+        on_preview: Optional[Callable] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, List[bytes]]:
+        """Run a workflow on one backend and collect its images (within timeout seconds, default COMFYUI_TIMEOUT)."""
+        # Sampler speed for quality planning, measured between consecutive steps
+        megapixels = sampler_megapixels(workflow)
+        last_step: Dict[str, tuple] = {}
+        
+        async def progress(update: Dict[str, Any]):
+            now = time.monotonic()
+            node = update.get("node")
+            previous = last_step.get(node)
+            if previous is not None and node in megapixels and update.get("step") == previous[0] + 1:
+                self.quality.observe_step(now - previous[1], megapixels[node])
+            last_step[node] = (update.get("step"), now)
+            if on_progress is not None:
+                result = on_progress(update)
+                if inspect.isawaitable(result):
+                    await result
+        
+        on_frame = self.previews.for_prompt(on_preview) if on_preview is not None and self.previews.enabled else None
+        
         # Generate unique client ID
         client_id = str(uuid.uuid4())
         
         async with httpx.AsyncClient(timeout=120.0) as client:
-            # Queue the workflow
-            response = await client.post(
-                f"{self.base_url}/prompt",
-                json={
-                    "prompt": workflow,
-                    "client_id": client_id
-                }
-            )
-            response.raise_for_status()
-            result = response.json()
-            prompt_id = result["prompt_id"]
-            
-            logger.info(f"ComfyUI prompt queued: {prompt_id}")
-            
-            # Wait for completion and get image
-            return await self._wait_for_image(client, prompt_id)
-    
-    def _convert_workflow_format(self, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Convert ComfyUI UI format to API format"""
-        # If it has a 'nodes' key, it's the UI format - need to convert
-        if "nodes" in workflow_data:
-            api_workflow = {}
-            for node in workflow_data["nodes"]:
-                node_id = str(node["id"])
-                api_workflow[node_id] = {
-                    "inputs": node.get("inputs", {}),
-                    "class_type": node["type"],
-                    "_meta": {
-                        "title": node.get("title", "")
+            # Subscribe before queueing so no event of this prompt is missed
+            socket = await self._connect_websocket(backend, client_id)
+            try:
+                workflow = await self.references.prepare(client, backend, workflow)
+                if socket is not None and self.websocket_output:
+                    workflow = self._stream_outputs(workflow)
+                output_nodes = {node_id for node_id, node in workflow.items() if node.get("class_type") in OUTPUT_NODES}
+                websocket_nodes = {node_id for node_id, node in workflow.items() if node.get("class_type") == WEBSOCKET_OUTPUT_NODE}
+                if websocket_nodes and socket is None:
+                    raise Exception("Workflow returns images over the websocket, but the ComfyUI websocket could not be opened")
+                
+                # Queue the workflow
+                response = await client.post(
+                    f"{backend.url}/prompt",
+                    json={
+                        "prompt": workflow,
+                        "client_id": client_id
                     }
-                }
-                # Convert widgets_values to inputs
-                if "widgets_values" in node:
-                    api_workflow[node_id]["widgets_values"] = node["widgets_values"]
-            
-            logger.debug(f"Converted UI workflow with {len(api_workflow)} nodes")
-            return api_workflow
-        
-        # Already in API format
-        return workflow_data
-    
-    def _inject_prompt(
-        self,
-        workflow: Dict[str, Any],
-        prompt: str,
-        negative_prompt: Optional[str],
-        width: int,
-        height: int,
-        persona_name: str = "unknown"
-    ) -> Dict[str, Any]:
-        """Inject prompt and settings into workflow - works with both standard and InstantID workflows"""
-        
-        # Replace persona name placeholders throughout the workflow
-        workflow_str = json.dumps(workflow)
-        workflow_str = workflow_str.replace("PERSONA_NAME", persona_name)
-        workflow = json.loads(workflow_str)
-        
-        # Find and inject positive prompts
-        positive_nodes = []
-        negative_nodes = []
-        dimension_nodes = []
-        
-        for node_id, node_data in workflow.items():
-            class_type = node_data.get("class_type", "")
-            meta_title = node_data.get("_meta", {}).get("title", "").lower()
-            
-            # Find positive prompt nodes
-            if class_type == "CLIPTextEncode":
-                if "positive" in meta_title or (
-                    "inputs" in node_data and 
-                    node_data["inputs"].get("text") in ["PROMPT_TEXT", ""] or
-                    "positive" in str(node_data["inputs"].get("text", "")).lower()
-                ):
-                    positive_nodes.append(node_id)
-                elif "negative" in meta_title or (
-                    "inputs" in node_data and
-                    "negative" in str(node_data["inputs"].get("text", "")).lower()
-                ):
-                    negative_nodes.append(node_id)
-            
-            # Find dimension nodes
-            elif class_type == "EmptyLatentImage":
-                dimension_nodes.append(node_id)
-        
-        # Inject positive prompts
-        for node_id in positive_nodes:
-            workflow[node_id]["inputs"]["text"] = prompt
-            logger.debug(f"✓ Injected positive prompt into node {node_id}")
-        
-        # Inject negative prompts
-        if negative_prompt:
-            for node_id in negative_nodes:
-                workflow[node_id]["inputs"]["text"] = negative_prompt
-                logger.debug(f"✓ Injected negative prompt into node {node_id}")
-        
-        # Set dimensions
-        for node_id in dimension_nodes:
-            workflow[node_id]["inputs"]["width"] = width
-            workflow[node_id]["inputs"]["height"] = height
-            logger.debug(f"✓ Set dimensions {width}x{height} in node {node_id}")
-        
+                )
+                response.raise_for_status()
+                result = response.json()
+                prompt_id = result["prompt_id"]
+                
+                logger.info(f"ComfyUI prompt queued on {backend.name}: {prompt_id}")
+                
+                # Wait for completion and get the images; a prompt we stop waiting for (cancelled,
+                # timed out, socket error) must not keep the backend busy
+                try:
+                    return await self._wait_for_images(
+                        client, backend, socket, prompt_id, output_nodes, progress, websocket_nodes, on_frame,
+                        timeout if timeout is not None else self.timeout
+                    )
+                except (Exception, asyncio.CancelledError):
+                    await self._cancel_prompt(client, backend, prompt_id)
+                    raise
+            finally:
+                if socket is not None:
+                    await socket.close()
+    
+    async def _cancel_prompt(self, client: httpx.AsyncClient, backend: ComfyUIBackend, prompt_id: str):
+        """Stop a prompt nobody waits for: interrupt it if it is running, else drop it from the queue."""
+        try:
+            response = await client.get(f"{backend.url}/queue", timeout=5.0)
+            response.raise_for_status()
+            running = any(len(item) > 1 and item[1] == prompt_id for item in response.json().get("queue_running", []))
+            if running:
+                # /interrupt stops whatever runs; the prompt_id keeps newer ComfyUI from hitting another prompt
+                response = await client.post(f"{backend.url}/interrupt", json={"prompt_id": prompt_id}, timeout=5.0)
+            else:
+                response = await client.post(f"{backend.url}/queue", json={"delete": [prompt_id]}, timeout=5.0)
+            response.raise_for_status()
+            logger.info(f"ComfyUI prompt {prompt_id} cancelled on {backend.name} ({'interrupted' if running else 'dequeued'})")
+        except Exception as e:
+            logger.warning(f"Could not cancel ComfyUI prompt {prompt_id} on {backend.name}: {e}")
+    
+    @staticmethod
+    def _stream_outputs(workflow: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace SaveImage nodes with SaveImageWebsocket (same images input, no disk write)."""
+        for node in workflow.values():
+            if node.get("class_type") == "SaveImage":
+                node["class_type"] = WEBSOCKET_OUTPUT_NODE
+                node["inputs"] = {"images": node["inputs"]["images"]}
         return workflow
     
-    async def _wait_for_image(self, client: httpx.AsyncClient, prompt_id: str) -> bytes:
-        """Wait for ComfyUI to finish and retrieve the image"""
-        
-        max_attempts = 300  # 5 minutes max (CPU generation can take 3+ minutes)
+    async def _connect_websocket(self, backend: ComfyUIBackend, client_id: str):
+        """Open a backend's event stream for this client, or None to fall back to polling."""
+        try:
+            return await websockets.connect(f"{backend.ws_url}?clientId={client_id}", max_size=None, open_timeout=5)
+        except Exception as e:
+            logger.warning(f"ComfyUI websocket unavailable, polling history instead: {e}")
+            return None
+    
+    async def _wait_for_images(
+        self,
+        client: httpx.AsyncClient,
+        backend: ComfyUIBackend,
+        socket,
+        prompt_id: str,
+        output_nodes: set,
+        on_progress: Optional[Callable] = None,
+        websocket_nodes: Optional[set] = None,
+        on_frame: Optional[Callable] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, List[bytes]]:
+        """Wait for ComfyUI to finish and retrieve the images of every output node"""
+        timeout = timeout if timeout is not None else self.timeout
+        deadline = time.monotonic() + timeout
+        outputs, images = {}, {}
+        if socket is not None:
+            try:
+                outputs, images = await asyncio.wait_for(
+                    self._listen(socket, prompt_id, on_progress, websocket_nodes or set(), on_frame),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError("ComfyUI generation timed out")
+            except websockets.ConnectionClosed:
+                logger.warning("ComfyUI websocket closed mid-generation, polling history instead")
+        if images:
+            logger.info(f"ComfyUI images received over websocket ({sum(len(i) for i in images.values())} images)")
+        missing = {node_id for node_id in output_nodes if node_id not in images and not outputs.get(node_id, {}).get("images")}
+        if missing:
+            # Cached nodes send no "executed" event, and a dropped socket sends nothing
+            outputs = await self._poll_history(client, backend, prompt_id, deadline)
+        downloads = {node_id: output["images"] for node_id, output in outputs.items() if node_id not in images and output.get("images")}
+        for node_id, files in downloads.items():
+            images[node_id] = await asyncio.gather(*(self._fetch_image(client, backend, info) for info in files))
+        if not images:
+            raise Exception("ComfyUI finished without producing an image")
+        return images
+    
+    async def _listen(
+        self,
+        socket,
+        prompt_id: str,
+        on_progress: Optional[Callable],
+        websocket_nodes: set,
+        on_frame: Optional[Callable] = None
+    ):
+        """
+        Follow a prompt on the websocket until ComfyUI reports it finished.
+        Sampler previews go to on_frame(node, image bytes).
         
-        for attempt in range(max_attempts):
-            await asyncio.sleep(1)
-            
-            # Check history
-            response = await client.get(f"{self.base_url}/history/{prompt_id}")
+        Returns:
+            (outputs of the nodes that ran as {node_id: {"images": [...]}},
+             {node_id: [PNG bytes]} sent by websocket output nodes)
+        """
+        outputs, images = {}, {}
+        current_node = None
+        async for message in socket:
+            if isinstance(message, bytes):
+                # Sampler previews and SaveImageWebsocket share the frame type; the running node tells them apart
+                frame = parse_preview_frame(message)
+                if frame is None:
+                    continue
+                image, metadata = frame
+                if current_node in websocket_nodes:
+                    images.setdefault(current_node, []).append(image)
+                elif on_frame is not None and metadata.get("prompt_id", prompt_id) == prompt_id:
+                    on_frame(metadata.get("node_id", current_node), image)
+                continue
+            event = json.loads(message)
+            data = event.get("data", {})
+            if data.get("prompt_id") != prompt_id:
+                continue
+            kind = event.get("type")
+            if kind == "progress" and on_progress is not None:
+                update = {"prompt_id": prompt_id, "node": data.get("node"), "step": data.get("value"), "total": data.get("max")}
+                result = on_progress(update)
+                if inspect.isawaitable(result):
+                    await result
+            elif kind == "executed":
+                outputs[data["node"]] = data.get("output") or {}
+            elif kind == "execution_error":
+                raise Exception(f"ComfyUI execution failed in node {data.get('node_id')}: {data.get('exception_message', 'unknown error')}")
+            elif kind == "execution_interrupted":
+                raise Exception("ComfyUI execution was interrupted")
+            elif kind == "executing":
+                current_node = data.get("node")
+                if current_node is None:
+                    return outputs, images  # whole prompt done
+            elif kind == "execution_success":
+                return outputs, images
+        raise websockets.ConnectionClosed(None, None)
+    
+    async def _poll_history(self, client: httpx.AsyncClient, backend: ComfyUIBackend, prompt_id: str, deadline: float) -> Dict[str, Any]:
+        """Fallback: poll /history with backoff until the prompt shows up."""
+        delay = 0.25
+        while True:
+            response = await client.get(f"{backend.url}/history/{prompt_id}")
             response.raise_for_status()
             history = response.json()
-            
             if prompt_id in history:
-                outputs = history[prompt_id].get("outputs", {})
-                
-                # Find the image output
-                for node_id, output in outputs.items():
-                    if "images" in output:
-                        image_info = output["images"][0]
-                        filename = image_info["filename"]
-                        subfolder = image_info.get("subfolder", "")
-                        
-                        # Download the image
-                        params = {
-                            "filename": filename,
-                            "subfolder": subfolder,
-                            "type": "output"
-                        }
-                        
-                        img_response = await client.get(
-                            f"{self.base_url}/view",
-                            params=params
-                        )
-                        img_response.raise_for_status()
-                        
-                        logger.info(f"ComfyUI image retrieved: {filename}")
-                        return img_response.content
-        
-        raise TimeoutError("ComfyUI generation timed out")
+                return history[prompt_id].get("outputs", {})
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError("ComfyUI generation timed out")
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 5.0)
     
-    async def is_available(self) -> bool:
-        """Check if ComfyUI is running and accessible"""
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/system_stats")
-                return response.status_code == 200
-        except Exception:
-            return False
-    
-    async def _unload_ollama(self):
-        """Unload Ollama models to free VRAM"""
+    async def _fetch_image(self, client: httpx.AsyncClient, backend: ComfyUIBackend, image_info: Dict[str, Any]) -> bytes:
+        """Download one output image through /view."""
+        params = {
+            "filename": image_info["filename"],
+            "subfolder": image_info.get("subfolder", ""),
+            "type": image_info.get("type", "output")
+        }
+        img_response = await client.get(
+            f"{backend.url}/view",
+            params=params
+        )
+        img_response.raise_for_status()
+        
+        logger.info(f"ComfyUI image retrieved: {image_info['filename']}")
+        return img_response.content
+    
+    async def _object_info(self, client: httpx.AsyncClient, backend: ComfyUIBackend) -> Optional[Dict[str, Any]]:
         try:
-            logger.info("Unloading Ollama models to free VRAM...")
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                # Ollama API to unload all models
-                response = await client.post(
-                    "http://localhost:11434/api/generate",
-                    json={"model": "", "keep_alive": 0}
-                )
-                logger.info("Ollama models unloaded")
+            response = await client.get(f"{backend.url}/object_info")
+            response.raise_for_status()
+            return response.json()
         except Exception as e:
-            logger.warning(f"Could not unload Ollama: {e}")
+            logger.warning(f"ComfyUI backend {backend.name} not reachable, its nodes and models aren't checked: {e}")
+            return None
+    
+    async def prepare(self):
+        """
+        Compile the startup workflows and check them against every backend's /object_info.
+        
+        A broken workflow (bad JSON, no prompt input, unknown node or model) is logged
+        and disabled; image tiers using it fail at once and the chain moves on.
+        """
+        backends = list(self.pool.backends.values())
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            infos = await asyncio.gather(*(self._object_info(client, backend) for backend in backends))
+        reachable = {backend.name: info for backend, info in zip(backends, infos) if info is not None}
+        
+        problems = self.workflows.validate(self.startup_workflows, reachable)
+        if problems:
+            logger.error("Broken ComfyUI workflows (disabled until the file is fixed):\n  " + "\n  ".join(problems))
+        logger.info(
+            f"✓ {len(self.startup_workflows) - len(problems)}/{len(self.startup_workflows)} ComfyUI workflows compiled"
+            + (f" and validated on {len(reachable)}/{len(backends)} backends" if reachable else "")
+        )
+    
+    async def is_available(self) -> bool:
+        """Check if any ComfyUI backend is running and accessible (refreshes every backend's health)"""
+        await self.pool.refresh(include_draining=True)
+        return any(backend.healthy for backend in self.pool.backends.values())
     
     def get_name(self) -> str:
         return "ComfyUI (Local)"
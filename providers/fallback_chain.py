@@ -0,0 +1,170 @@
+"""
+Image Fallback Chain
+Quality tiers tried in order within one latency budget
+
+A request walks the tiers (e.g. InstantID -> standard workflow -> 512px
+low-res) until one produces an image. The whole walk shares one budget,
+IMAGE_DEADLINE_SECONDS: each tier gets what is left of it, and the provider
+is told the time left, so it can scale quality down to meet it. A tier is
+only skipped when even its lowest quality wouldn't fit: its measured duration
+with the sampling time cut to the provider's lowest-quality estimate. When
+the image service is unreachable the walk stops at once, since every tier
+would fail the same way. Which tier served each request is counted.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from loguru import logger
+
+
+# Errors no other tier can fix: the service itself can't be reached
+UNREACHABLE_ERRORS = (httpx.TransportError, ConnectionError)
+
+
+@dataclass
+class ImageRequest:
+    """What a caller asked for, before any tier shapes it"""
+    prompt: str
+    width: int
+    height: int
+    persona: Any  # persona_manager.Persona
+    reference_image: Optional[str] = None  # the persona's face for InstantID, when it has one
+    enhance: bool = False  # weight key words of the prompt (prompts written by the LLM)
+    options: Dict[str, Any] = field(default_factory=dict)  # passed to the provider: seed, fresh, on_progress
+
+
+@dataclass
+class ImageTier:
+    """One way to produce the image"""
+    name: str
+    workflow_path: str
+    prompt: Callable[[ImageRequest], str]
+    negative_prompt: str
+    applies: Callable[[ImageRequest], bool] = lambda request: True
+    size: Optional[Tuple[int, int]] = None  # None: the requested size
+
+
+@dataclass
+class ChainResult:
+    image: bytes
+    tier: str
+    attempts: List[Dict[str, Any]]
+
+
+class ImageChainError(Exception):
+    """No tier produced an image"""
+    
+    def __init__(self, message: str, attempts: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+class FallbackChain:
+    """Tries image tiers in order under a shared deadline"""
+    
+    def __init__(
+        self,
+        tiers: List[ImageTier],
+        generate: Callable[..., Awaitable[bytes]],
+        budget: Optional[float] = None,
+        sampling_range: Optional[Callable[[str, int, int], Optional[Tuple[float, float]]]] = None
+    ):
+        self.tiers = tiers
+        self.generate = generate
+        # (workflow, width, height) -> seconds of sampling at the lowest and at full quality
+        self.sampling_range = sampling_range
+        self.budget = budget if budget is not None else float(os.getenv("IMAGE_DEADLINE_SECONDS", "300"))
+        self.durations: Dict[str, float] = {}  # moving average of successful runs per tier
+        self.stats = {tier.name: {"served": 0, "failed": 0, "skipped": 0} for tier in tiers}
+        self.stats["none"] = {"served": 0}
+    
+    def estimate(self, tier: ImageTier, width: int, height: int) -> Optional[float]:
+        """Expected seconds for a tier at the lowest quality the provider can scale to (None until it has succeeded once)."""
+        average = self.durations.get(tier.name)
+        sampling = self.sampling_range(tier.workflow_path, width, height) if self.sampling_range and average is not None else None
+        if sampling is None:
+            return average
+        lowest, full = sampling
+        # Loading, queueing and decoding stay; only the sampling shrinks
+        return max(lowest, average - full + lowest)
+    
+    def _record(self, tier: ImageTier, seconds: float):
+        previous = self.durations.get(tier.name)
+        self.durations[tier.name] = seconds if previous is None else 0.7 * previous + 0.3 * seconds
+    
+    async def run(self, request: ImageRequest, budget: Optional[float] = None) -> ChainResult:
+        """
+        Produce an image with the first tier that works in time.
+        
+        Raises:
+            ImageChainError: Every applicable tier failed, was skipped, or the service is unreachable
+        """
+        deadline = time.monotonic() + (budget if budget is not None else self.budget)
+        attempts: List[Dict[str, Any]] = []
+        last_error: Optional[Exception] = None
+        for tier in self.tiers:
+            if not tier.applies(request):
+                continue
+            width, height = tier.size or (request.width, request.height)
+            remaining = deadline - time.monotonic()
+            estimate = self.estimate(tier, width, height)
+            if remaining <= 0 or (estimate is not None and estimate > remaining):
+                reason = "out of time" if remaining <= 0 else f"needs ~{estimate:.0f}s, {remaining:.0f}s left"
+                attempts.append({"tier": tier.name, "skipped": reason})
+                self.stats[tier.name]["skipped"] += 1
+                continue
+            
+            logger.info(f"Image tier '{tier.name}': {tier.workflow_path} at {width}x{height} ({remaining:.0f}s left)")
+            started = time.monotonic()
+            try:
+                image = await asyncio.wait_for(
+                    self.generate(
+                        prompt=tier.prompt(request),
+                        negative_prompt=tier.negative_prompt,
+                        width=width,
+                        height=height,
+                        workflow_path=tier.workflow_path,
+                        persona_name=request.persona.id,
+                        deadline_seconds=remaining,
+                        **request.options
+                    ),
+                    remaining
+                )
+            except asyncio.TimeoutError:
+                last_error = TimeoutError(f"out of time after {time.monotonic() - started:.0f}s")
+            except UNREACHABLE_ERRORS as e:
+                attempts.append({"tier": tier.name, "error": str(e) or type(e).__name__})
+                self.stats[tier.name]["failed"] += 1
+                self.stats["none"]["served"] += 1
+                raise ImageChainError(f"Image service unreachable: {e}", attempts)
+            except Exception as e:
+                last_error = e
+            else:
+                seconds = time.monotonic() - started
+                self._record(tier, seconds)
+                attempts.append({"tier": tier.name, "seconds": round(seconds, 1)})
+                self.stats[tier.name]["served"] += 1
+                if len(attempts) > 1:
+                    logger.info(f"Image served by fallback tier '{tier.name}' after {len(attempts) - 1} other tiers")
+                return ChainResult(image=image, tier=tier.name, attempts=attempts)
+            
+            attempts.append({"tier": tier.name, "error": str(last_error) or type(last_error).__name__})
+            self.stats[tier.name]["failed"] += 1
+            logger.warning(f"Image tier '{tier.name}' failed: {last_error}")
+        
+        self.stats["none"]["served"] += 1
+        raise ImageChainError(f"No image tier succeeded: {last_error}", attempts)
+    
+    def status(self) -> Dict[str, Any]:
+        """Requests served per tier and each tier's measured duration."""
+        return {
+            "budget_seconds": self.budget,
+            "tiers": {
+                name: {**counts, "seconds": round(self.durations[name], 1) if name in self.durations else None}
+                for name, counts in self.stats.items()
+            },
+        }
@@ -0,0 +1,123 @@
+"""
+Service Health Registry
+One cached view of whether upstream services (ComfyUI, Replicate, Ollama) are up
+
+Probes run in the background every HEALTH_PROBE_INTERVAL seconds. Request
+paths read the cached status; one older than HEALTH_TTL is re-probed on the
+spot, and concurrent readers share that single probe. A request that actually
+fails to reach a service invalidates its status and wakes the prober, so the
+next reader sees fresh information instead of a stale "online".
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+
+Probe = Callable[[], Awaitable[bool]]
+
+
+class HealthRegistry:
+    """Cached, background-refreshed availability of upstream services"""
+    
+    def __init__(self, interval: Optional[float] = None, ttl: Optional[float] = None, probe_timeout: float = 5.0):
+        self.interval = interval if interval is not None else float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("HEALTH_TTL", "30"))
+        self.probe_timeout = probe_timeout
+        self.probes: Dict[str, Probe] = {}
+        self.status: Dict[str, Dict] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self.stats = {"probes": 0, "cache_hits": 0, "invalidations": 0}
+    
+    def register(self, name: str, probe: Probe):
+        """Track a service; probe() returns True when it is usable."""
+        self.probes[name] = probe
+    
+    async def is_available(self, name: str) -> bool:
+        """Cached availability of a service, probing it first if the status is missing or expired."""
+        status = self.status.get(name)
+        if status is not None and time.monotonic() - status["checked_at"] < self.ttl:
+            self.stats["cache_hits"] += 1
+            return status["available"]
+        return (await self.check(name))["available"]
+    
+    async def check(self, name: str) -> Dict:
+        """Probe a service now (joining a probe already running) and cache the result."""
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.create_task(self._probe(name))
+            self._inflight[name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        return await asyncio.shield(task)
+    
+    async def _probe(self, name: str) -> Dict:
+        started = time.monotonic()
+        error = None
+        try:
+            available = bool(await asyncio.wait_for(self.probes[name](), self.probe_timeout))
+        except Exception as e:
+            available, error = False, str(e) or type(e).__name__
+        if not available and error is None:
+            error = "unavailable"
+        self.stats["probes"] += 1
+        previous = self.status.get(name)
+        status = {
+            "available": available,
+            "checked_at": time.monotonic(),
+            "checked": time.time(),
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+            "error": error,
+            "last_failure": {"time": time.time(), "error": error} if not available else (previous or {}).get("last_failure"),
+        }
+        if previous is not None and previous["available"] != available:
+            logger.info(f"{name} is now {'online' if available else 'offline'}")
+        self.status[name] = status
+        return status
+    
+    def invalidate(self, name: str, error: Optional[str] = None):
+        """A request just failed to reach the service: forget its status and re-probe in the background."""
+        self.stats["invalidations"] += 1
+        # Expired, so the next reader probes; the error stays visible in status endpoints
+        self.status[name] = {
+            **self.status.get(name, {}),
+            "available": False,
+            "checked_at": float("-inf"),
+            "checked": time.time(),
+            "error": error,
+            "last_failure": {"time": time.time(), "error": error},
+        }
+        if self._wake is not None:
+            self._wake.set()
+    
+    async def run(self):
+        """Background loop: probe every service each interval (or right after an invalidation)."""
+        self._wake = asyncio.Event()
+        logger.info(f"Health prober started for {', '.join(self.probes)} (every {self.interval:.0f}s, TTL {self.ttl:.0f}s)")
+        while True:
+            await asyncio.gather(*(self.check(name) for name in self.probes))
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current status of every service, for status endpoints."""
+        now = time.monotonic()
+        services = {}
+        for name in self.probes:
+            status = self.status.get(name)
+            if status is None:
+                services[name] = {"available": None, "error": "not checked yet"}
+                continue
+            services[name] = {
+                "available": status["available"],
+                "age_s": round(now - status["checked_at"], 1) if status["checked_at"] != float("-inf") else None,
+                "latency_ms": status.get("latency_ms"),
+                "error": status["error"],
+                "last_failure": status["last_failure"],
+            }
+        return services
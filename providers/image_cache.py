@@ -0,0 +1,120 @@
+"""
+Image Result Cache
+Content-addressed store of generated images, bounded in size with LRU eviction
+
+The key is a hash of everything that determines the pixels: the fully
+rendered workflow (template, checkpoint, prompts, size, seed) plus the
+content hash of any reference image it loads. Entries are plain PNG files
+under IMAGE_CACHE_DIR; recency survives restarts through the files' mtimes.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+
+def cache_key(workflow: Dict[str, Any], reference_digests: List[str]) -> str:
+    """Stable hash of a rendered workflow and the reference images it uses."""
+    h = hashlib.sha256()
+    h.update(json.dumps(workflow, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    for digest in reference_digests:
+        h.update(digest.encode("ascii"))
+    return h.hexdigest()
+
+
+class ImageCache:
+    """Size-bounded, disk-backed LRU of generated images"""
+    
+    def __init__(self, directory: Optional[str] = None, max_mb: Optional[float] = None):
+        self.enabled = os.getenv("IMAGE_CACHE", "true").lower() == "true"
+        self.root = Path(directory or os.getenv("IMAGE_CACHE_DIR", "data/image_cache"))
+        self.max_bytes = int((max_mb if max_mb is not None else float(os.getenv("IMAGE_CACHE_MAX_MB", "512"))) * 1024 * 1024)
+        self.entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, least recently used first
+        self.total_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        if self.enabled:
+            self._load()
+    
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.png"
+    
+    def _load(self):
+        """Index the files already on disk, oldest use first."""
+        files = []
+        for path in self.root.glob("*/*.png"):
+            stat = path.stat()
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        if files:
+            logger.info(f"Image cache: {len(files)} images ({self.total_bytes / (1024 * 1024):.1f} MB) in {self.root}")
+        self._evict()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached image for a key (marking it recently used), or None."""
+        with self._lock:
+            if key not in self.entries:
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # recency for the next restart
+        except FileNotFoundError:
+            with self._lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.counters["misses"] += 1
+            return None
+        with self._lock:
+            self.counters["hits"] += 1
+        return data
+    
+    def put(self, key: str, data: bytes):
+        """Store an image, evicting least recently used ones beyond the size limit."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".part")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.counters["stores"] += 1
+            self._evict()
+    
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.counters["evictions"] += 1
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+    
+    async def get_async(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get, key)
+    
+    async def put_async(self, key: str, data: bytes):
+        await asyncio.to_thread(self.put, key, data)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit metrics and size of the cache."""
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "enabled": self.enabled,
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else None,
+            "entries": len(self.entries),
+            "size_mb": round(self.total_bytes / (1024 * 1024), 1),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+        }
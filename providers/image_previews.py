@@ -0,0 +1,147 @@
+"""
+Image Previews
+Live sampler previews from ComfyUI, relayed to the clients waiting for the image
+
+ComfyUI sends a latent preview with sampler steps when it runs with
+--preview-method auto (or latent2rgb/taesd). PreviewRelay passes on at most
+IMAGE_PREVIEW_FPS of them a second per prompt and drops frames that arrive
+while the last one is still being encoded. It shrinks each frame to
+IMAGE_PREVIEW_SIZE on its longest side and encodes it as WebP or JPEG
+(IMAGE_PREVIEW_FORMAT) in a worker thread, off the event loop. PreviewHub
+fans events out to the clients following a channel; the API uses one channel
+per chat session.
+"""
+
+import asyncio
+import io
+import json
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+from loguru import logger
+
+
+# Binary websocket frames (big-endian uint32 header fields)
+PREVIEW_IMAGE_EVENT = 1  # event type, image format, then the image
+PREVIEW_IMAGE_WITH_METADATA_EVENT = 4  # event type, metadata length, JSON metadata (node_id, prompt_id), then the image
+MIME_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def parse_preview_frame(frame: bytes) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+    """The image and metadata of a ComfyUI binary preview frame (None for other frames)."""
+    if len(frame) <= 8:
+        return None
+    event = struct.unpack(">I", frame[:4])[0]
+    if event == PREVIEW_IMAGE_EVENT:
+        return frame[8:], {}
+    if event == PREVIEW_IMAGE_WITH_METADATA_EVENT:
+        length = struct.unpack(">I", frame[4:8])[0]
+        try:
+            metadata = json.loads(frame[8:8 + length])
+        except ValueError:
+            return None
+        return frame[8 + length:], metadata
+    return None
+
+
+def encode_preview(image: bytes, size: int, image_format: str) -> bytes:
+    """Downscale a preview so its longest side is at most size and re-encode it."""
+    from PIL import Image
+    
+    with Image.open(io.BytesIO(image)) as frame:
+        frame = frame.convert("RGB")
+        frame.thumbnail((size, size))
+        output = io.BytesIO()
+        frame.save(output, format=image_format.upper(), quality=70)
+    return output.getvalue()
+
+
+class PreviewRelay:
+    """Throttles and encodes ComfyUI's sampler previews"""
+    
+    def __init__(self, fps: Optional[float] = None, size: Optional[int] = None, image_format: Optional[str] = None):
+        self.enabled = os.getenv("IMAGE_PREVIEWS", "true").lower() == "true"
+        fps = fps if fps is not None else float(os.getenv("IMAGE_PREVIEW_FPS", "2"))
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.size = size or int(os.getenv("IMAGE_PREVIEW_SIZE", "256"))
+        self.format = (image_format or os.getenv("IMAGE_PREVIEW_FORMAT", "webp")).lower()
+        if self.format not in MIME_TYPES:
+            logger.warning(f"Unknown IMAGE_PREVIEW_FORMAT '{self.format}', using jpeg")
+            self.format = "jpeg"
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-preview")
+        self.stats = {"received": 0, "relayed": 0, "dropped": 0, "failed": 0}
+    
+    def for_prompt(self, deliver: Callable[[Dict[str, Any]], Awaitable[None]]) -> Callable[[Optional[str], bytes], None]:
+        """
+        A frame handler for one prompt; encoded frames go to deliver as
+        {"node", "preview" (bytes), "mime"}. Never blocks the caller.
+        """
+        state = {"last": 0.0, "task": None}
+        
+        async def relay(node: Optional[str], image: bytes):
+            try:
+                encoded = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, encode_preview, image, self.size, self.format
+                )
+            except Exception as e:
+                self.stats["failed"] += 1
+                if self.stats["failed"] == 1:
+                    logger.warning(f"Could not encode image preview: {e}")
+                return
+            self.stats["relayed"] += 1
+            await deliver({"node": node, "preview": encoded, "mime": MIME_TYPES[self.format]})
+        
+        def on_frame(node: Optional[str], image: bytes):
+            self.stats["received"] += 1
+            now = time.monotonic()
+            busy = state["task"] is not None and not state["task"].done()
+            if busy or now - state["last"] < self.interval:
+                self.stats["dropped"] += 1
+                return
+            state["last"] = now
+            state["task"] = asyncio.create_task(relay(node, image))
+        
+        return on_frame
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "fps": round(1.0 / self.interval, 2) if self.interval else None,
+            "size": self.size,
+            "format": self.format,
+            **self.stats,
+        }
+
+
+class PreviewHub:
+    """Live image events per channel, for the clients following it"""
+    
+    def __init__(self, backlog: int = 8):
+        self.backlog = backlog
+        self.channels: Dict[str, Set[asyncio.Queue]] = {}
+    
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        """A queue receiving the channel's events until the block exits."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.backlog)
+        self.channels.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            listeners = self.channels.get(channel, set())
+            listeners.discard(queue)
+            if not listeners:
+                self.channels.pop(channel, None)
+    
+    def publish(self, channel: str, kind: str, data: Dict[str, Any]):
+        """Send an event to everyone following the channel; a slow client loses its oldest events."""
+        for queue in self.channels.get(channel, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait({"type": kind, "data": data})
+    
+    def watching(self, channel: str) -> int:
+        return len(self.channels.get(channel, ()))
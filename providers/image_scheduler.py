@@ -0,0 +1,323 @@
+"""
+Image Scheduler
+Coalesces concurrent ComfyUI jobs into shared prompts
+
+Jobs wait in a queue while ComfyUI is busy; each time a backend frees up, up
+to IMAGE_MAX_BATCH compatible jobs (same workflow and size) leave together:
+
+- identical jobs (same cache key) run once and share the image
+- variations of one request whose seed doesn't matter (fresh=True) become a
+  single latent batch (batch_size=N)
+- everything else is merged into one prompt graph in which identical nodes
+  (checkpoint and model loaders, text encoders, latents) are shared, so
+  loaders run once and ComfyUI goes straight from one job to the next
+
+Outputs are split back to their requesters. If a merged prompt fails, its
+jobs that still have a requester are retried one by one, so one bad job
+cannot fail the others. A job whose requesters all gave up is dropped from
+the queue, and a running prompt is cancelled once no job in it has a
+requester left.
+"""
+
+import asyncio
+import inspect
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+from .workflow_registry import OUTPUT_NODES
+
+# (workflow, on_progress, on_preview, number of images) -> {output node id: [PNG bytes]}
+Execute = Callable[[Dict[str, Any], Optional[Callable], Optional[Callable], int], Awaitable[Dict[str, List[bytes]]]]
+
+
+@dataclass(eq=False)
+class ImageJob:
+    """One requested image waiting for a prompt"""
+    workflow: Dict[str, Any]
+    group: Tuple
+    key: Optional[str]
+    any_seed: bool
+    latents: List[str]
+    seeds: List[Tuple[str, str]]
+    on_progress: Optional[Callable]
+    future: asyncio.Future
+    on_preview: Optional[Callable] = None
+    unit: int = 0  # index of the prompt unit the job runs in
+    batch_index: int = 0  # position in that unit's latent batch
+    waiters: int = 0  # requesters still waiting (identical requests share a job)
+    
+    def seedless(self) -> str:
+        """The workflow with seeds blanked: jobs equal here differ only in noise."""
+        nodes = {node_id: {**node, "inputs": dict(node["inputs"])} for node_id, node in self.workflow.items()}
+        for node_id, name in self.seeds:
+            nodes[node_id]["inputs"][name] = None
+        return json.dumps(nodes, sort_keys=True)
+
+
+def _is_link(value: Any) -> bool:
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[1], int)
+
+
+def merge_workflows(workflows: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+    """
+    Combine workflows into one prompt graph, sharing nodes whose type and inputs are identical.
+    
+    Returns:
+        (merged workflow, per input workflow {original node id: merged node id})
+    """
+    merged: Dict[str, Any] = {}
+    by_signature: Dict[str, str] = {}
+    id_maps = []
+    for index, workflow in enumerate(workflows):
+        id_map: Dict[str, str] = {}
+        
+        def visit(node_id: str) -> str:
+            if node_id in id_map:
+                return id_map[node_id]
+            node = workflow[node_id]
+            inputs = {
+                name: [visit(str(value[0])), value[1]] if _is_link(value) and str(value[0]) in workflow else value
+                for name, value in node["inputs"].items()
+            }
+            signature = json.dumps([node["class_type"], inputs], sort_keys=True)
+            merged_id = None if node["class_type"] in OUTPUT_NODES else by_signature.get(signature)
+            if merged_id is None:
+                merged_id = node_id if index == 0 else f"{index}.{node_id}"
+                merged[merged_id] = {**node, "inputs": inputs}
+                by_signature.setdefault(signature, merged_id)
+            id_map[node_id] = merged_id
+            return merged_id
+        
+        for node_id in workflow:
+            visit(node_id)
+        id_maps.append(id_map)
+    return merged, id_maps
+
+
+class ImageScheduler:
+    """Queues image jobs and submits compatible ones to ComfyUI together"""
+    
+    def __init__(
+        self,
+        execute: Execute,
+        window_ms: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        concurrency: Optional[Callable[[], int]] = None
+    ):
+        self.execute = execute
+        # How many prompts may run at once (one per usable backend); re-read whenever the queue moves
+        self.concurrency = concurrency or (lambda: 1)
+        self.window = (window_ms if window_ms is not None else float(os.getenv("IMAGE_BATCH_WINDOW_MS", "50"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("IMAGE_MAX_BATCH", "4"))
+        self.pending: List[ImageJob] = []
+        self.inflight: Dict[str, ImageJob] = {}
+        self.running = 0
+        self._active: Dict[asyncio.Task, List[ImageJob]] = {}  # running prompts and their jobs
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"jobs": 0, "prompts": 0, "deduplicated": 0, "batched": 0, "merged": 0, "retried": 0, "abandoned": 0, "cancelled": 0}
+    
+    async def submit(
+        self,
+        workflow: Dict[str, Any],
+        group: Tuple,
+        key: Optional[str] = None,
+        any_seed: bool = False,
+        latents: Optional[List[str]] = None,
+        seeds: Optional[List[Tuple[str, str]]] = None,
+        on_progress: Optional[Callable] = None,
+        on_preview: Optional[Callable] = None
+    ) -> bytes:
+        """
+        Queue a rendered workflow and wait for its image.
+        
+        Args:
+            workflow: Rendered API-format workflow
+            group: Jobs with equal groups may share a prompt (workflow path, width, height)
+            key: Content key; a job identical to one already queued or running shares its result
+            any_seed: The exact seed doesn't matter, so the job may run as one image of a latent batch
+            latents: Latent node ids (batch_size is set on these)
+            seeds: (node id, input) seed paths
+            on_progress: Called with sampler progress of this job
+            on_preview: Called with encoded live previews of this job ({"node", "preview", "mime"})
+        """
+        # Share an identical job's result (not one whose requesters all left: it may be being cancelled)
+        if key is not None and not any_seed and key in self.inflight and self.inflight[key].waiters > 0:
+            self.stats["deduplicated"] += 1
+            return await self._wait(self.inflight[key])
+        
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # waiters may be gone
+        job = ImageJob(workflow, group, key, any_seed, latents or [], seeds or [], on_progress, future, on_preview)
+        if key is not None and not any_seed:
+            self.inflight[key] = job
+            future.add_done_callback(lambda _: self.inflight.get(key) is job and self.inflight.pop(key))
+        self.pending.append(job)
+        self.stats["jobs"] += 1
+        
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+        self._wake.set()
+        return await self._wait(job)
+    
+    async def _wait(self, job: ImageJob) -> bytes:
+        job.waiters += 1
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            job.waiters -= 1
+            if job.waiters == 0 and job in self.pending:
+                # Every requester gave up (e.g. its deadline passed) before the job was sent: drop it
+                self.pending.remove(job)
+                job.future.cancel()
+                self.stats["abandoned"] += 1
+            elif job.waiters == 0:
+                # Already running: stop the prompt once nobody waits for any of its jobs
+                for task, jobs in self._active.items():
+                    if job in jobs and all(other.waiters == 0 for other in jobs):
+                        task.cancel()
+                        self.stats["cancelled"] += 1
+            raise
+    
+    def wake(self):
+        """Re-check the queue (capacity changed, e.g. a backend came back or finished draining)."""
+        if self._wake is not None:
+            self._wake.set()
+    
+    async def _dispatch(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self.pending and len(self._active) < self.concurrency():
+                if len(self.pending) < self.max_batch and self.window:
+                    await asyncio.sleep(self.window)  # let requests arriving together join
+                    if not self.pending:
+                        break  # abandoned meanwhile
+                jobs = self._take()
+                task = asyncio.create_task(self._run_jobs(jobs))
+                self._active[task] = jobs
+                task.add_done_callback(self._finished)
+    
+    def _finished(self, task: asyncio.Task):
+        self._active.pop(task, None)
+        self.wake()
+    
+    async def _run_jobs(self, jobs: List[ImageJob]):
+        self.running += len(jobs)
+        try:
+            await self._run(jobs)
+        except asyncio.CancelledError:
+            for job in jobs:
+                job.future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Image scheduler failed to run {len(jobs)} jobs: {e}")
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+        finally:
+            self.running -= len(jobs)
+    
+    def _take(self) -> List[ImageJob]:
+        """The oldest job plus up to max_batch - 1 compatible ones, in arrival order."""
+        group = self.pending[0].group
+        jobs = [job for job in self.pending if job.group == group][:self.max_batch]
+        self.pending = [job for job in self.pending if job not in jobs]
+        return jobs
+    
+    def _plan(self, jobs: List[ImageJob]) -> List[Dict[str, Any]]:
+        """Prompt units: one workflow each, a latent batch when several any-seed jobs are otherwise equal."""
+        units: List[Dict[str, Any]] = []
+        batches: Dict[str, int] = {}
+        for job in jobs:
+            signature = job.seedless() if job.any_seed else None
+            if signature is not None and signature in batches:
+                job.unit = batches[signature]
+                job.batch_index = len(units[job.unit]["jobs"])
+                units[job.unit]["jobs"].append(job)
+                continue
+            job.unit, job.batch_index = len(units), 0
+            units.append({"workflow": job.workflow, "jobs": [job]})
+            if signature is not None:
+                batches[signature] = job.unit
+        for unit in units:
+            if len(unit["jobs"]) > 1:
+                workflow = {node_id: {**node, "inputs": dict(node["inputs"])} for node_id, node in unit["workflow"].items()}
+                for node_id in unit["jobs"][0].latents:
+                    workflow[node_id]["inputs"]["batch_size"] = len(unit["jobs"])
+                unit["workflow"] = workflow
+        return units
+    
+    async def _run(self, jobs: List[ImageJob]):
+        units = self._plan(jobs)
+        merged, id_maps = merge_workflows([unit["workflow"] for unit in units])
+        if len(jobs) > 1:
+            logger.info(
+                f"Image scheduler: {len(jobs)} jobs in one prompt "
+                f"({len(units)} workflows merged, {len(jobs) - len(units)} as latent batch images)"
+            )
+        
+        # Progress of a sampler goes to the jobs whose workflow contains it
+        owners: Dict[str, List[ImageJob]] = {}
+        for unit, id_map in zip(units, id_maps):
+            for merged_id in set(id_map.values()):
+                owners.setdefault(merged_id, []).extend(unit["jobs"])
+        
+        async def on_progress(update: Dict):
+            for job in owners.get(update.get("node"), []):
+                if job.on_progress is not None:
+                    result = job.on_progress(update)
+                    if inspect.isawaitable(result):
+                        await result
+        
+        async def on_preview(update: Dict):
+            for job in owners.get(update.get("node"), []):
+                if job.on_preview is not None:
+                    result = job.on_preview(update)
+                    if inspect.isawaitable(result):
+                        await result
+        
+        self.stats["prompts"] += 1
+        self.stats["merged"] += len(units) - 1
+        self.stats["batched"] += len(jobs) - len(units)
+        try:
+            # Previews are only decoded and encoded when someone shows them
+            wants_previews = any(job.on_preview is not None for job in jobs)
+            images = await self.execute(merged, on_progress, on_preview if wants_previews else None, len(jobs))
+        except Exception as e:
+            if len(jobs) > 1:
+                logger.warning(f"Shared prompt of {len(jobs)} jobs failed ({e}), retrying them one by one")
+                for job in jobs:
+                    if job.waiters == 0:
+                        # Its requesters gave up while the shared prompt ran
+                        job.future.cancel()
+                        self.stats["abandoned"] += 1
+                        continue
+                    self.stats["retried"] += 1
+                    job.any_seed = False  # run alone, no batch
+                    await self._run([job])
+                return
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            return
+        
+        for unit, id_map in zip(units, id_maps):
+            outputs = [
+                images[id_map[node_id]] for node_id, node in unit["workflow"].items()
+                if node["class_type"] in OUTPUT_NODES and images.get(id_map[node_id])
+            ]
+            for job in unit["jobs"]:
+                if job.future.done():
+                    continue
+                if outputs and job.batch_index < len(outputs[0]):
+                    job.future.set_result(outputs[0][job.batch_index])
+                else:
+                    job.future.set_exception(Exception("ComfyUI finished without producing an image"))
+    
+    def status(self) -> Dict[str, Any]:
+        """Queue depth and coalescing counters."""
+        return {"pending": len(self.pending), "running": self.running, "prompts_running": len(self._active), **self.stats}
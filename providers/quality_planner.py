@@ -0,0 +1,166 @@
+"""
+Image Quality Planner
+Picks sampler steps, resolution and refiner use so an image lands by its target time
+
+Sampler speed is measured from ComfyUI's progress events as seconds per
+step per megapixel. A request's time is the queue ahead of it (estimated at
+full quality) plus its own steps at its own size. When idle it gets full
+quality. Under load the image degrades in order until it fits
+IMAGE_TARGET_SECONDS (or the caller's tighter deadline):
+
+1. fewer steps, down to IMAGE_MIN_STEP_FRACTION of the full schedule
+2. no SDXL refiner stage
+3. smaller latents (3/4, then 1/2 of each side, never below IMAGE_MIN_SIDE)
+
+Until the first measurement every image gets full quality.
+"""
+
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+from loguru import logger
+
+
+SIZE_SCALES = (1.0, 0.75, 0.5)
+
+
+@dataclass
+class Quality:
+    """How to render one image"""
+    steps: int
+    width: int
+    height: int
+    refiner: bool
+    estimate: Optional[float] = None  # seconds of sampling, when speed is known
+    reduced: bool = False  # anything below the template's full quality
+    
+    def same_as(self, other: "Quality") -> bool:
+        return (self.steps, self.width, self.height, self.refiner) == (other.steps, other.width, other.height, other.refiner)
+
+
+def sampler_megapixels(workflow: Dict[str, Any]) -> Dict[str, float]:
+    """Latent megapixels (times batch size) each sampler of a workflow works on."""
+    result = {}
+    for node_id, node in workflow.items():
+        inputs = node.get("inputs", {})
+        if not isinstance(inputs.get("steps"), int):
+            continue
+        source, seen = inputs.get("latent_image"), set()
+        # Follow the latent back through other samplers (a refiner continues the base's latent)
+        while isinstance(source, list) and str(source[0]) in workflow and str(source[0]) not in seen:
+            seen.add(str(source[0]))
+            latent = workflow[str(source[0])]["inputs"]
+            if isinstance(latent.get("width"), int) and isinstance(latent.get("height"), int):
+                result[node_id] = latent["width"] * latent["height"] * latent.get("batch_size", 1) / 1e6
+                break
+            source = latent.get("latent_image")
+    return result
+
+
+def _side(value: int, scale: float, minimum: int) -> int:
+    """A scaled latent side, multiple of 64 and at least minimum (or the original, if smaller)."""
+    scaled = int(value * scale) // 64 * 64
+    return max(scaled, min(value, minimum))
+
+
+class QualityPlanner:
+    """Deadline-aware quality scaling driven by measured sampler speed"""
+    
+    def __init__(self, target_seconds: Optional[float] = None):
+        self.enabled = os.getenv("IMAGE_QUALITY_SCALING", "true").lower() == "true"
+        self.target = target_seconds if target_seconds is not None else float(os.getenv("IMAGE_TARGET_SECONDS", "120"))
+        self.min_step_fraction = float(os.getenv("IMAGE_MIN_STEP_FRACTION", "0.5"))
+        self.min_side = int(os.getenv("IMAGE_MIN_SIDE", "512"))
+        self.seconds_per_step_mp: Optional[float] = None  # moving average
+        self.samples = 0
+        self.last_plan: Optional[Dict[str, Any]] = None
+        self.stats = {"plans": 0, "full": 0, "reduced": 0}
+    
+    def observe_step(self, seconds: float, megapixels: float):
+        """One sampler step took this long on a latent this big."""
+        if seconds <= 0 or megapixels <= 0:
+            return
+        value = seconds / megapixels
+        previous = self.seconds_per_step_mp
+        self.seconds_per_step_mp = value if previous is None else 0.9 * previous + 0.1 * value
+        self.samples += 1
+    
+    def estimate(self, steps: float, width: int, height: int) -> Optional[float]:
+        """Seconds of sampling for this many steps at this size (None until measured)."""
+        if self.seconds_per_step_mp is None:
+            return None
+        return self.seconds_per_step_mp * steps * width * height / 1e6
+    
+    def full_estimate(self, template, width: int, height: int) -> Optional[float]:
+        return self.estimate(template.steps, width, height)
+    
+    def lowest_estimate(self, template, width: int, height: int) -> Optional[float]:
+        """Seconds of sampling at the lowest quality plan() can pick (full quality when scaling is off)."""
+        if not self.enabled or not template.steps:
+            return self.full_estimate(template, width, height)
+        w, h = _side(width, SIZE_SCALES[-1], self.min_side), _side(height, SIZE_SCALES[-1], self.min_side)
+        return self.estimate(self._min_steps(template) * self._share(template, False), w, h)
+    
+    def _min_steps(self, template) -> int:
+        return max(1, round(template.steps * self.min_step_fraction))
+    
+    @staticmethod
+    def _share(template, refiner: bool) -> float:
+        """Fraction of the schedule that runs: without the refiner only the base's share."""
+        return 1.0 if refiner or template.refiner is None else template.base_fraction
+    
+    def plan(self, template, width: int, height: int, wait: float = 0.0, target: Optional[float] = None) -> Quality:
+        """
+        Highest quality that finishes by the target, given the seconds of queue ahead.
+        
+        Args:
+            template: Compiled WorkflowTemplate (steps, refiner)
+            width, height: Requested size
+            wait: Estimated seconds until this image starts
+            target: Tighter deadline than IMAGE_TARGET_SECONDS for this request
+        """
+        has_refiner = template.refiner is not None
+        full = Quality(template.steps, width, height, has_refiner, self.full_estimate(template, width, height))
+        if not self.enabled or self.seconds_per_step_mp is None or not template.steps:
+            return full
+        self.stats["plans"] += 1
+        target = min(self.target, target) if target is not None else self.target
+        budget = target - wait
+        
+        options = [(1.0, True)] if has_refiner else []
+        options += [(scale, False) for scale in SIZE_SCALES]
+        min_steps = self._min_steps(template)
+        chosen = full
+        for scale, refiner in options:
+            w, h = _side(width, scale, self.min_side), _side(height, scale, self.min_side)
+            if scale < 1.0 and (w, h) == (width, height):
+                continue  # already at the minimum size
+            cost_per_step = self.estimate(self._share(template, refiner), w, h)
+            steps = min(template.steps, int(budget / cost_per_step)) if budget > 0 else 0
+            # The last option is used even if it will be late
+            chosen = Quality(max(steps, min_steps), w, h, refiner and has_refiner)
+            if steps >= min_steps:
+                break
+        chosen.estimate = self.estimate(chosen.steps * self._share(template, chosen.refiner), chosen.width, chosen.height)
+        
+        chosen.reduced = not chosen.same_as(full)
+        self.stats["reduced" if chosen.reduced else "full"] += 1
+        self.last_plan = {"time": time.time(), "wait": round(wait, 1), "target": target, **asdict(chosen)}
+        if chosen.reduced:
+            logger.info(
+                f"Image quality reduced to fit {target:.0f}s ({wait:.0f}s queued ahead): {chosen.steps}/{template.steps} steps, "
+                f"{chosen.width}x{chosen.height}, refiner {'on' if chosen.refiner else 'off'} (~{chosen.estimate:.0f}s)"
+            )
+        return chosen
+    
+    def status(self) -> Dict[str, Any]:
+        """Measured speed, target and the last plan."""
+        return {
+            "enabled": self.enabled,
+            "target_seconds": self.target,
+            "seconds_per_step_per_megapixel": round(self.seconds_per_step_mp, 3) if self.seconds_per_step_mp is not None else None,
+            "samples": self.samples,
+            **self.stats,
+            "last_plan": self.last_plan,
+        }
@@ -0,0 +1,138 @@
+"""
+Reference Image Uploads
+Persona reference images sent to each ComfyUI backend once, by content hash
+
+InstantID workflows load reference_images/{persona}.png through a LoadImage
+node, which reads from ComfyUI's own input directory. Instead of relying on a
+shared filesystem, each reference is uploaded through /upload/image under a
+name derived from its SHA-256 (luna_3f2a9c1b7d4e.png) and the uploaded name
+is put into the workflow. A file is only hashed again when os.stat reports a
+new mtime or size, and only uploaded again when the hash changes, so an
+unchanged reference costs one stat per request. Backends that fail to take an
+upload get the plain file name, as before.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from loguru import logger
+
+
+class ReferenceUploader:
+    """Content-addressed reference image uploads per ComfyUI backend"""
+    
+    def __init__(self, reference_dir: str, enabled: Optional[bool] = None):
+        self.reference_dir = reference_dir
+        self.enabled = enabled if enabled is not None else os.getenv("COMFYUI_UPLOAD_REFERENCES", "true").lower() == "true"
+        self._digests: Dict[Tuple[str, int, int], str] = {}  # (path, mtime_ns, size) -> sha256
+        self._uploaded: Dict[Tuple[str, str], str] = {}  # (backend name, sha256) -> name in its input dir
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}  # one upload of a file to a backend at a time
+        self._memo_lock = threading.Lock()  # digest() runs in worker threads
+        self.stats = {"uploads": 0, "reused": 0, "failed": 0, "hashed": 0}
+    
+    def path_of(self, name: str) -> str:
+        return os.path.join(self.reference_dir, str(name))
+    
+    def digest(self, path: str) -> Optional[str]:
+        """SHA-256 of a local file, re-read only when its mtime or size changes (None if missing)."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        memo_key = (path, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            with self._memo_lock:
+                # An edited file leaves its old entry behind; drop it
+                for stale in [key for key in self._digests if key[0] == path]:
+                    del self._digests[stale]
+                self._digests[memo_key] = digest
+                self.stats["hashed"] += 1
+        return digest
+    
+    def digests(self, workflow: Dict[str, Any]) -> List[str]:
+        """Content hashes of the reference images a workflow loads (the file name when it isn't local)."""
+        digests = []
+        for node in workflow.values():
+            if node.get("class_type") != "LoadImage":
+                continue
+            name = node["inputs"].get("image")
+            digest = self.digest(self.path_of(name))
+            digests.append(digest if digest is not None else f"name:{name}")
+        return digests
+    
+    async def _upload(self, client: httpx.AsyncClient, backend, path: str, digest: str) -> str:
+        stem, extension = os.path.splitext(os.path.basename(path))
+        filename = f"{stem}_{digest[:12]}{extension or '.png'}"
+        data = await asyncio.to_thread(_read, path)
+        response = await client.post(
+            f"{backend.url}/upload/image",
+            files={"image": (filename, data, "application/octet-stream")},
+            data={"type": "input", "overwrite": "true"}
+        )
+        response.raise_for_status()
+        result = response.json()
+        name = result.get("name", filename)
+        if result.get("subfolder"):
+            name = f"{result['subfolder']}/{name}"
+        self.stats["uploads"] += 1
+        logger.info(f"Uploaded reference image {os.path.basename(path)} to {backend.name} as {name}")
+        return name
+    
+    async def ensure(self, client: httpx.AsyncClient, backend, name: str) -> str:
+        """
+        The name a backend knows a local reference image by, uploading it first if needed.
+        
+        Falls back to the given name when the file isn't local or the upload fails.
+        """
+        path = self.path_of(name)
+        digest = await asyncio.to_thread(self.digest, path)
+        if digest is None:
+            return name
+        key = (backend.name, digest)
+        # Requests for the same file wait for the first one's upload
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            if key in self._uploaded:
+                self.stats["reused"] += 1
+                return self._uploaded[key]
+            try:
+                uploaded = await self._upload(client, backend, path, digest)
+            except httpx.TransportError:
+                raise  # the backend itself is down: the prompt is requeued elsewhere
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"Could not upload {name} to ComfyUI {backend.name}, using the name as is: {e}")
+                return name
+            self._uploaded[key] = uploaded
+            return uploaded
+    
+    async def prepare(self, client: httpx.AsyncClient, backend, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        """The workflow with every LoadImage pointing at the backend's uploaded copy (other nodes shared)."""
+        if not self.enabled:
+            return workflow
+        prepared = dict(workflow)
+        for node_id, node in workflow.items():
+            if node.get("class_type") != "LoadImage" or not isinstance(node["inputs"].get("image"), str):
+                continue
+            name = await self.ensure(client, backend, node["inputs"]["image"])
+            if name != node["inputs"]["image"]:
+                prepared[node_id] = {**node, "inputs": {**node["inputs"], "image": name}}
+        return prepared
+    
+    def forget(self, backend_name: str):
+        """A backend went down: it may come back with an empty input directory."""
+        for key in [key for key in self._uploaded if key[0] == backend_name]:
+            del self._uploaded[key]
+    
+    def status(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, **self.stats, "uploaded": len(self._uploaded)}
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
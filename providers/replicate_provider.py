@@ -14,6 +14,8 @@ from .base_provider import ImageProvider
 class ReplicateProvider(ImageProvider):
     """Image generation using Replicate API"""
     
+    key = "replicate"
+    
     def __init__(self):
         self.api_token = os.getenv("REPLICATE_API_TOKEN")
         self.base_url = "https://api.replicate.com/v1"
@@ -0,0 +1,190 @@
+"""
+VRAM Budget Planner
+Frees GPU memory for an image only when the image wouldn't fit otherwise
+
+Before a prompt runs on the local ComfyUI, free VRAM is read from ComfyUI's
+/system_stats and the resident LLMs from Ollama's /api/ps. The image needs its
+footprint (the most VRAM ComfyUI has held after running the same checkpoints;
+COMFYUI_VRAM_MB until measured) less what ComfyUI already holds. If free
+memory minus VRAM_HEADROOM_MB covers that, every model stays loaded;
+otherwise the fewest Ollama models that cover the shortfall are unloaded,
+largest first. A chat only waits for images that evicted its own model
+(wait_for_model); with room for both, chat and images run side by side. When
+a chat next uses an evicted model, the load time Ollama reports is logged as
+the cost of that eviction.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Set
+import httpx
+from loguru import logger
+
+
+MB = 1024 * 1024
+
+
+class VRAMPlanner:
+    """Decides which Ollama models to unload so an image fits on the shared GPU"""
+    
+    def __init__(self, ollama_url: Optional[str] = None, default_mb: Optional[float] = None, headroom_mb: Optional[float] = None):
+        self.ollama_url = ollama_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.default_need = int((default_mb if default_mb is not None else float(os.getenv("COMFYUI_VRAM_MB", "8192"))) * MB)
+        self.headroom = int((headroom_mb if headroom_mb is not None else float(os.getenv("VRAM_HEADROOM_MB", "512"))) * MB)
+        self.footprints: Dict[FrozenSet[str], int] = {}  # checkpoints -> bytes ComfyUI held after running them
+        self.evicted: Dict[str, float] = {}  # model -> when it was unloaded for an image
+        self.last_plan: Optional[Dict[str, Any]] = None
+        self._holding = 0  # images running in memory freed by unloading LLMs
+        self._released = asyncio.Event()  # set while no such image runs
+        self._released.set()
+        self.stats = {"plans": 0, "kept": 0, "evictions": 0, "reloads": 0, "reload_seconds": 0.0}
+    
+    async def _device(self, client: httpx.AsyncClient, comfyui_url: str) -> Optional[Dict[str, Any]]:
+        """ComfyUI's first device from /system_stats (vram_total, vram_free, torch_vram_total in bytes)."""
+        try:
+            response = await client.get(f"{comfyui_url}/system_stats")
+            response.raise_for_status()
+            devices = response.json().get("devices") or []
+            return devices[0] if devices else None
+        except Exception as e:
+            logger.warning(f"Could not read ComfyUI memory stats: {e}")
+            return None
+    
+    async def _resident(self, client: httpx.AsyncClient) -> List[Dict[str, Any]]:
+        """Ollama models currently in VRAM, from /api/ps."""
+        try:
+            response = await client.get(f"{self.ollama_url}/api/ps")
+            response.raise_for_status()
+            return [model for model in response.json().get("models", []) if model.get("size_vram")]
+        except Exception as e:
+            logger.warning(f"Could not list loaded Ollama models: {e}")
+            return []
+    
+    async def _unload(self, client: httpx.AsyncClient, model: str) -> bool:
+        try:
+            response = await client.post(f"{self.ollama_url}/api/generate", json={"model": model, "keep_alive": 0})
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Could not unload Ollama model {model}: {e}")
+            return False
+        self.evicted[model] = time.time()
+        return True
+    
+    def need(self, checkpoints: Set[str]) -> int:
+        """Bytes ComfyUI needs for these checkpoints (measured, or the configured default)."""
+        return self.footprints.get(frozenset(checkpoints), self.default_need)
+    
+    async def make_room(self, comfyui_url: str, checkpoints: Set[str]) -> bool:
+        """
+        Unload just enough Ollama models for an image with these checkpoints to fit.
+        
+        Returns:
+            True if models were unloaded; call release_room() once the image is done
+        """
+        started = time.monotonic()
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            device, resident = await asyncio.gather(self._device(client, comfyui_url), self._resident(client))
+            self.stats["plans"] += 1
+            plan: Dict[str, Any] = {"time": time.time(), "resident": [m["name"] for m in resident], "evict": []}
+            if not resident:
+                plan["decision"] = "no LLM in VRAM"
+            elif device is None:
+                # Memory unknown: free the GPU as before rather than risk an out-of-memory failure
+                plan["decision"] = "ComfyUI memory unknown, unloading all"
+                plan["evict"] = [m["name"] for m in resident]
+            elif device.get("type") == "cpu":
+                plan["decision"] = "ComfyUI runs on CPU"
+            else:
+                need = self.need(checkpoints)
+                held = device.get("torch_vram_total") or 0
+                available = device.get("vram_free", 0) - self.headroom
+                shortfall = need - held - available
+                plan.update(need_mb=need // MB, held_mb=held // MB, free_mb=device.get("vram_free", 0) // MB)
+                if shortfall <= 0:
+                    plan["decision"] = "fits"
+                else:
+                    freed = 0
+                    for model in sorted(resident, key=lambda m: m["size_vram"], reverse=True):
+                        if freed >= shortfall:
+                            break
+                        plan["evict"].append(model["name"])
+                        freed += model["size_vram"]
+                    plan["decision"] = f"short by {shortfall // MB} MB"
+            
+            if plan["evict"]:
+                # Chats for these models wait from here until the image is done
+                self._holding += 1
+                self._released.clear()
+                unloaded = await asyncio.gather(*(self._unload(client, name) for name in plan["evict"]))
+                self.stats["evictions"] += sum(unloaded)
+            else:
+                self.stats["kept"] += 1
+        plan["seconds"] = round(time.monotonic() - started, 3)
+        self.last_plan = plan
+        kept = [name for name in plan["resident"] if name not in plan["evict"]]
+        logger.info(
+            f"VRAM plan: {plan['decision']}; unloaded {plan['evict'] or 'nothing'}, "
+            f"kept {kept or 'nothing'} ({plan['seconds']:.2f}s)"
+        )
+        return bool(plan["evict"])
+    
+    def release_room(self):
+        """An image that needed models unloaded is done; their chats may load them again."""
+        self._holding = max(0, self._holding - 1)
+        if not self._holding:
+            self._released.set()
+    
+    async def wait_for_model(self, model: str, timeout: float) -> bool:
+        """
+        Wait while an image runs in memory freed by unloading this Ollama model.
+        
+        Returns:
+            True if the chat had to wait (False right away when the model wasn't unloaded)
+        """
+        if self._released.is_set() or _tagged(model) not in {_tagged(name) for name in self.evicted}:
+            return False
+        try:
+            await asyncio.wait_for(self._released.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Image still running after {timeout:.0f}s - loading {model} anyway")
+        return True
+    
+    async def observe(self, comfyui_url: str, checkpoints: Set[str]):
+        """After a prompt ran: remember how much VRAM ComfyUI held for these checkpoints."""
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            device = await self._device(client, comfyui_url)
+        held = (device or {}).get("torch_vram_total") or 0
+        if held and (device or {}).get("type") != "cpu":
+            key = frozenset(checkpoints)
+            self.footprints[key] = max(self.footprints.get(key, 0), held)
+    
+    def note_load(self, model: str, load_seconds: float):
+        """A chat loaded an LLM; if an image evicted it, that load time is the eviction's cost."""
+        name = next((name for name in self.evicted if _tagged(name) == _tagged(model)), None)
+        if name is None:
+            return
+        evicted_at = self.evicted.pop(name)
+        self.stats["reloads"] += 1
+        self.stats["reload_seconds"] = round(self.stats["reload_seconds"] + load_seconds, 3)
+        logger.info(
+            f"Reloading {model} after it was unloaded for an image took {load_seconds:.1f}s "
+            f"(unloaded {time.time() - evicted_at:.0f}s ago)"
+        )
+    
+    def status(self) -> Dict[str, Any]:
+        """Counters, learned footprints and the last decision."""
+        return {
+            **self.stats,
+            "default_need_mb": self.default_need // MB,
+            "headroom_mb": self.headroom // MB,
+            "footprints_mb": {",".join(sorted(key)) or "none": size // MB for key, size in self.footprints.items()},
+            "evicted": sorted(self.evicted),
+            "images_holding_room": self._holding,
+            "last_plan": self.last_plan,
+        }
+
+
+def _tagged(model: str) -> str:
+    """Ollama model name with its implicit :latest tag (/api/ps always reports the tag)."""
+    return model if ":" in model else f"{model}:latest"
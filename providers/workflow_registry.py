@@ -0,0 +1,371 @@
+"""
+ComfyUI Workflow Registry
+Loads workflow templates once, finds where prompts go, and validates them against ComfyUI
+
+A template is compiled when first used (and again whenever its file changes):
+the positive and negative prompt fields are found by following the samplers'
+conditioning links back to their text encoders, latent size nodes, seed
+inputs and PERSONA_NAME placeholders are indexed. Rendering a request is then a shallow
+copy of the nodes plus a few assignments.
+
+Samplers and an SDXL refiner stage (a sampler continuing another sampler's
+latent) are indexed too, so a render can use fewer steps or skip the refiner.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+
+PLACEHOLDER = "PERSONA_NAME"
+TEXT_FIELDS = ("text", "text_g", "text_l")
+SEED_FIELDS = ("seed", "noise_seed")
+OUTPUT_NODES = ("SaveImage", "SaveImageWebsocket", "PreviewImage")
+LAST_STEP = 10000  # end_at_step meaning "to the end"
+
+InputPath = Tuple[str, str]  # (node id, input name)
+
+
+class WorkflowError(Exception):
+    """A workflow template that cannot be run"""
+    pass
+
+
+@dataclass
+class WorkflowTemplate:
+    """A parsed API-format workflow with its injection points"""
+    path: str
+    mtime: float
+    size: int
+    nodes: Dict[str, Any]
+    positive: List[InputPath]
+    negative: List[InputPath]
+    latents: List[str]
+    placeholders: List[InputPath]
+    seeds: List[InputPath] = field(default_factory=list)
+    checkpoints: List[str] = field(default_factory=list)
+    samplers: List[str] = field(default_factory=list)
+    steps: int = 0  # full-quality step count (the longest sampler schedule)
+    refiner: Optional[Dict[str, str]] = None  # {"base", "refiner", "base_checkpoint", "refiner_checkpoint"} node ids
+    
+    @property
+    def base_fraction(self) -> float:
+        """Share of the schedule the base sampler runs when a refiner finishes it."""
+        if not self.refiner:
+            return 1.0
+        base = self.nodes[self.refiner["base"]]["inputs"]
+        return min(base["end_at_step"], base["steps"]) / base["steps"]
+    
+    def render(
+        self,
+        prompt: str,
+        negative_prompt: Optional[str],
+        width: int,
+        height: int,
+        persona_name: str = "unknown",
+        seed: Optional[int] = None,
+        steps: Optional[int] = None,
+        refiner: bool = True
+    ) -> Dict[str, Any]:
+        """
+        A ready-to-queue copy of the workflow with this request's values set.
+        
+        seed None keeps the template's seeds, steps None its step counts;
+        refiner=False lets the base sampler finish alone and drops the refiner stage.
+        """
+        workflow = {node_id: {**node, "inputs": dict(node["inputs"])} for node_id, node in self.nodes.items()}
+        for node_id, name in self.placeholders:
+            workflow[node_id]["inputs"][name] = workflow[node_id]["inputs"][name].replace(PLACEHOLDER, persona_name)
+        for node_id, name in self.positive:
+            workflow[node_id]["inputs"][name] = prompt
+        if negative_prompt:
+            for node_id, name in self.negative:
+                workflow[node_id]["inputs"][name] = negative_prompt
+        for node_id in self.latents:
+            workflow[node_id]["inputs"]["width"] = width
+            workflow[node_id]["inputs"]["height"] = height
+        if seed is not None:
+            for node_id, name in self.seeds:
+                workflow[node_id]["inputs"][name] = seed
+        if steps is not None and self.steps and steps != self.steps:
+            ratio = steps / self.steps
+            for node_id in self.samplers:
+                inputs = workflow[node_id]["inputs"]
+                # start/end of a split schedule scale with it, "to the end" stays
+                for name in ("start_at_step", "end_at_step"):
+                    if isinstance(inputs.get(name), int) and inputs[name] < inputs["steps"]:
+                        inputs[name] = round(inputs[name] * ratio)
+                inputs["steps"] = max(1, round(inputs["steps"] * ratio))
+        if not refiner and self.refiner:
+            workflow = self._without_refiner(workflow)
+        return workflow
+    
+    def _without_refiner(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        """Let the base sampler denoise to the end, decode with its own VAE, and drop the refiner's nodes."""
+        base, refiner = self.refiner["base"], self.refiner["refiner"]
+        inputs = workflow[base]["inputs"]
+        inputs["steps"] = max(1, min(inputs["end_at_step"], inputs["steps"]))
+        inputs["end_at_step"] = LAST_STEP
+        inputs["return_with_leftover_noise"] = "disable"
+        relink = {(refiner, 0): [base, 0], (self.refiner["refiner_checkpoint"], 2): [self.refiner["base_checkpoint"], 2]}
+        for node in workflow.values():
+            for name, value in node["inputs"].items():
+                if _is_link(value) and (str(value[0]), value[1]) in relink:
+                    node["inputs"][name] = relink[(str(value[0]), value[1])]
+        # Keep only what the outputs still use
+        keep: Set[str] = set()
+        stack = [node_id for node_id, node in workflow.items() if node["class_type"] in OUTPUT_NODES]
+        while stack:
+            node_id = stack.pop()
+            if node_id in keep or node_id not in workflow:
+                continue
+            keep.add(node_id)
+            stack.extend(str(value[0]) for value in workflow[node_id]["inputs"].values() if _is_link(value))
+        return {node_id: node for node_id, node in workflow.items() if node_id in keep}
+    
+    def problems(self, object_info: Dict[str, Any]) -> List[str]:
+        """What ComfyUI would reject: unknown node types, missing inputs, dangling links, unknown models."""
+        problems = []
+        for node_id, node in self.nodes.items():
+            class_type = node["class_type"]
+            spec = object_info.get(class_type)
+            if spec is None:
+                problems.append(f"node {node_id}: unknown node type {class_type} (custom node not installed?)")
+                continue
+            inputs = node["inputs"]
+            declared = {**spec.get("input", {}).get("required", {}), **spec.get("input", {}).get("optional", {})}
+            for name in spec.get("input", {}).get("required", {}):
+                if name not in inputs:
+                    problems.append(f"node {node_id} ({class_type}): missing required input {name}")
+            for name, value in inputs.items():
+                if _is_link(value):
+                    source = self.nodes.get(str(value[0]))
+                    if source is None:
+                        problems.append(f"node {node_id} ({class_type}): input {name} links to missing node {value[0]}")
+                    elif source["class_type"] in object_info and value[1] >= len(object_info[source["class_type"]].get("output", [])):
+                        problems.append(f"node {node_id} ({class_type}): input {name} links to output {value[1]} of node {value[0]}, which has fewer outputs")
+                    continue
+                options = _combo_options(declared.get(name))
+                if options is not None and isinstance(value, str) and PLACEHOLDER not in value and value not in options:
+                    problems.append(f"node {node_id} ({class_type}): {name} '{value}' is not available in ComfyUI")
+        return problems
+
+
+def _is_link(value: Any) -> bool:
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[1], int)
+
+
+def _combo_options(spec: Any) -> Optional[List]:
+    """Allowed values of a dropdown input, in either object_info layout."""
+    if not spec:
+        return None
+    if isinstance(spec[0], list):
+        return spec[0]
+    if spec[0] == "COMBO" and len(spec) > 1 and isinstance(spec[1], dict):
+        return spec[1].get("options")
+    return None
+
+
+def _trace_text(nodes: Dict[str, Any], link: Any, role: str, seen: Set[str]) -> List[InputPath]:
+    """Text fields feeding a conditioning link, through nodes like ApplyInstantID or ControlNet."""
+    if not _is_link(link):
+        return []
+    node_id = str(link[0])
+    if node_id in seen or node_id not in nodes:
+        return []
+    seen.add(node_id)
+    inputs = nodes[node_id]["inputs"]
+    fields = [(node_id, name) for name in TEXT_FIELDS if isinstance(inputs.get(name), str)]
+    if fields:
+        return fields
+    paths = []
+    for name in (role, "conditioning", "conditioning_to", "conditioning_from"):
+        paths.extend(_trace_text(nodes, inputs.get(name), role, seen))
+    return paths
+
+
+def _checkpoint_of(nodes: Dict[str, Any], link: Any) -> Optional[str]:
+    """The checkpoint loader a model link comes from (through model patches like LoRAs)."""
+    seen = set()
+    while _is_link(link) and str(link[0]) in nodes and str(link[0]) not in seen:
+        node_id = str(link[0])
+        seen.add(node_id)
+        inputs = nodes[node_id]["inputs"]
+        if isinstance(inputs.get("ckpt_name"), str):
+            return node_id
+        link = inputs.get("model")
+    return None
+
+
+def _find_refiner(nodes: Dict[str, Any], samplers: List[str]) -> Optional[Dict[str, str]]:
+    """A sampler that continues another sampler's leftover noise with its own checkpoint."""
+    for refiner in samplers:
+        link = nodes[refiner]["inputs"].get("latent_image")
+        if not _is_link(link) or str(link[0]) not in samplers:
+            continue
+        base = str(link[0])
+        base_inputs = nodes[base]["inputs"]
+        if not isinstance(base_inputs.get("end_at_step"), int) or base_inputs["end_at_step"] >= base_inputs["steps"]:
+            continue
+        base_checkpoint = _checkpoint_of(nodes, base_inputs.get("model"))
+        refiner_checkpoint = _checkpoint_of(nodes, nodes[refiner]["inputs"].get("model"))
+        if base_checkpoint and refiner_checkpoint and base_checkpoint != refiner_checkpoint:
+            return {"base": base, "refiner": refiner, "base_checkpoint": base_checkpoint, "refiner_checkpoint": refiner_checkpoint}
+    return None
+
+
+def compile_workflow(path: str) -> WorkflowTemplate:
+    """
+    Parse a workflow file and index where each request's values go.
+    
+    Raises:
+        WorkflowError: Not an API-format workflow, or no prompt input can be found
+    """
+    stat = os.stat(path)
+    try:
+        with open(path, "r") as f:
+            nodes = json.load(f)
+    except ValueError as e:
+        raise WorkflowError(f"{path}: invalid JSON ({e})")
+    if "nodes" in nodes:
+        raise WorkflowError(f"{path}: UI-format workflow, export it from ComfyUI with 'Save (API Format)'")
+    for node_id, node in nodes.items():
+        if not isinstance(node, dict) or "class_type" not in node:
+            raise WorkflowError(f"{path}: node {node_id} has no class_type")
+        node.setdefault("inputs", {})
+    
+    positive, negative = [], []
+    for node in nodes.values():
+        inputs = node["inputs"]
+        # Samplers (and anything else taking both conditionings) anchor the trace
+        if _is_link(inputs.get("positive")) and _is_link(inputs.get("negative")) and "model" in inputs:
+            positive.extend(p for p in _trace_text(nodes, inputs["positive"], "positive", set()) if p not in positive)
+            negative.extend(p for p in _trace_text(nodes, inputs["negative"], "negative", set()) if p not in negative)
+    negative = [p for p in negative if p not in positive]
+    if not positive:
+        raise WorkflowError(f"{path}: no text encoder feeds a sampler's positive input")
+    
+    latents = [
+        node_id for node_id, node in nodes.items()
+        if node["class_type"].startswith("Empty") and "Latent" in node["class_type"]
+        and "width" in node["inputs"] and "height" in node["inputs"]
+    ]
+    placeholders = [
+        (node_id, name) for node_id, node in nodes.items()
+        for name, value in node["inputs"].items()
+        if isinstance(value, str) and PLACEHOLDER in value
+    ]
+    seeds = [
+        (node_id, name) for node_id, node in nodes.items()
+        for name in SEED_FIELDS if isinstance(node["inputs"].get(name), int)
+    ]
+    checkpoints = [
+        node["inputs"]["ckpt_name"] for node in nodes.values()
+        if isinstance(node["inputs"].get("ckpt_name"), str)
+    ]
+    samplers = [
+        node_id for node_id, node in nodes.items()
+        if isinstance(node["inputs"].get("steps"), int) and _is_link(node["inputs"].get("latent_image"))
+    ]
+    return WorkflowTemplate(
+        path=path,
+        mtime=stat.st_mtime,
+        size=stat.st_size,
+        nodes=nodes,
+        positive=positive,
+        negative=negative,
+        latents=latents,
+        placeholders=placeholders,
+        seeds=seeds,
+        checkpoints=checkpoints,
+        samplers=samplers,
+        steps=max((nodes[node_id]["inputs"]["steps"] for node_id in samplers), default=0),
+        refiner=_find_refiner(nodes, samplers)
+    )
+
+
+class WorkflowRegistry:
+    """Compiled workflow templates, reloaded when their files change"""
+    
+    def __init__(self):
+        self.templates: Dict[str, WorkflowTemplate] = {}
+        self.object_info: Dict[str, Dict[str, Any]] = {}  # backend name -> its /object_info
+        self.broken: Dict[str, Tuple[float, int, str]] = {}  # path -> (mtime, size, error) of a file that failed to load
+    
+    def get(self, path: str) -> WorkflowTemplate:
+        """
+        The compiled template for a workflow file.
+        
+        A file edited while the API runs is recompiled (and revalidated); if the
+        new version is broken, the last good one keeps being used. A file that
+        never loaded stays disabled (fails at once) until it changes.
+        """
+        template = self.templates.get(path)
+        if template is not None:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return template
+            if stat.st_mtime == template.mtime and stat.st_size == template.size:
+                return template
+            try:
+                reloaded = self._load(path)
+            except WorkflowError as e:
+                logger.error(f"Workflow {path} changed but is broken, still using the previous version: {e}")
+                template.mtime, template.size = stat.st_mtime, stat.st_size  # don't retry until it changes again
+                return template
+            logger.info(f"Reloaded workflow {path}")
+            return reloaded
+        return self._load(path)
+    
+    def _load(self, path: str) -> WorkflowTemplate:
+        stat = os.stat(path)
+        broken = self.broken.get(path)
+        if broken is not None and broken[:2] == (stat.st_mtime, stat.st_size):
+            raise WorkflowError(broken[2])
+        try:
+            template = compile_workflow(path)
+            problems = self._problems(template)
+            if problems:
+                raise WorkflowError(f"{path}: " + "; ".join(problems))
+        except WorkflowError as e:
+            self.broken[path] = (stat.st_mtime, stat.st_size, str(e))
+            raise
+        self.broken.pop(path, None)
+        self.templates[path] = template
+        logger.debug(
+            f"Compiled workflow {path}: positive {template.positive}, negative {template.negative}, "
+            f"latents {template.latents}, {template.steps} steps" + (f", refiner {template.refiner['refiner']}" if template.refiner else "")
+        )
+        return template
+    
+    def _problems(self, template: WorkflowTemplate) -> List[str]:
+        """Problems on any known backend; every backend must be able to run every workflow."""
+        problems = []
+        for backend, object_info in self.object_info.items():
+            prefix = f"[{backend}] " if len(self.object_info) > 1 else ""
+            problems.extend(prefix + problem for problem in template.problems(object_info))
+        return problems
+    
+    def validate(self, paths: List[str], object_info: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Compile every workflow and check it against each backend's /object_info (by backend name).
+        
+        Broken workflows are left out of the registry, so requests using them fail
+        at once until the file is fixed.
+        
+        Returns:
+            Problems found, one line per broken workflow (empty when all are usable)
+        """
+        self.object_info = dict(object_info)
+        problems = []
+        for path in paths:
+            self.templates.pop(path, None)
+            self.broken.pop(path, None)
+            try:
+                self._load(path)
+            except (WorkflowError, OSError) as e:
+                problems.append(str(e))
+        return problems
@@ -123,7 +123,7 @@ if [ -d "comfyui" ] && [ -f "comfyui/main.py" ]; then
         fi
         
         echo -e "${CYAN}   Starting on port 8188 with GPU and CORS enabled${NC}"
-        nohup python main.py --normalvram --listen 0.0.0.0 --port 8188 --enable-cors-header "*" > ../outputs/logs/comfyui.log 2>&1 &
+        nohup python main.py --normalvram --listen 0.0.0.0 --port 8188 --enable-cors-header "*" --preview-method auto > ../outputs/logs/comfyui.log 2>&1 &
         
         COMFYUI_PID=$!
         echo -e "${GREEN}✅ ComfyUI started (PID: $COMFYUI_PID)${NC}"
@@ -14,4 +14,4 @@ cd "$COMFYUI_DIR"
 
 # Activate venv and start with low VRAM mode and CORS enabled
 source venv/bin/activate
-python main.py --listen 0.0.0.0 --port 8188 --lowvram --enable-cors-header "*"
+python main.py --listen 0.0.0.0 --port 8188 --lowvram --enable-cors-header "*" --preview-method auto
@@ -18,6 +18,7 @@ class UnicornAI {
         this.sessionId = this.currentSessionId;  // Unique session ID for memory
         this.memoryEnabled = true;  // Memory on by default
         this.currentAudio = null;  // Track currently playing audio
+        this.resetHistoryPaging();  // Older messages are fetched from the server on scroll-up
         
         this.init();
     }
@@ -103,6 +104,7 @@ class UnicornAI {
         
         // Load new session's chat history
         this.messages = [];
+        this.resetHistoryPaging();
         this.chatMessages.innerHTML = '';
         console.log('Cleared messages, loading history...');
         this.loadChatHistory();
@@ -294,6 +296,11 @@ class UnicornAI {
         this.clearChatBtn.addEventListener('click', () => this.clearChat());
         this.voiceModeBtn.addEventListener('click', () => this.toggleVoiceMode());
         this.memoryModeBtn.addEventListener('click', () => this.toggleMemoryMode());
+        this.chatMessages.addEventListener('scroll', () => {
+            if (this.chatMessages.scrollTop < 50) {
+                this.loadOlderHistory();
+            }
+        });
         this.userProfileBtn.addEventListener('click', () => this.openUserProfile());
         this.modelManagerBtn.addEventListener('click', () => this.openModelManager());
         this.settingsBtn.addEventListener('click', () => this.openSettings());
@@ -872,7 +879,7 @@ class UnicornAI {
         return messageEl;  // Return the element for audio controls
     }
 
-    renderMessage(message) {
+    renderMessage(message, prepend = false) {
         const isUser = message.sender === 'user';
         const time = message.timestamp.toLocaleTimeString('en-US', { 
             hour: 'numeric', 
@@ -931,7 +938,11 @@ class UnicornAI {
             welcomeMsg.remove();
         }
         
-        this.chatMessages.appendChild(messageEl);
+        if (prepend) {
+            this.chatMessages.insertBefore(messageEl, this.chatMessages.firstChild);
+        } else {
+            this.chatMessages.appendChild(messageEl);
+        }
         return messageEl;  // Return for audio controls
     }
 
@@ -1017,6 +1028,8 @@ class UnicornAI {
                         <p>Start chatting with ${this.currentPersona?.name || 'someone'}!</p>
                     </div>
                 `;
+                // Another browser or cleared storage: show what the server remembers
+                this.loadOlderHistory();
                 return;
             }
             
@@ -1043,9 +1056,69 @@ class UnicornAI {
         }
     }
 
+    resetHistoryPaging() {
+        this.historyCursor = null;
+        this.historyExhausted = false;
+        this.loadingHistory = false;
+    }
+
+    async loadOlderHistory() {
+        // Fetch the page of stored messages before the oldest one shown (not kept in localStorage)
+        if (this.loadingHistory || this.historyExhausted) return;
+        this.loadingHistory = true;
+        const sessionId = this.sessionId;
+        try {
+            const params = new URLSearchParams({
+                persona_id: this.currentPersona?.id || 'luna',
+                limit: 30
+            });
+            if (this.historyCursor) {
+                params.set('before', this.historyCursor);
+            } else if (this.messages.length) {
+                params.set('before_time', this.toLocalISOString(this.messages[0].timestamp));
+            }
+            const response = await fetch(`${this.apiBase}/memory/history/${sessionId}?${params}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const page = await response.json();
+            if (sessionId !== this.sessionId) return;  // switched sessions meanwhile
+            
+            this.historyCursor = page.next_cursor;
+            this.historyExhausted = !page.next_cursor;
+            const firstPage = !this.chatMessages.querySelector('.message');
+            const previousHeight = this.chatMessages.scrollHeight;
+            page.messages.slice().reverse().forEach(msg => {
+                this.renderMessage({
+                    sender: msg.role === 'user' ? 'user' : 'ai',
+                    text: msg.content,
+                    timestamp: new Date(msg.timestamp)
+                }, true);
+            });
+            if (firstPage) {
+                this.scrollToBottom();
+            } else {
+                // Keep the message the user was reading in place
+                this.chatMessages.scrollTop += this.chatMessages.scrollHeight - previousHeight;
+            }
+        } catch (error) {
+            console.error('Error loading older messages:', error);
+            this.historyExhausted = true;
+        } finally {
+            this.loadingHistory = false;
+        }
+    }
+
+    toLocalISOString(date) {
+        // Server timestamps are naive local time (Python's datetime.now().isoformat())
+        const offset = date.getTimezoneOffset() * 60000;
+        return new Date(date.getTime() - offset).toISOString().slice(0, -1);
+    }
+
     async clearChat() {
         if (confirm('Are you sure you want to clear the chat history? This will also clear conversation memory.')) {
             this.messages = [];
+            this.historyExhausted = true;  // don't scroll the cleared chat back in
             this.chatMessages.innerHTML = `
                 <div class="welcome-message">
                     <div class="welcome-icon">🦄</div>
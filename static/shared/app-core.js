@@ -284,6 +284,7 @@ class UnicornAICore {
         
         // Show typing indicator
         this.showTypingIndicator();
+        this.watchImagePreviews();
         
         try {
             const payload = {
@@ -398,6 +399,10 @@ class UnicornAICore {
         this.renderMessages();
         this.saveChatHistory();
         
+        if (responseData.image_job) {
+            this.awaitFullImage(message, responseData.image_job);
+        }
+        
         if (this.settings.autoVoice) {
             this.speakMessage(responseData.response);
         }
@@ -407,6 +412,85 @@ class UnicornAICore {
         }
     }
 
+    // ===== Live Image Previews =====
+    watchImagePreviews() {
+        // Progress and small previews of images generated for this session, while they render
+        if (this.previewSource && this.previewSessionId === this.sessionId) return;
+        if (this.previewSource) this.previewSource.close();
+        this.previewSessionId = this.sessionId;
+        this.previewSource = new EventSource(`${this.apiBase}/images/previews/${this.sessionId}`);
+        this.previewSource.addEventListener('progress', (event) => {
+            const progress = JSON.parse(event.data);
+            this.showImagePreview(null, `Drawing... ${progress.percent ?? 0}%`);
+        });
+        this.previewSource.addEventListener('preview', (event) => {
+            this.showImagePreview(JSON.parse(event.data).image, null);
+        });
+        this.previewSource.addEventListener('done', () => this.hideImagePreview());
+    }
+
+    showImagePreview(image, text) {
+        if (!this.imagePreview) {
+            if (!this.typingIndicator) return;
+            this.imagePreview = document.createElement('div');
+            this.imagePreview.className = 'image-preview';
+            this.imagePreview.innerHTML = `
+                <img alt="Image preview">
+                <span class="image-preview-status">Drawing...</span>
+                <button class="message-action-btn" title="Stop this image" onclick="app.cancelImage()">
+                    <i class="fas fa-stop"></i>
+                </button>
+            `;
+            this.typingIndicator.parentNode.insertBefore(this.imagePreview, this.typingIndicator.nextSibling);
+        }
+        const img = this.imagePreview.querySelector('img');
+        if (image) {
+            img.src = image;
+            img.style.display = 'block';
+        } else if (!img.src) {
+            img.style.display = 'none';
+        }
+        if (text) {
+            this.imagePreview.querySelector('.image-preview-status').textContent = text;
+        }
+    }
+
+    hideImagePreview() {
+        if (this.imagePreview) {
+            this.imagePreview.remove();
+            this.imagePreview = null;
+        }
+    }
+
+    async cancelImage() {
+        try {
+            await fetch(`${this.apiBase}/images/cancel/${this.sessionId}`, { method: 'POST' });
+        } catch (error) {
+            console.error('Error cancelling image:', error);
+        }
+        this.hideImagePreview();
+    }
+
+    async awaitFullImage(message, jobId) {
+        // The reply came with a quick draft; swap in the full image once it's rendered
+        try {
+            for (let round = 0; round < 10; round++) {
+                const response = await fetch(`${this.apiBase}/images/jobs/${jobId}?wait=60`);
+                if (!response.ok) return;
+                const job = await response.json();
+                if (job.status === 'rendering') continue;
+                if (job.status === 'done') {
+                    message.image_url = job.image_url;
+                    this.renderMessages();
+                    this.saveChatHistory();
+                }
+                return;
+            }
+        } catch (error) {
+            console.error('Error waiting for full image:', error);
+        }
+    }
+
     addSystemMessage(content) {
         const message = {
             id: Date.now(),
@@ -8,7 +8,7 @@ Phase 5: Persona management
 import os
 import asyncio
 from typing import Optional
-from telegram import Update
+from telegram import Update, InputMediaPhoto
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from telegram.constants import ChatAction
 from dotenv import load_dotenv
@@ -283,6 +283,44 @@ Try talking to me - I'll respond in my new personality! 💫"""
             await update.message.reply_text("Sorry, something went wrong 😅")
 
 
+async def load_image(client: httpx.AsyncClient, image_url: str) -> bytes:
+    """Image bytes for an API image URL"""
+    # The API writes images into our shared outputs/ directory; only
+    # download them when it runs on another machine
+    local_path = image_url.split("?")[0].lstrip("/")
+    if image_url.startswith("/outputs/") and os.path.isfile(local_path):
+        with open(local_path, "rb") as f:
+            return f.read()
+    img_response = await client.get(f"{API_BASE_URL}{image_url}")
+    img_response.raise_for_status()
+    return img_response.content
+
+
+# Draft photos waiting for their full render
+_draft_tasks = set()
+DRAFT_WAIT_ROUNDS = 10  # each waits up to a minute on the API
+
+
+async def replace_draft_photo(message, job_id: str, caption: Optional[str]):
+    """Swap a sent draft photo for the full image once the API has rendered it"""
+    try:
+        async with httpx.AsyncClient(timeout=90.0) as client:
+            for _ in range(DRAFT_WAIT_ROUNDS):
+                response = await client.get(f"{API_BASE_URL}/images/jobs/{job_id}", params={"wait": 60})
+                response.raise_for_status()
+                job = response.json()
+                if job["status"] != "rendering":
+                    break
+            if job["status"] != "done":
+                logger.info(f"Keeping draft photo, full render {job_id} {job['status']}")
+                return
+            image_data = await load_image(client, job["image_url"])
+        await message.edit_media(InputMediaPhoto(media=image_data, caption=caption))
+        logger.info(f"Draft photo replaced by full image ({job['tier']})")
+    except Exception as e:
+        logger.warning(f"Could not replace draft photo: {e}")
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming text messages"""
     user = update.effective_user
@@ -363,19 +401,22 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.chat.send_action(ChatAction.UPLOAD_PHOTO)
                 
                 try:
-                    # Download the image from the local server
-                    img_response = await client.get(f"{API_BASE_URL}{image_url}")
-                    img_response.raise_for_status()
-                    image_data = img_response.content
+                    image_data = await load_image(client, image_url)
                     
                     # Send image
                     caption = f"🖼️ {image_prompt}" if image_prompt else None
-                    await update.message.reply_photo(
+                    sent = await update.message.reply_photo(
                         photo=image_data,
                         caption=caption
                     )
                     logger.info("Image sent successfully")
                     
+                    # A draft: the full image replaces it when it's ready
+                    if data.get("image_job"):
+                        task = asyncio.create_task(replace_draft_photo(sent, data["image_job"], caption))
+                        _draft_tasks.add(task)
+                        task.add_done_callback(_draft_tasks.discard)
+                    
                 except Exception as e:
                     logger.error(f"Failed to send image: {e}")
                     await update.message.reply_text(